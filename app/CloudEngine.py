@@ -6,12 +6,13 @@ a way to swap providers OR even use more than one for resiliency :)
 import GoogleClient
 
 class CloudEngine:
-    def __init__(self, providerName) -> None:
-        self.creds = self.authenticate()
+    def __init__(self, providerName="google") -> None:
         self.provider = providerName
+        self.client = self.authenticate()
     
     def authenticate(self):
-        self.creds = GoogleClient.CredsServiceAcct()
+        """Shared, long lived client. Credentials are not rebuilt per engine"""
+        return GoogleClient.get_google_client()
     
-    def get_engine(self):
-        return self.creds
\ No newline at end of file
+    def get_engine(self, api="sheets", version="v4"):
+        return self.client.service(api, version)
\ No newline at end of file
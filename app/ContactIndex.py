@@ -0,0 +1,99 @@
+"""Who to text for each volunteer, built once per run from the volunteer map (pubs sheet).
+Phone numbers are normalized to E.164 and delegation chains
+(delegate_notification_to) are resolved up front, so alerts are a simple join.
+"""
+from __future__ import annotations
+
+import logging
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+class ContactResolutionError(Exception):
+    """Raised when a volunteer that must be contacted has no valid number (cycle, dangling delegate, empty number)"""
+
+
+def normalize_numbers(numbers: pd.Series, country_code="+1") -> pd.Series:
+    """Return phone numbers in E.164 format, ex) '(555) 123-4567' -> '+15551234567'
+    Formatting and invisible unicode direction marks are removed. Empty values -> None
+    """
+    raw = numbers.fillna('').astype(str).str.strip()
+    digits = raw.str.replace(r'\D', '', regex=True)
+    country_digits = country_code.lstrip('+')
+
+    has_country_code = raw.str.lstrip('\u202d\u202c').str.startswith('+') | (
+        digits.str.startswith(country_digits) & (digits.str.len() == 10 + len(country_digits)))
+    e164 = np.where(has_country_code, '+' + digits, country_code + digits)
+    return pd.Series(np.where(digits == '', None, e164), index=numbers.index, dtype=object)
+
+
+def is_blank(value) -> bool:
+    return value is None or pd.isna(value) or str(value).strip() == ''
+
+
+class ContactIndex:
+    """row_id -> number to text, with delegation resolved
+
+    contacts: DataFrame indexed by row_id with columns
+        number: E.164 number to text or None
+        contact_id: row_id of the person that will receive the text
+    errors: {row_id: reason} for cycles, dangling delegates and delegates without a number
+    """
+
+    def __init__(self, volunteer_map_df: pd.DataFrame, country_code="+1", fallback_number=None) -> None:
+        roster = volunteer_map_df.drop_duplicates('row_id').set_index('row_id')
+        self.own_numbers = normalize_numbers(roster['Cell'], country_code)
+        self.permissions = roster['permission_to_contact?'].fillna('').astype(str).str.strip().str.lower()
+        self.delegates = roster['delegate_notification_to'].where(
+            ~roster['delegate_notification_to'].map(is_blank), None)
+        self.fallback_number = None
+        if not is_blank(fallback_number):
+            self.fallback_number = normalize_numbers(pd.Series([fallback_number]), country_code).item()
+
+        self.errors = {}
+        resolved = {row_id: self._resolve(row_id) for row_id in roster.index}
+        self.contacts = pd.DataFrame.from_dict(
+            resolved, orient='index', columns=['contact_id', 'number'])
+        self.contacts.index.name = 'row_id'
+
+    def _resolve(self, row_id) -> tuple:
+        """Return (contact_id, number) for one volunteer following delegation rules"""
+        permission = self.permissions[row_id]
+
+        if permission == 'y':
+            # volunteer can be contacted directly. No number? let the admin know instead
+            return row_id, self.own_numbers[row_id] or self.fallback_number
+
+        if permission != 'n' or self.delegates[row_id] is None:
+            return None, None # nobody to contact
+
+        chain = [row_id]
+        current = self.delegates[row_id]
+        while True:
+            if current in chain:
+                self.errors[row_id] = f"delegation cycle: {' -> '.join(map(str, chain + [current]))}"
+                return None, None
+            if current not in self.permissions.index:
+                self.errors[row_id] = f"delegates to id {current} - but id is not in volunteer map"
+                return None, None
+            chain.append(current)
+            if self.permissions[current] == 'n' and self.delegates[current] is not None:
+                current = self.delegates[current] # delegate also delegates, keep following
+                continue
+            if self.own_numbers[current] is None:
+                self.errors[row_id] = f"should delegate to id {current} - but is Null"
+                return None, None
+            return current, self.own_numbers[current]
+
+    def alerts_for(self, row_ids) -> pd.DataFrame:
+        """Return contacts for row_ids. Raises ContactResolutionError if any of them could not be resolved"""
+        row_ids = pd.Index(row_ids)
+        if failed := {row_id: self.errors[row_id] for row_id in row_ids if row_id in self.errors}:
+            raise ContactResolutionError(f"Could not resolve contacts: {failed}")
+        contacts = self.contacts.reindex(row_ids)
+        if skipped := contacts.index[contacts.number.isna()].to_list():
+            logging.debug(f"No contact for row_id(s) {skipped} - skipping")
+        return contacts
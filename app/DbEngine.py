@@ -1,22 +1,220 @@
 """
-WIP - Idea is to abstract reads/writes to store data,
-be it Google sheets, forms, a database, AWS s3, or any other storage
+Storage engine for the data warehouse.
+Reports live in a typed SQL table keyed (and indexed) by (year_month, volunteer_id),
+so dedup and history are indexed lookups instead of re-reading the warehouse sheet.
+volunteer_id is the roster row_id the report resolved to (see EntityResolver), the normalized
+name when it didn't match the roster. Like the sheet warehouse, a volunteer's first report of a month wins.
+SQLite is the default backend, MySQL uses the same interface (pymysql).
+The Google Sheet warehouse is now only an (optional) export target.
 """
-import pymysql
+import re
+import json
+import time
+import sqlite3
 import logging
+from contextlib import closing
+
 from CloudEngine import CloudEngine
+from lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+REPORT_COLUMNS = {'Year-Month': 'year_month', '¿Cual es su nombre?': 'name', 'Horas': 'hours'} # sheet -> table
+
+SCHEMA = {
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS {table} (
+            year_month TEXT NOT NULL,
+            volunteer_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            hours REAL,
+            extra TEXT, -- other form answers, JSON object
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (year_month, volunteer_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS {table}_volunteer ON {table} (volunteer_id, year_month)",
+    ],
+    "mysql": [
+        """CREATE TABLE IF NOT EXISTS {table} (
+            year_month VARCHAR(7) NOT NULL,
+            volunteer_id VARCHAR(191) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            hours DOUBLE,
+            extra TEXT,
+            updated_at DOUBLE NOT NULL,
+            PRIMARY KEY (year_month, volunteer_id),
+            INDEX {table}_volunteer (volunteer_id, year_month)
+        ) CHARACTER SET utf8mb4""",
+    ],
+}
+INSERT_NEW = { # a row stored by a concurrent run since existing_ids() is kept, same as the sheet
+    "sqlite": "INSERT OR IGNORE",
+    "mysql": "INSERT IGNORE",
+}
+PARAM = {"sqlite": "?", "mysql": "%s"}
+
+
+def volunteer_id(name: str) -> str:
+    """Warehouse key of a report that didn't resolve to a roster row_id: the normalized name"""
+    return " ".join(str(name).split()).casefold()
+
+
+def report_rows(report_df, volunteer_ids=None) -> list:
+    """Return (year_month, volunteer_id, name, hours, extra) rows from a warehouse formatted frame
+    (see main.format_for_datawarehouse). Columns without a table column are kept in extra as JSON.
+    volunteer_ids: roster row_id of each row (None when unmatched), in row order
+    """
+    # column positions are looked up once, rows are plain tuples
+    columns = report_df.columns.to_list()
+    month_at, name_at = columns.index('Year-Month'), columns.index('¿Cual es su nombre?')
+    hours_at = columns.index('Horas') if 'Horas' in columns else None
+    extra_cols = [(position, col) for position, col in enumerate(columns) if col not in REPORT_COLUMNS]
+    if volunteer_ids is None:
+        volunteer_ids = [None] * len(report_df)
+    rows = []
+    for record, row_id in zip(report_df.itertuples(index=False, name=None), volunteer_ids, strict=True):
+        hours = record[hours_at] if hours_at is not None else None
+        extra = {col: record[position] for position, col in extra_cols if not pd.isna(record[position])}
+        rows.append((
+            str(record[month_at]),
+            volunteer_id(record[name_at]) if row_id is None or pd.isna(row_id) else str(row_id),
+            record[name_at],
+            None if hours is None or pd.isna(hours) else float(hours),
+            json.dumps(extra, ensure_ascii=False, default=str) if extra else None,
+        ))
+    return rows
+
 
 class DatabaseEngine:
 
     def __init__(self, **kwargs) -> None:
+        """type: sqlite (default, path=...), mysql (pymysql.connect kwargs) or GoogleServiceClient.
+        table: reports table name, ex) one table per tenant on a shared MySQL server
+        """
+        self.dialect = None
+        self.table = kwargs.pop("table", "reports")
+        if not IDENTIFIER.match(self.table):
+            raise ValueError(f"Invalid table name: {self.table!r}")
         self.engine = self.createEngine(**kwargs)
-    
+        if self.dialect:
+            with closing(self.connect()) as conn:
+                for statement in SCHEMA[self.dialect]:
+                    conn.cursor().execute(statement.format(table=self.table))
+                conn.commit()
+
     def createEngine(self, **kwargs):
-        match kwargs.get("type"):
+        """Return a connection factory for SQL backends, or the Sheets service for GoogleServiceClient"""
+        match kwargs.pop("type", "sqlite"):
             case "GoogleServiceClient":
                 return CloudEngine().get_engine()
+            case "sqlite":
+                self.dialect = "sqlite"
+                path = kwargs.get("path", "warehouse.db")
+
+                def connect():
+                    conn = sqlite3.connect(path, timeout=30)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    return conn
+                return connect
             case "mysql":
-                return pymysql.connect(**kwargs)
-            case _:
-                pass
-        
\ No newline at end of file
+                import pymysql
+
+                self.dialect = "mysql"
+                return lambda: pymysql.connect(charset="utf8mb4", **kwargs)
+            case engine_type:
+                raise ValueError(f"Unknown database engine type: {engine_type}")
+
+    def connect(self):
+        if not self.dialect:
+            raise TypeError("Not a SQL engine")
+        # a connection per call, safe to use from several tenant threads
+        return self.engine()
+
+    def _query(self, sql: str, params=()) -> list:
+        with closing(self.connect()) as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql.format(table=self.table, p=PARAM[self.dialect]), params)
+            return cursor.fetchall()
+
+    def existing_ids(self, year_month: str) -> set:
+        """volunteer_ids already stored for the month (primary key range scan)"""
+        return {row[0] for row in self._query("SELECT volunteer_id FROM {table} WHERE year_month = {p}", (year_month,))}
+
+    def _new_positions(self, rows: list) -> list:
+        """Positions of the rows not stored yet, first report of a volunteer per month wins"""
+        stored = {year_month: self.existing_ids(year_month) for year_month in {row[0] for row in rows}}
+        new = []
+        for position, row in enumerate(rows):
+            if row[1] not in stored[row[0]]:
+                stored[row[0]].add(row[1])
+                new.append(position)
+        return new
+
+    def new_reports(self, report_df, volunteer_ids=None) -> tuple:
+        """Return (rows of report_df that insert_reports would insert, their volunteer_ids), storing nothing"""
+        if volunteer_ids is None:
+            volunteer_ids = [None] * len(report_df)
+        new = self._new_positions(report_rows(report_df, volunteer_ids))
+        return report_df.iloc[new], [volunteer_ids[position] for position in new]
+
+    def insert_reports(self, report_df, volunteer_ids=None) -> "pd.DataFrame":
+        """Insert the reports of a warehouse formatted frame that are not stored yet, in one prepared,
+        batched statement. The first report of a volunteer per month wins: later ones, in report_df
+        or from an earlier run, are dropped.
+
+        Args:
+            volunteer_ids list: roster row_id of each row of report_df (see report_rows)
+
+        Returns:
+            DataFrame, the rows of report_df that were inserted
+        """
+        rows = report_rows(report_df, volunteer_ids)
+        new = self._new_positions(rows)
+        if not new:
+            return report_df.iloc[:0]
+
+        now = time.time()
+        p = PARAM[self.dialect]
+        sql = (f"{INSERT_NEW[self.dialect]} INTO {self.table} (year_month, volunteer_id, name, hours, extra, updated_at) "
+               f"VALUES ({', '.join([p] * 6)})")
+        with closing(self.connect()) as conn:
+            conn.cursor().executemany(sql, [rows[position] + (now,) for position in new])
+            conn.commit()
+        logging.debug(f"Warehouse {self.table}: inserted {len(new)} of {len(rows)} rows")
+        return report_df.iloc[new]
+
+    def replace_reports(self, report_df, volunteer_ids=None) -> int:
+        """Replace EVERY stored report with the rows of report_df (first report of a volunteer per month wins),
+        in one transaction. Returns number of rows stored
+        """
+        rows, keys = [], set()
+        for row in report_rows(report_df, volunteer_ids):
+            if (row[0], row[1]) not in keys:
+                keys.add((row[0], row[1]))
+                rows.append(row)
+
+        now = time.time()
+        p = PARAM[self.dialect]
+        with closing(self.connect()) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.executemany(
+                f"INSERT INTO {self.table} (year_month, volunteer_id, name, hours, extra, updated_at) "
+                f"VALUES ({', '.join([p] * 6)})", [row + (now,) for row in rows])
+            conn.commit()
+        logging.debug(f"Warehouse {self.table}: replaced with {len(rows)} rows")
+        return len(rows)
+
+    def _frame(self, where: str, params: tuple):
+        rows = self._query(
+            "SELECT year_month, volunteer_id, name, hours, extra FROM {table} WHERE " + where, params)
+        return pd.DataFrame(rows, columns=['year_month', 'volunteer_id', 'name', 'hours', 'extra'])
+
+    def month(self, year_month: str):
+        """Return DataFrame of every report stored for the month"""
+        return self._frame("year_month = {p} ORDER BY name", (year_month,))
+
+    def history(self, volunteer: str):
+        """Return DataFrame of a volunteer's reports (roster row_id, see volunteer_id), oldest month first"""
+        return self._frame("volunteer_id = {p} ORDER BY year_month", (str(volunteer),))
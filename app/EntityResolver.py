@@ -0,0 +1,172 @@
+"""Match submitted names to volunteers in the roster (pubs sheet).
+Names are blocked by token and phonetic key so each submission is only scored
+against a handful of roster candidates, not the whole roster.
+"""
+from __future__ import annotations
+
+import re
+import logging
+from difflib import SequenceMatcher
+from collections import Counter, defaultdict
+
+from lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+MIN_MATCH_SCORE = 0.85 # below this a submission is left unmatched
+CONFIDENT_SCORE = 0.95 # matches below this are reported as low confidence
+MAX_CANDIDATES = 25 # bound on how many roster names are scored per submission
+
+PHONETIC_RULES = [ # applied in order, spanish/english friendly
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"qu"), "k"),
+    (re.compile(r"ll"), "y"),
+    (re.compile(r"c(?=[ei])"), "s"),
+    (re.compile(r"[cq]"), "k"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"v"), "b"),
+    (re.compile(r"h"), ""),
+]
+
+
+def phonetic_key(token: str) -> str:
+    """Return rough phonetic key of a name token. Perez/Peres/Perrez -> 'prs'"""
+    key = token.lower()
+    for pattern, replacement in PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    if not key:
+        return key
+    key = key[0] + re.sub(r"[aeiouy]", "", key[1:]) # keep first letter, drop vowels
+    key = re.sub(r"(.)\1+", r"\1", key) # collapse repeats: 'rr' -> 'r'
+    return key[:5]
+
+
+def similarity(name: str, other: str) -> float:
+    """Return similarity between 0 and 1. Also scores tokens sorted, so swapped first/last names match"""
+    name, other = name.lower(), other.lower()
+    score = SequenceMatcher(None, name, other).ratio()
+    sorted_name, sorted_other = " ".join(sorted(name.split())), " ".join(sorted(other.split()))
+    return max(score, SequenceMatcher(None, sorted_name, sorted_other).ratio())
+
+
+class Resolution:
+    """Structured result of matching submissions to the roster
+
+    matches: one row per submission -> submitted_name, row_id, matched_name, score, confidence
+        confidence is 'exact', 'fuzzy', 'low' or 'unmatched'
+    """
+
+    def __init__(self, matches: pd.DataFrame) -> None:
+        self.matches = matches
+
+    @property
+    def row_id(self) -> pd.Series:
+        """roster row_id of each submission, None when unmatched. Same index as the submissions"""
+        return self.matches["row_id"]
+
+    @property
+    def matched_ids(self) -> set:
+        """row_id of every volunteer with at least one matched submission"""
+        return set(self.matches.loc[self.matches.confidence != "unmatched", "row_id"])
+
+    @property
+    def low_confidence(self) -> pd.DataFrame:
+        return self.matches[self.matches.confidence == "low"]
+
+    @property
+    def unmatched(self) -> pd.DataFrame:
+        return self.matches[self.matches.confidence == "unmatched"]
+
+    @property
+    def duplicates(self) -> pd.DataFrame:
+        """Submissions that resolved to the same volunteer more than once"""
+        matched = self.matches[self.matches.confidence != "unmatched"]
+        return matched[matched.row_id.duplicated(keep=False)].sort_values("row_id")
+
+    def log_issues(self) -> None:
+        if len(self.low_confidence):
+            logging.warning(
+                "Low confidence name matches: "
+                f"{self.low_confidence[['submitted_name', 'matched_name', 'score']].to_dict('records')}")
+        if len(self.unmatched):
+            logging.warning(f"Names not found in roster: {self.unmatched.submitted_name.to_list()}")
+        if len(self.duplicates):
+            logging.warning(
+                "There are duplicates! "
+                f"{self.duplicates[['submitted_name', 'matched_name']].to_dict('records')}")
+
+
+class RosterIndex:
+    """Index of roster names for fast lookups.
+    Exact names are a dict lookup, everything else is blocked by token/phonetic key
+    and scored against at most MAX_CANDIDATES roster names.
+    """
+
+    def __init__(self, roster_df: pd.DataFrame, id_col="row_id", name_col="full_name",
+                 min_score=MIN_MATCH_SCORE, confident_score=CONFIDENT_SCORE) -> None:
+        self.min_score = min_score
+        self.confident_score = confident_score
+        self.ids = roster_df[id_col].to_list()
+        self.names = roster_df[name_col].fillna("").astype(str).to_list()
+
+        self.exact = {}
+        self.blocks = defaultdict(list)
+        for position, name in enumerate(self.names):
+            if name in self.exact:
+                logging.warning(f"Roster name {name!r} is not unique - matching to first row_id")
+                continue
+            self.exact[name] = position
+            for key in self.block_keys(name):
+                self.blocks[key].append(position)
+
+    @staticmethod
+    def block_keys(name: str) -> set:
+        keys = set()
+        for token in name.lower().split():
+            keys.add(f"t:{token}")
+            keys.add(f"p:{phonetic_key(token)}")
+            keys.add(f"x:{token[:3]}")
+        return keys
+
+    def match(self, name: str) -> tuple:
+        """Return (roster position or None, score) for a single normalized name"""
+        if name in self.exact:
+            return self.exact[name], 1.0
+
+        overlap = Counter(
+            position for key in self.block_keys(name) for position in self.blocks.get(key, ()))
+        best_position, best_score = None, 0.0
+        for position, _ in overlap.most_common(MAX_CANDIDATES):
+            score = similarity(name, self.names[position])
+            if score > best_score:
+                best_position, best_score = position, score
+        if best_score < self.min_score:
+            return None, best_score
+        return best_position, best_score
+
+    def resolve(self, submitted_names: pd.Series) -> Resolution:
+        """Match every submission to a roster row_id. Each distinct name is only matched once"""
+        codes, uniques = pd.factorize(submitted_names.fillna("").astype(str))
+        unique_matches = []
+        for name in uniques:
+            position, score = self.match(name)
+            if position is None:
+                confidence = "unmatched"
+            elif name == self.names[position]:
+                confidence = "exact"
+            elif score >= self.confident_score:
+                confidence = "fuzzy"
+            else:
+                confidence = "low"
+            unique_matches.append({
+                "row_id": None if position is None else self.ids[position],
+                "matched_name": None if position is None else self.names[position],
+                "score": round(score, 3),
+                "confidence": confidence,
+            })
+
+        matches = pd.DataFrame(unique_matches, columns=["row_id", "matched_name", "score", "confidence"])
+        matches = matches.iloc[codes].reset_index(drop=True)
+        matches.insert(0, "submitted_name", submitted_names.to_list())
+        matches.index = submitted_names.index
+        return Resolution(matches)
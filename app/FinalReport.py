@@ -0,0 +1,185 @@
+"""Month end Final Report, filled from Final_Report_Template.xlsx.
+The template layout (title row, one block per category, styles, widths) is read once,
+then every report is written with openpyxl's write-only (streaming) workbook, so many
+months/tenants can be produced in one batch with bounded memory.
+Blocks grow past the template's blank rows when a category has more volunteers.
+"""
+import os
+import copy
+import logging
+from functools import lru_cache
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+FINAL_REPORT_TEMPLATE = os.getenv("FINAL_REPORT_TEMPLATE") or next(
+    (path for path in (os.path.join(APP_DIR, "Final_Report_Template.xlsx"), # docker image
+                       os.path.join(os.path.dirname(APP_DIR), "Final_Report_Template.xlsx")) # repo
+     if os.path.exists(path)),
+    "Final_Report_Template.xlsx")
+NAME_COL = "¿Cual es su nombre?"
+HOURS_COL = "Horas"
+SECTIONS = { # category -> label of its block in column A of the template
+    "Publicador": "PUBLICADOR",
+    "Auxiliar": "PRECURSOR AUXILIAR",
+    "Regular": "PRECURSOR REGULAR",
+}
+COLUMN_KEYWORDS = { # form questions change wording, columns are found by keyword
+    "category": "precursor",
+    "participated": "particip",
+    "studies": "cursos", # not "curso", it is part of "precursor"
+    "comments": "comentario",
+}
+
+
+def find_column(df, keyword: str):
+    """Return first column whose header contains keyword (case/accent insensitive), None if missing"""
+    from Transformer import normalize_name
+
+    return next((col for col in df.columns if keyword in normalize_name(str(col)).lower()), None)
+
+
+def categorize(values):
+    """Return report category per answer: 'Regular (Precursor de Tiempo Completo)' -> Regular,
+    'Auxiliar' -> Auxiliar, anything else (No/blank) -> Publicador
+    """
+    answers = pd.Series(values, dtype=object).fillna('').astype(str).str.strip().str.lower()
+    return pd.Series(
+        np.select([answers.str.startswith('regular'), answers.str.startswith('auxiliar')],
+                  ['Regular', 'Auxiliar'], default='Publicador'),
+        index=answers.index)
+
+
+def summarize(report_df):
+    """Return (report rows with a normalized column set, totals per category).
+    Rows: name, category, hours, participated, studies, comments - sorted by name within category
+    """
+    columns = {key: find_column(report_df, keyword) for key, keyword in COLUMN_KEYWORDS.items()}
+    blank = pd.Series([None] * len(report_df), index=report_df.index, dtype=object)
+
+    rows = pd.DataFrame({
+        'name': report_df[NAME_COL],
+        'category': categorize(report_df[columns['category']]) if columns['category'] else 'Publicador',
+        'hours': pd.to_numeric(report_df[HOURS_COL], errors='coerce') if HOURS_COL in report_df else np.nan,
+        'participated': report_df[columns['participated']] if columns['participated'] else 'Sí',
+        'studies': pd.to_numeric(report_df[columns['studies']], errors='coerce') if columns['studies'] else np.nan,
+        'comments': report_df[columns['comments']] if columns['comments'] else blank,
+    }).sort_values(['category', 'name'], kind='stable')
+
+    totals = rows.groupby('category').agg(
+        volunteers=('name', 'size'), hours=('hours', 'sum'), studies=('studies', 'sum')
+    ).reindex(list(SECTIONS), fill_value=0)
+    return rows, totals
+
+
+class TemplateLayout:
+    """Everything needed to reproduce the template: title row, category blocks and their styles"""
+
+    def __init__(self, path: str) -> None:
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(path).active
+        self.title = sheet.title
+        self.widths = {col: dim.width for col, dim in sheet.column_dimensions.items() if dim.width}
+        self.max_col = sheet.max_column
+        self.title_row = self.read_row(sheet, 1)
+
+        labels = {str(cell.value).strip(): cell.row for cell in sheet['A'] if cell.value}
+        header_rows = [labels[label] for label in SECTIONS.values()]
+        ends = header_rows[1:] + [sheet.max_row + 1]
+        self.sections = {}
+        for category, header, end in zip(SECTIONS, header_rows, ends):
+            self.sections[category] = {
+                'header': self.read_row(sheet, header),
+                'row': self.read_row(sheet, header + 1),
+                'last_row': self.read_row(sheet, end - 1), # thick bottom border closes the block
+                'blank_rows': end - header - 1,
+            }
+
+    def read_row(self, sheet, row: int) -> list:
+        return [(cell.value, cell.font, cell.border, cell.alignment, cell.number_format)
+                for cell in sheet[row][:self.max_col]]
+
+    @staticmethod
+    def cells(sheet, template_row: list, values: list) -> list:
+        from openpyxl.cell import WriteOnlyCell
+
+        out = []
+        for (_, font, border, alignment, number_format), value in zip(template_row, values):
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.font, cell.border, cell.alignment = copy.copy(font), copy.copy(border), copy.copy(alignment)
+            cell.number_format = number_format
+            out.append(cell)
+        return out
+
+
+@lru_cache(maxsize=4)
+def load_layout(path: str = None) -> TemplateLayout:
+    return TemplateLayout(path or FINAL_REPORT_TEMPLATE)
+
+
+def cell_value(value):
+    """Excel friendly value: NaN/None -> None, whole floats -> int"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return int(value)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def write_final_report(report_df, year_month: str, output_path: str, group: str = None, layout=None) -> str:
+    """Write the Final Report for one month to output_path (.xlsx). Returns output_path"""
+    from openpyxl import Workbook
+
+    layout = layout or load_layout()
+    rows, totals = summarize(report_df)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(layout.title)
+    for col, width in layout.widths.items():
+        sheet.column_dimensions[col].width = width
+
+    title = [value for value, *_ in layout.title_row]
+    title[2], title[3] = f"Grupo#: {group or ''}", f"Mes: {year_month}"
+    sheet.append(layout.cells(sheet, layout.title_row, title))
+
+    for category, section in layout.sections.items():
+        sheet.append(layout.cells(sheet, section['header'], [value for value, *_ in section['header']]))
+        section_rows = rows[rows['category'] == category]
+        second = 'participated' if category == 'Publicador' else 'hours'
+        values = [
+            [cell_value(name), cell_value(b), cell_value(studies), cell_value(comments)]
+            for name, b, studies, comments in zip(
+                section_rows['name'], section_rows[second], section_rows['studies'], section_rows['comments'])
+        ]
+        total = totals.loc[category]
+        values.append([f"TOTAL ({int(total['volunteers'])})",
+                       None if category == 'Publicador' else cell_value(total['hours']),
+                       cell_value(total['studies']), None])
+        # keep at least the template's blank rows so the printed form looks the same
+        values += [[]] * max(0, section['blank_rows'] - len(values))
+        for index, row_values in enumerate(values):
+            template_row = section['last_row'] if index == len(values) - 1 else section['row']
+            padded = row_values + [None] * (len(template_row) - len(row_values))
+            sheet.append(layout.cells(sheet, template_row, padded))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    workbook.save(output_path)
+    logging.info(f"Final report for {year_month} ({len(rows)} volunteers) saved to {output_path}")
+    return output_path
+
+
+def write_final_reports(jobs, output_dir: str) -> list:
+    """Batch: jobs is an iterable (can be a generator) of (report_df, year_month, group).
+    Each workbook is streamed to disk before the next job is read. Returns list of paths
+    """
+    layout = load_layout()
+    return [
+        write_final_report(
+            report_df, year_month, os.path.join(output_dir, f"Final_Report_{group or 'group'}_{year_month}.xlsx"),
+            group=group, layout=layout)
+        for report_df, year_month, group in jobs
+    ]
@@ -1,5 +1,27 @@
+"""Long lived Google client factory shared by main, CloudEngine and DbEngine.
+Credentials are created once per process and only refreshed near expiry.
+API services are built from a local discovery document (parsed once) and cached
+per thread, because googleapiclient services/httplib2 are not thread safe.
+"""
+from __future__ import annotations
+
 import os
-from google.oauth2.service_account import Credentials
+import json
+import logging
+import datetime
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.metadata.readonly", # revision checks for the sheets cache
+]
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5) # refresh token when it expires sooner than this
+GOOGLE_DISCOVERY_DIR = os.getenv("GOOGLE_DISCOVERY_DIR") # optional override of the bundled <api>.<version>.json docs
+HTTP_TIMEOUT = 60
 
 
 class GoogleServiceClient:
@@ -8,7 +30,7 @@ class GoogleServiceClient:
             "type": "service_account",
             "project_id": os.getenv("PROJECT_ID"),
             "private_key_id": os.getenv("PRIVATE_KEY_ID"),
-            "private_key": os.getenv("PRIVATE_KEY").replace("\\n", "\n"),
+            "private_key": os.getenv("PRIVATE_KEY", "").replace("\\n", "\n") or None,
             "client_email": os.getenv("CLIENT_EMAIL"),
             "client_id": os.getenv("CLIENT_ID"),
             "auth_uri": "https://accounts.google.com/o/oauth2/auth",
@@ -22,6 +44,106 @@ class GoogleServiceClient:
                 f"Missing Environment variable(s): {','.join(missing_creds)}"
             )
 
+        self._credentials = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._discovery_docs = {}
+
     @property
     def CredsServiceAcct(self) -> Credentials:
-        return Credentials.from_service_account_info(self.creds)
+        """Same Credentials object on every access, refreshed when close to expiry"""
+        return self.credentials()
+
+    def credentials(self) -> Credentials:
+        with self._lock:
+            if self._credentials is None:
+                from google.oauth2.service_account import Credentials
+
+                self._credentials = Credentials.from_service_account_info(self.creds, scopes=SCOPES)
+            if self._needs_refresh(self._credentials):
+                from google.auth.transport.requests import Request
+
+                self._credentials.refresh(Request())
+                logging.debug(f"Refreshed Google token, expires {self._credentials.expiry}")
+            return self._credentials
+
+    @staticmethod
+    def _needs_refresh(credentials) -> bool:
+        if not credentials.token or credentials.expiry is None:
+            return True
+        return credentials.expiry - datetime.datetime.utcnow() < TOKEN_REFRESH_MARGIN
+
+    def discovery_document(self, api: str, version: str) -> dict:
+        """Return parsed discovery document, read from disk once per process (no network fetch)"""
+        key = (api, version)
+        with self._lock:
+            if key not in self._discovery_docs:
+                if GOOGLE_DISCOVERY_DIR:
+                    with open(os.path.join(GOOGLE_DISCOVERY_DIR, f"{api}.{version}.json"), encoding="utf-8") as doc:
+                        content = doc.read()
+                else:
+                    from googleapiclient.discovery_cache import get_static_doc
+
+                    content = get_static_doc(api, version) # shipped with google-api-python-client
+                if content is None:
+                    raise FileNotFoundError(f"No local discovery document for {api} {version}")
+                self._discovery_docs[key] = json.loads(content)
+            return self._discovery_docs[key]
+
+    def service(self, api: str = "sheets", version: str = "v4"):
+        """Return API service for the calling thread. Built once per thread,
+        reusing the thread's HTTP connections and the shared credentials/token
+        """
+        services = self._local.__dict__.setdefault("services", {})
+        if (api, version) not in services:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.discovery import build_from_document
+
+            if "http" not in self._local.__dict__:
+                self._local.http = CountingHttp(
+                    AuthorizedHttp(self.credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT)))
+            services[(api, version)] = build_from_document(
+                self.discovery_document(api, version), http=self._local.http)
+        self.credentials() # refresh shared token ahead of expiry, never mid-request
+        return services[(api, version)]
+
+
+class CountingHttp:
+    """Wraps the (authorized) http object of a service: counts requests and payload bytes per API"""
+
+    def __init__(self, http) -> None:
+        self.http = http
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+    @staticmethod
+    def api_name(uri: str) -> str:
+        """ex) https://sheets.googleapis.com/v4/... -> sheets, https://www.googleapis.com/drive/v3/... -> drive"""
+        host, _, path = uri.split("://", 1)[-1].partition("/")
+        name = host.split(".", 1)[0]
+        return path.split("/", 1)[0] if name == "www" else name
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        from metrics import REGISTRY
+
+        response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        api = self.api_name(uri)
+        REGISTRY.inc("google_requests_total", api=api, status=getattr(response, "status", 0))
+        REGISTRY.inc("google_bytes_total", len(body or b""), api=api, direction="sent")
+        REGISTRY.inc("google_bytes_total", len(content or b""), api=api, direction="received")
+        return response, content
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_google_client() -> GoogleServiceClient:
+    """Return the process wide GoogleServiceClient"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GoogleServiceClient()
+    return _client
@@ -0,0 +1,140 @@
+"""Durable outbound message queue (SQLite) between alert generation and Twilio.
+Messages are keyed by (report month, recipient, day), so enqueueing the same
+reminders again after a crash or rerun is a no-op, and a separate worker drains
+the queue with acknowledgements.
+
+Delivery is at-least-once: a message claimed by a worker that dies before it is
+acknowledged becomes claimable again after the lease expires.
+"""
+import os
+import time
+import sqlite3
+import logging
+from contextlib import closing
+
+MESSAGE_QUEUE_PATH = os.getenv("MESSAGE_QUEUE_PATH", "outbound_queue.db")
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 5))
+QUEUE_LEASE_SECONDS = 300 # a claimed message is retried if not acked within this time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbound (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedup_key TEXT NOT NULL UNIQUE,
+    report_month TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    name TEXT,
+    send_day TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending, sending, sent, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sid TEXT,
+    last_error TEXT,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbound_status ON outbound (status, id);
+"""
+
+
+def dedup_key(report_month, recipient, name, day) -> str:
+    """Recipient is the number AND the volunteer being reminded,
+    so a parent texted for two children still gets both messages
+    """
+    return f"{report_month}|{recipient}|{name}|{day}"
+
+
+class OutboundQueue:
+
+    def __init__(self, path=None, max_attempts=None, lease_seconds=QUEUE_LEASE_SECONDS) -> None:
+        self.path = path or MESSAGE_QUEUE_PATH
+        self.max_attempts = max_attempts or QUEUE_MAX_ATTEMPTS
+        self.lease_seconds = lease_seconds
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per call keeps the queue safe to use from several threads/processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, report_month: str, messages: list, day: str) -> int:
+        """Add messages [{'name', 'to', 'body'}]. Messages already queued for the same key are ignored.
+        Returns number of NEW messages queued
+        """
+        now = time.time()
+        rows = [
+            (dedup_key(report_month, message['to'], message.get('name'), day),
+             report_month, message['to'], message.get('name'), day, message['body'], now, now)
+            for message in messages
+        ]
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbound "
+                "(dedup_key, report_month, recipient, name, send_day, body, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            queued = conn.total_changes - before
+            conn.execute("COMMIT")
+        return queued
+
+    def claim(self, batch_size=50) -> list:
+        """Mark up to batch_size pending (or expired) messages as sending and return them"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE") # one claimer at a time
+            rows = conn.execute(
+                "SELECT id, recipient, name, body, attempts FROM outbound "
+                "WHERE status = 'pending' OR (status = 'sending' AND claimed_at < ?) "
+                "ORDER BY id LIMIT ?",
+                (now - self.lease_seconds, batch_size)).fetchall()
+            conn.executemany(
+                "UPDATE outbound SET status = 'sending', claimed_at = ?, updated_at = ? WHERE id = ?",
+                [(now, now, row['id']) for row in rows])
+            conn.execute("COMMIT")
+        return [dict(row) for row in rows]
+
+    def ack(self, message_id: int, sid: str = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE outbound SET status = 'sent', sid = ?, attempts = attempts + 1, "
+                "last_error = NULL, updated_at = ? WHERE id = ?",
+                (sid, time.time(), message_id))
+
+    def nack(self, message_id: int, error: str) -> str:
+        """Record failed attempt. Message goes back to pending until max_attempts, then failed.
+        Returns new status
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE outbound SET attempts = attempts + 1, last_error = ?, updated_at = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE id = ?",
+                (error, time.time(), self.max_attempts, message_id))
+            return conn.execute("SELECT status FROM outbound WHERE id = ?", (message_id,)).fetchone()['status']
+
+    def drain(self, sender, batch_size=50) -> list:
+        """Send everything pending with sender (TwilioSender), acking each message.
+        Returns list of (message, MessageResult)
+        """
+        drained = []
+        while batch := self.claim(batch_size):
+            results = sender.send_many(
+                [{'name': row['name'], 'to': row['recipient'], 'body': row['body']} for row in batch])
+            for row, result in zip(batch, results):
+                if result.ok:
+                    self.ack(row['id'], result.sid)
+                elif self.nack(row['id'], result.error) == 'pending':
+                    # retried on the next drain, not in this loop
+                    logging.warning(f"Message {row['id']} for {row['name']} will be retried: {result.error}")
+                drained.append((row, result))
+            if any(not result.ok for result in results):
+                break # don't hammer a failing API, next drain picks the rest up
+        return drained
+
+    def counts(self) -> dict:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbound GROUP BY status").fetchall())
@@ -0,0 +1,46 @@
+"""Thread safe token bucket, shared by anything that must respect an API rate (Twilio, Google),
+and the retry policy for when the API pushes back anyway
+"""
+import time
+import random
+import threading
+
+RETRY_STATUSES = {429, 500, 502, 503, 504} # rate limited or transient server errors, worth retrying
+
+
+def backoff_seconds(attempt: int, base: float = 1.0, cap: float = 60) -> float:
+    """Full jitter exponential backoff: uniform between 0 and min(cap, base * 2 ** attempt)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep) -> None:
+        if rate <= 0:
+            raise ValueError(f"rate must be > 0, got {rate}")
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Block until tokens are available. Returns seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
@@ -0,0 +1,91 @@
+"""Columnar (Parquet) archive of the warehouse, one partition per Year-Month.
+    <root>/Year-Month=2023-10/part.parquet
+Reads only open the partitions in the requested date range and only the requested
+columns, memory mapped, so multi-year queries don't pull the whole warehouse into memory.
+"""
+import os
+import glob
+import logging
+
+from lazy import lazy_import
+
+pd = lazy_import("pandas") # pyarrow is imported by the methods that use it
+
+PARTITION_COL = "Year-Month"
+NAME_COL = "¿Cual es su nombre?"
+DICTIONARY_COLS = [NAME_COL] # repeat every month, stored (and read back) dictionary encoded
+
+
+class ReportArchive:
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def partition_path(self, year_month: str) -> str:
+        return os.path.join(self.root, f"{PARTITION_COL}={year_month}", "part.parquet")
+
+    def partitions(self) -> list:
+        """Year-Month of every stored partition, sorted"""
+        return sorted(
+            os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+            for path in glob.glob(os.path.join(self.root, f"{PARTITION_COL}=*", "part.parquet")))
+
+    def to_table(self, df):
+        """Arrow table with stable types: names dictionary encoded, numbers float, everything else text"""
+        import pyarrow as pa
+
+        df = df.drop(columns=[PARTITION_COL], errors='ignore').copy()
+        for col in df.columns:
+            if not pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].map(lambda val: None if val is None or pd.isna(val) else str(val))
+            elif not pd.api.types.is_bool_dtype(df[col]):
+                df[col] = df[col].astype('float64')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for col in DICTIONARY_COLS:
+            if col in table.column_names:
+                index = table.column_names.index(col)
+                table = table.set_column(index, col, table[col].dictionary_encode())
+        return table
+
+    def write(self, df) -> None:
+        """Store warehouse formatted rows (see main.format_for_datawarehouse).
+        Each month's partition is merged with what is already archived, first row per name
+        wins, like the warehouse sheet and the SQL warehouse
+        """
+        import pyarrow.parquet as pq
+
+        for year_month, month_df in df.groupby(PARTITION_COL, sort=False):
+            path = self.partition_path(str(year_month))
+            if os.path.exists(path):
+                month_df = pd.concat([self.read(start=year_month, end=year_month), month_df], ignore_index=True)
+            month_df = month_df.drop_duplicates(subset=[NAME_COL], keep='first')
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            pq.write_table(self.to_table(month_df), tmp_path, use_dictionary=DICTIONARY_COLS)
+            os.replace(tmp_path, path)
+            logging.debug(f"Archived {len(month_df)} rows for {year_month} in {path}")
+
+    def read(self, columns=None, start=None, end=None, memory_map=True):
+        """Return DataFrame of archived rows with start <= Year-Month <= end ('YYYY-MM', inclusive).
+        Only the partitions in range are opened and only `columns` (+ Year-Month) are read
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        months = [month for month in self.partitions()
+                  if (start is None or month >= start) and (end is None or month <= end)]
+        if not months:
+            return pd.DataFrame(columns=[PARTITION_COL, *(columns or [])])
+
+        tables = []
+        for month in months:
+            path = self.partition_path(month)
+            available = pq.read_schema(path, memory_map=memory_map).names
+            wanted = available if columns is None else [col for col in columns if col in available]
+            table = pq.read_table(path, columns=wanted, memory_map=memory_map)
+            tables.append(table.append_column(PARTITION_COL, pa.array([month] * table.num_rows, pa.string())))
+
+        # columns can differ between months (form questions change), missing ones are null
+        table = pa.concat_tables(tables, promote_options='default')
+        return table.select([PARTITION_COL] + [col for col in table.column_names if col != PARTITION_COL]).to_pandas()
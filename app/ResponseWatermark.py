@@ -0,0 +1,92 @@
+"""Local state of a monthly response sheet: how many rows were already processed,
+a hash of each processed row and the cleaned rows themselves.
+Form submissions are appended below the last row, so a run only has to read (and clean)
+the rows after the watermark and merge them with the rows kept here.
+The report is sorted by Last_Name after every run, so processed rows move around above
+the watermark: the check is that the last processed row is still one of ours and that
+none of the rows below it is (a row inserted above the watermark pushes one of ours down).
+"""
+import os
+import time
+import hashlib
+import logging
+
+from statefile import load_json, save_json
+
+RANGE_COLUMNS = "A:I" # response sheet columns
+
+
+def row_hash(row: list) -> str:
+    """Hash of a raw row as returned by the Sheets API"""
+    return hashlib.sha1("\x1f".join(str(value) for value in row).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseWatermark:
+
+    def __init__(self, sheet_id: str, header: list, rows=(), hashes=(), seeded_at: float = None) -> None:
+        self.sheet_id = sheet_id
+        self.header = list(header)
+        self.rows = [list(row) for row in rows] # cleaned rows, serialized (see main.serialize_df)
+        self.hashes = list(hashes) # raw row hashes, in the order they were processed
+        self.hash_set = set(self.hashes) # same hashes, for lookups
+        self.seeded_at = seeded_at or time.time() # last full read of the sheet
+
+    def __len__(self) -> int:
+        """Number of processed rows, the header is row 1 so the last one is sheet row len + 1"""
+        return len(self.hashes)
+
+    @staticmethod
+    def path_for(state_dir: str, sheet_id: str) -> str:
+        """One state file per response sheet"""
+        return os.path.join(state_dir, f"response_watermark_{sheet_id}.json")
+
+    @classmethod
+    def load(cls, state_dir: str, sheet_id: str, max_age_days: float = None):
+        """Return watermark saved on disk. None if missing, unreadable or older than max_age_days,
+        meaning the caller must read the whole sheet again.
+        """
+        data = load_json(cls.path_for(state_dir, sheet_id), "response watermark", "full read")
+        if data is None:
+            return None
+
+        watermark = cls(data["sheet_id"], data["header"], data["rows"], data["hashes"], data["seeded_at"])
+        if max_age_days is not None and time.time() - watermark.seeded_at > max_age_days * 86400:
+            logging.info(f"Response watermark for {sheet_id} is older than {max_age_days} days - full read")
+            return None
+        return watermark
+
+    def save(self, state_dir: str) -> str:
+        return save_json(self.path_for(state_dir, self.sheet_id), {
+            "sheet_id": self.sheet_id,
+            "header": self.header,
+            "seeded_at": self.seeded_at,
+            "hashes": self.hashes,
+            "rows": self.rows,
+        })
+
+    def fetch_range(self, sheet_range: str = RANGE_COLUMNS) -> str:
+        """Range to read: the whole sheet without a watermark, else the last processed row and everything below"""
+        if not self.hashes:
+            return sheet_range
+        first_column, last_column = sheet_range.split(":")
+        return f"{first_column}{len(self) + 1}:{last_column}"
+
+    def new_rows(self, values: list):
+        """Return the rows of values (read from fetch_range) that were not processed yet.
+        None if the sheet changed above the watermark (rows deleted or inserted), the caller
+        must then read the whole sheet again
+        """
+        if not self.hashes:
+            return values[1:]
+        if not values or row_hash(values[0]) not in self.hash_set:
+            return None
+        if any(row_hash(row) in self.hash_set for row in values[1:]):
+            return None # a processed row was pushed below the watermark
+        return values[1:]
+
+    def add(self, raw_rows: list, cleaned_rows: list) -> None:
+        """Mark raw_rows as processed, keeping their cleaned version"""
+        hashes = [row_hash(row) for row in raw_rows]
+        self.hashes.extend(hashes)
+        self.hash_set.update(hashes)
+        self.rows.extend(cleaned_rows)
@@ -0,0 +1,186 @@
+"""Declared layout of the sheets the app reads: progress, pubs (volunteer map), the monthly
+response sheets and the data warehouse. Column names, kind and nullability live here
+instead of being spread over main.py.
+Frames are validated once, right after they are read (before any write or text). Each column is
+factorized once and checked on its distinct values only. Column letters for writers are computed
+once per header.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+NAME_COL = "¿Cual es su nombre?"
+HOURS_COL = "Horas"
+FLAG_VALUES = ("y", "n")
+SHEET_URL = re.compile(r"/spreadsheets/d/[\w-]+")
+MAX_REPORTED_ROWS = 5 # rows listed per problem, the rest are counted
+
+
+class SchemaError(ValueError):
+    """Raised when a sheet doesn't match its schema. problems has every issue found, not only the first"""
+
+    def __init__(self, sheet: str, problems: list) -> None:
+        self.sheet, self.problems = sheet, problems
+        super().__init__(f"{sheet} sheet does not match its schema: {'; '.join(problems)}")
+
+
+def column_letter(column_number: int) -> str:
+    """Return A1 style column letter(s) for a 1 based column number. 1 = A, 27 = AA"""
+    letters = ''
+    while column_number > 0:
+        column_number, remainder = divmod(column_number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def column_number(column_letters: str) -> int:
+    """Return 1 based column number for A1 style column letter(s). A = 1, AA = 27"""
+    number = 0
+    for letter in column_letters.upper():
+        number = number * 26 + (ord(letter) - 64)
+    return number
+
+
+def blank(values) -> pd.Series:
+    """True where a value is missing or only whitespace"""
+    return values.isna() | values.astype(str).str.strip().eq('')
+
+
+# kind -> mask of INVALID values, only called with the non blank ones
+CHECKS = {
+    "text": None,
+    "number": lambda values: pd.to_numeric(values, errors="coerce").isna(),
+    "flag": lambda values: ~values.astype(str).str.strip().str.lower().isin(FLAG_VALUES),
+    "sheet_url": lambda values: ~values.astype(str).str.contains(SHEET_URL),
+}
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    kind: str = "text" # see CHECKS
+    nullable: bool = True
+    unique: bool = False
+    letter: str = None # written by the app at a fixed column outside of the read range, never validated
+
+    def __post_init__(self):
+        if self.kind not in CHECKS:
+            raise ValueError(f"Unknown column kind {self.kind!r} for {self.name!r}")
+
+
+class SheetSchema:
+
+    def __init__(self, name: str, columns) -> None:
+        self.name = name
+        self.columns = tuple(columns)
+        self.required = [column.name for column in self.columns if column.letter is None]
+        self._letters = {} # tuple(header) -> {column: letter}
+
+    def __repr__(self) -> str:
+        return f"SheetSchema({self.name!r}: {', '.join(column.name for column in self.columns)})"
+
+    def validate(self, df, source: str = None, first_row: int = 2):
+        """Raise SchemaError listing every problem of df: missing columns, blanks in non nullable
+        columns, invalid values and duplicates. Columns not declared here are not checked.
+
+        Args:
+            source str: sheet id (or anything else) added to the error
+            first_row int: sheet row of df's first row, so errors point at real rows
+
+        Returns:
+            df, unchanged
+        """
+        problems = [f"missing column {name!r}" for name in self.required if name not in df.columns]
+        if duplicated := sorted({col for col in df.columns[df.columns.duplicated()] if col in self.required}):
+            problems.append(f"duplicate column(s) {duplicated}")
+
+        for column in self.columns:
+            if column.letter or column.name not in df.columns or column.name in duplicated:
+                continue
+            # one hashing pass per column, checks run on the distinct values (few for flags and months)
+            codes, uniques = pd.factorize(df[column.name])
+            uniques = pd.Series(uniques, dtype=object)
+            # per distinct value arrays get one extra slot, so missing values (code -1) index it
+            blank_of = np.append(blank(uniques).to_numpy(), True)
+            unique_blank, is_blank = blank_of[:-1], blank_of[codes]
+
+            if not column.nullable and is_blank.any():
+                problems.append(f"{column.name!r} is empty in {self.rows(is_blank, first_row)}")
+            if (check := CHECKS[column.kind]) and (~unique_blank).any():
+                unique_invalid = np.zeros(len(uniques) + 1, dtype=bool)
+                unique_invalid[:-1][~unique_blank] = check(uniques[~unique_blank]).to_numpy()
+                if unique_invalid.any():
+                    invalid = unique_invalid[codes]
+                    sample = uniques[unique_invalid[:-1]].head(MAX_REPORTED_ROWS).to_list()
+                    problems.append(
+                        f"{column.name!r} has invalid {column.kind} value(s) {sample} in {self.rows(invalid, first_row)}")
+            if column.unique:
+                counts = np.bincount(codes[~is_blank], minlength=len(uniques) + 1)
+                repeated = ~is_blank & (counts[codes] > 1)
+                if repeated.any():
+                    problems.append(f"{column.name!r} repeats in {self.rows(repeated, first_row)}")
+
+        if problems:
+            raise SchemaError(f"{self.name} {source}" if source else self.name, problems)
+        return df
+
+    @staticmethod
+    def rows(mask, first_row: int) -> str:
+        """'row(s) 3, 7' of the sheet where mask (bool array) is True"""
+        positions = mask.nonzero()[0]
+        listed = ", ".join(str(position + first_row) for position in positions[:MAX_REPORTED_ROWS])
+        more = f" (+{len(positions) - MAX_REPORTED_ROWS} more)" if len(positions) > MAX_REPORTED_ROWS else ""
+        return f"row(s) {listed}{more}"
+
+    def letters(self, header) -> dict:
+        """{column: A1 letter} for a sheet with this header (plus the fixed letter columns).
+        Computed once per distinct header
+        """
+        key = tuple(header)
+        if key not in self._letters:
+            letters = {name: column_letter(position + 1) for position, name in reversed(list(enumerate(key)))}
+            letters.update({column.name: column.letter for column in self.columns if column.letter})
+            self._letters[key] = letters
+        return self._letters[key]
+
+    def letter(self, name: str, header=()) -> str:
+        """A1 letter of column name. Raises SchemaError if the sheet doesn't have it"""
+        try:
+            return self.letters(header)[name]
+        except KeyError:
+            raise SchemaError(self.name, [f"missing column {name!r}"]) from None
+
+
+PROGRESS = SheetSchema("progress", [
+    Column("year_month", nullable=False),
+    Column("response_sheet_url", "sheet_url", nullable=False),
+    Column("form_url"),
+    Column("status"),
+])
+PUBS = SheetSchema("pubs", [
+    Column("row_id", nullable=False, unique=True),
+    Column("First_Name", nullable=False),
+    Column("Last_Name"),
+    Column("Cell"),
+    Column("permission_to_contact?", "flag"),
+    Column("delegate_notification_to"),
+    Column("Active?", "flag"),
+])
+RESPONSE = SheetSchema("response", [
+    Column("Timestamp", nullable=False),
+    Column(NAME_COL, nullable=False),
+    Column(HOURS_COL, "number"),
+    Column("Last_Name", letter="J"), # sort key formulas, right after the form's columns (A:I)
+])
+WAREHOUSE = SheetSchema("warehouse", [
+    Column("Year-Month", nullable=False),
+    Column(NAME_COL, nullable=False),
+    Column(HOURS_COL, "number"),
+])
+SCHEMAS = {schema.name: schema for schema in (PROGRESS, PUBS, RESPONSE, WAREHOUSE)}
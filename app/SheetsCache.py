@@ -0,0 +1,145 @@
+"""On-disk cache for Google Sheets reads.
+Each (spreadsheet, range) is stored as a compressed, column oriented file together
+with the spreadsheet revision (Drive `version`/`modifiedTime`) it was read at.
+A read only pays for a cheap Drive metadata call, values are re-downloaded only
+when the spreadsheet changed, the entry is older than the TTL or metadata is unavailable.
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from metrics import REGISTRY
+
+SHEETS_CACHE_DIR = os.getenv("SHEETS_CACHE_DIR", ".sheets_cache") # empty string disables the cache
+SHEETS_CACHE_TTL = int(os.getenv("SHEETS_CACHE_TTL", 7 * 86400)) # seconds, refetch even if unchanged
+SHEETS_CACHE_MAX_BYTES = int(os.getenv("SHEETS_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+REVISION_CHECK_SECONDS = 60 # one metadata call per spreadsheet within this window
+
+
+def to_columns(values: list) -> dict:
+    """Return ragged rows as equal length columns + row lengths (Sheets drops trailing empty cells)"""
+    row_lengths = [len(row) for row in values]
+    width = max(row_lengths, default=0)
+    columns = [[row[col] if col < len(row) else None for row in values] for col in range(width)]
+    return {"row_lengths": row_lengths, "columns": columns}
+
+
+def from_columns(data: dict) -> list:
+    """Inverse of to_columns, returns exactly the rows the API returned"""
+    rows = zip(*data["columns"]) if data["columns"] else ([] for _ in data["row_lengths"])
+    return [list(row)[:length] for row, length in zip(rows, data["row_lengths"])]
+
+
+class SheetsCache:
+
+    def __init__(self, cache_dir=None, drive_service=None, ttl=None, max_bytes=None, clock=time.time,
+                 drive_service_factory=None) -> None:
+        """drive_service: Drive v3 service, OR drive_service_factory: callable returning the
+        calling thread's Drive service (services are not thread safe)
+        """
+        self.cache_dir = cache_dir or SHEETS_CACHE_DIR
+        self.drive_service_factory = drive_service_factory or (lambda: drive_service)
+        self.ttl = ttl or SHEETS_CACHE_TTL
+        self.max_bytes = max_bytes or SHEETS_CACHE_MAX_BYTES
+        self.clock = clock
+        self.revisions = {} # sheet_id -> (checked_at, revision)
+        self.metadata_available = drive_service is not None or drive_service_factory is not None
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, sheet_id: str, sheet_range: str) -> str:
+        key = hashlib.sha1(f"{sheet_id}|{sheet_range}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def revision(self, sheet_id: str) -> str:
+        """Return current revision of the spreadsheet, None if it can't be checked"""
+        if not self.metadata_available:
+            return None
+        with self.lock:
+            checked_at, revision = self.revisions.get(sheet_id, (None, None))
+        if checked_at is not None and self.clock() - checked_at < REVISION_CHECK_SECONDS:
+            return revision
+
+        try:
+            metadata = self.drive_service_factory().files().get(
+                fileId=sheet_id, fields='version,modifiedTime', supportsAllDrives=True).execute()
+        except Exception:
+            # ex) Drive API not enabled - stop asking, reads go straight to Sheets
+            logging.warning("Sheets cache: can't read Drive metadata, cache disabled", exc_info=True)
+            self.metadata_available = False
+            return None
+
+        revision = str(metadata.get('version') or metadata.get('modifiedTime'))
+        with self.lock:
+            self.revisions[sheet_id] = (self.clock(), revision)
+        return revision
+
+    def get(self, sheet_id: str, sheet_range: str, revision: str):
+        """Return cached values for revision, None on a miss"""
+        path = self.path_for(sheet_id, sheet_range)
+        entry = None
+        if revision is not None:
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as cache_file:
+                    entry = json.load(cache_file)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError):
+                logging.warning(f"Sheets cache: corrupt entry {path}", exc_info=True)
+
+        if (entry is None
+                or entry['revision'] != revision
+                or self.clock() - entry['fetched_at'] > self.ttl):
+            with self.lock:
+                self.misses += 1
+            REGISTRY.inc("cache_misses_total", cache="sheets")
+            return None
+
+        os.utime(path) # mark as recently used for eviction
+        with self.lock:
+            self.hits += 1
+        REGISTRY.inc("cache_hits_total", cache="sheets")
+        return from_columns(entry)
+
+    def put(self, sheet_id: str, sheet_range: str, values: list, revision: str) -> None:
+        if revision is None:
+            return
+        path = self.path_for(sheet_id, sheet_range)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as cache_file:
+            json.dump(
+                {'sheet_id': sheet_id, 'range': sheet_range, 'revision': revision,
+                 'fetched_at': self.clock(), **to_columns(values)},
+                cache_file,
+                ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json.gz'):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+
+    def read(self, sheet_id: str, sheet_range: str, fetch) -> list:
+        """Return values for (sheet_id, sheet_range), calling fetch() only on a cache miss"""
+        revision = self.revision(sheet_id) # BEFORE reading values, never cache newer data as older
+        values = self.get(sheet_id, sheet_range, revision)
+        if values is None:
+            values = fetch()
+            self.put(sheet_id, sheet_range, values, revision)
+        return values
@@ -1,8 +1,230 @@
-'''Class to handle data transformations'''
+'''Class to handle data transformations.
+A Transformer is a declarative list of column steps. It is compiled once per
+DataFrame schema (steps for missing columns dropped, adjacent string ops on the same
+column fused into one pass over the unique values) and every step is timed.
+'''
+from __future__ import annotations
+
+import re
+import time
+import logging
+from functools import lru_cache
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+unidecode = lazy_import("unidecode") # only loaded when names are cleaned
+
+WHITESPACE = re.compile(r"\s+")
+NAME_CACHE_SIZE = 4096 # same few hundred names repeat every month
+STRING_OPS = {
+    'collapse_spaces': lambda value: WHITESPACE.sub(" ", value),
+    'strip': str.strip,
+    'title': str.title,
+    'lower': str.lower,
+    'unaccent': lambda value: unidecode.unidecode(value),
+}
+NAME_OPS = ('collapse_spaces', 'strip', 'title', 'unaccent') # what normalize_name does
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_name(raw_name: str) -> str:
+    """Return name trimmed, with single spaces, in Title Case and without accents
+    ex) '  josé   PÉREZ ' -> 'Jose Perez'
+    Memoized by raw string, each distinct spelling is only cleaned once per process.
+    """
+    return unidecode.unidecode(WHITESPACE.sub(" ", raw_name).strip().title())
+
+
+def map_unique(values, func):
+    """Return func applied to each DISTINCT value of a Series, mapped back by factorized code.
+    Empty values (None/NaN) are kept as they are. Returns None if nothing changed
+    """
+    codes, uniques = pd.factorize(values)
+    cleaned = np.empty(len(uniques), dtype=object)
+    cleaned[:] = [func(str(value)) for value in uniques]
+    if len(uniques) and all(new == old for new, old in zip(cleaned, uniques)):
+        return None
+
+    out = cleaned.take(codes) if len(cleaned) else np.empty(len(codes), dtype=object)
+    is_missing = codes == -1
+    if is_missing.any():
+        out[is_missing] = values.to_numpy(dtype=object)[is_missing]
+    return pd.Series(out, index=values.index, name=values.name, dtype=object)
+
+
+class Step:
+    """One column transformation. reads: columns that must exist for the step to run, writes: columns it adds"""
+    reads = ()
+    writes = ()
+
+    def fuse(self, other: Step):
+        """Return one step doing self then other, None if they can't be fused"""
+        return None
+
+    def __call__(self, df, params: dict) -> None:
+        raise NotImplementedError
+
+
+class Strings(Step):
+    """Chain of STRING_OPS on one text column, run once per distinct value"""
+
+    def __init__(self, column, *ops) -> None:
+        if unknown := [op for op in ops if op not in STRING_OPS]:
+            raise ValueError(f"Unknown string op(s): {unknown}")
+        self.column, self.ops, self.reads = column, tuple(ops), (column,)
+
+    def fuse(self, other: Step):
+        """Return one step doing self then other, None if they can't be fused"""
+        if isinstance(other, Strings) and other.column == self.column:
+            return Strings(self.column, *self.ops, *other.ops)
+
+    def function(self):
+        if self.ops == NAME_OPS:
+            return normalize_name # memoized across runs
+        funcs = [STRING_OPS[op] for op in self.ops]
+
+        def apply_all(value):
+            for func in funcs:
+                value = func(value)
+            return value
+        return apply_all
+
+    def __call__(self, df, params) -> None:
+        cleaned = map_unique(df[self.column], self.function())
+        if cleaned is not None: # skip unchanged columns
+            df[self.column] = cleaned
+
+    def __repr__(self) -> str:
+        return f"strings({self.column!r}: {'+'.join(self.ops)})"
+
+
+class Numeric(Step):
+    """Parse a column to numbers: whole numbers stay int64, decimals (1.5 Horas) become float"""
+
+    def __init__(self, column) -> None:
+        self.column, self.reads = column, (column,)
+
+    def __call__(self, df, params) -> None:
+        if not pd.api.types.is_numeric_dtype(df[self.column]):
+            df[self.column] = pd.to_numeric(df[self.column])
+
+    def __repr__(self) -> str:
+        return f"numeric({self.column!r})"
+
+
+class Nullable(Step):
+    """Parse a column to nullable numbers: Int64 if every value is whole, else Float64. Blanks become <NA>"""
+
+    def __init__(self, column) -> None:
+        self.column, self.reads = column, (column,)
+
+    def __call__(self, df, params) -> None:
+        values = df[self.column]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values.replace('', None))
+        df[self.column] = values.convert_dtypes(infer_objects=False, convert_string=False, convert_boolean=False)
+
+    def __repr__(self) -> str:
+        return f"nullable({self.column!r})"
+
+
+class Category(Step):
+    """Store a low cardinality text column (ex. Year-Month) as a categorical"""
+
+    def __init__(self, column) -> None:
+        self.column, self.reads = column, (column,)
+
+    def __call__(self, df, params) -> None:
+        df[self.column] = df[self.column].astype('category')
+
+    def __repr__(self) -> str:
+        return f"category({self.column!r})"
+
+
+class Concat(Step):
+    """target = columns joined by sep, empty values as ''"""
+
+    def __init__(self, target, columns, sep=' ') -> None:
+        self.target, self.reads, self.sep = target, tuple(columns), sep
+        self.writes = (target,)
+
+    def __call__(self, df, params) -> None:
+        first, *rest = [df[col].fillna('').astype(str) for col in self.reads]
+        df[self.target] = first.str.cat(rest, sep=self.sep) if rest else first
+
+    def __repr__(self) -> str:
+        return f"concat({self.target!r} <- {', '.join(self.reads)})"
+
+
+class Rename(Step):
+
+    def __init__(self, mapping: dict) -> None:
+        self.mapping, self.reads = mapping, tuple(mapping)
+
+    def __call__(self, df, params) -> None:
+        df.rename(columns=self.mapping, inplace=True)
+
+    def __repr__(self) -> str:
+        return f"rename({self.mapping})"
+
+
+class Constant(Step):
+    """column = value, or = params[param] given to Transformer.apply"""
+
+    def __init__(self, column, value=None, param=None) -> None:
+        self.column, self.value, self.param = column, value, param
+        self.writes = (column,)
+
+    def __call__(self, df, params) -> None:
+        df[self.column] = params[self.param] if self.param else self.value
+
+    def __repr__(self) -> str:
+        return f"constant({self.column!r} = {self.param or self.value!r})"
+
+
+def compile_steps(steps, columns) -> list:
+    """Return the steps that apply to a frame with these columns, adjacent string ops fused"""
+    available = set(columns)
+    compiled = []
+    for step in steps:
+        if any(col not in available for col in step.reads):
+            logging.debug(f"Transformer: skipping {step}, column not in data")
+            continue
+        fused = compiled[-1].fuse(step) if compiled else None
+        if fused:
+            compiled[-1] = fused
+        else:
+            compiled.append(step)
+        # columns produced by this step are available to the next ones
+        if isinstance(step, Rename):
+            available = {step.mapping.get(col, col) for col in available}
+        available.update(step.writes)
+    return compiled
+
 
-### WIP ### 
 class Transformer(object):
 
-    def clean_spaces(self, value: str) -> str:
-        pass
+    def __init__(self, steps=(), name: str = "transformer") -> None:
+        self.steps = list(steps)
+        self.name = name
+        self.compiled = {} # tuple(columns) -> compiled steps
+        self.timings = [] # (step, seconds) of the last apply
+
+    def compile(self, columns) -> list:
+        key = tuple(columns)
+        if key not in self.compiled:
+            self.compiled[key] = compile_steps(self.steps, key)
+        return self.compiled[key]
 
+    def apply(self, df, **params):
+        """Run the pipeline on df IN PLACE (and return it). params feed Constant(param=...) steps"""
+        self.timings = []
+        for step in self.compile(df.columns):
+            started = time.perf_counter()
+            step(df, params)
+            self.timings.append((step, time.perf_counter() - started))
+        if self.timings:
+            logging.debug(f"{self.name}: " + ", ".join(f"{step} {seconds * 1000:.1f}ms" for step, seconds in self.timings))
+        return df
@@ -0,0 +1,123 @@
+"""Send SMS through Twilio from a bounded thread pool.
+One client (and HTTP session) is shared, sends are throttled by a token bucket
+and transient errors (429/5xx, connection errors) are retried with jittered backoff.
+"""
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from RateLimiter import RETRY_STATUSES, TokenBucket, backoff_seconds
+from metrics import REGISTRY
+
+TWILIO_MPS = float(os.getenv("TWILIO_MPS", 1)) # messages per second allowed for our account/number
+TWILIO_MAX_WORKERS = int(os.getenv("TWILIO_MAX_WORKERS", 4))
+TWILIO_MAX_ATTEMPTS = int(os.getenv("TWILIO_MAX_ATTEMPTS", 4))
+MAX_BACKOFF_SECONDS = 30
+
+_client = None
+_client_lock = threading.Lock()
+_limiter = None # shared by every sender, the rate limit is per account/number not per tenant
+
+
+@dataclass
+class MessageResult:
+    """Outcome of one message. elapsed includes retries and rate limit waits (seconds)"""
+    name: str
+    to: str
+    sid: str = None
+    status: str = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    error: str = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def get_twilio_client():
+    """Return the process wide Twilio client. Its HTTP session keeps connections open between sends"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from twilio.rest import Client as TwilioClient
+            from twilio.http.http_client import TwilioHttpClient
+
+            _client = TwilioClient(
+                os.getenv('TWILIO_ACCOUNT_SID'),
+                os.getenv('TWILIO_AUTH_TOKEN'),
+                http_client=TwilioHttpClient(pool_connections=True, timeout=30))
+            logging.info(f"twilio logging level: {_client.http_client.logger.level}")
+    return _client
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Return the process wide TWILIO_MPS token bucket"""
+    global _limiter
+    with _client_lock:
+        if _limiter is None:
+            _limiter = TokenBucket(TWILIO_MPS)
+    return _limiter
+
+
+def is_transient(error: Exception) -> bool:
+    """True if sending again may work: rate limited, Twilio 5xx or network errors"""
+    if getattr(error, 'status', None) in RETRY_STATUSES:
+        return True
+    from requests.exceptions import ConnectionError, Timeout
+    return isinstance(error, (ConnectionError, Timeout))
+
+
+class TwilioSender:
+
+    def __init__(self, client=None, from_=None, rate=None, max_workers=None, max_attempts=None,
+                 backoff_base=1.0, sleep=time.sleep) -> None:
+        self.client = client or get_twilio_client()
+        self.from_ = from_ or os.getenv('TWILIO_NUM')
+        self.limiter = TokenBucket(rate, sleep=sleep) if rate else get_rate_limiter()
+        self.max_workers = max_workers or TWILIO_MAX_WORKERS
+        self.max_attempts = max_attempts or TWILIO_MAX_ATTEMPTS
+        self.backoff_base = backoff_base
+        self.sleep = sleep
+
+    def send_one(self, to: str, body: str, name: str = None) -> MessageResult:
+        """Send a single message, retrying transient errors. Never raises, check result.ok"""
+        result = MessageResult(name=name, to=to)
+        started = time.perf_counter()
+
+        while result.attempts < self.max_attempts:
+            result.attempts += 1
+            if waited := self.limiter.acquire():
+                REGISTRY.inc("twilio_throttled_seconds_total", waited)
+            try:
+                message = self.client.messages.create(body=body, from_=self.from_, to=to)
+                result.sid, result.status, result.error = message.sid, message.status, None
+                REGISTRY.inc("twilio_requests_total", outcome="sent")
+                REGISTRY.inc("twilio_bytes_total", len(body.encode()))
+                break
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+                REGISTRY.inc("twilio_requests_total", outcome="error", status=getattr(e, 'status', None) or "none")
+                if not is_transient(e) or result.attempts >= self.max_attempts:
+                    logging.error(f"Failed msg for {name} after {result.attempts} attempt(s)", exc_info=True)
+                    break
+                backoff = backoff_seconds(result.attempts, self.backoff_base, MAX_BACKOFF_SECONDS)
+                logging.warning(f"Transient error for {name}, retrying in {backoff:.1f}s: {result.error}")
+                self.sleep(backoff)
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def send_many(self, messages: list) -> list:
+        """Send messages concurrently. messages: [{'name', 'to', 'body'}]
+        Returns MessageResult per message, in the same order
+        """
+        if not messages:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(messages))) as pool:
+            return list(pool.map(
+                lambda message: self.send_one(message['to'], message['body'], message.get('name')),
+                messages))
@@ -0,0 +1,74 @@
+"""Small local index of the keys already stored in the data warehouse sheet.
+Lets the app append only NEW (Year-Month, name) rows without re-reading
+the whole warehouse on every run.
+"""
+import os
+import time
+import logging
+
+from statefile import load_json, save_json
+
+
+class WarehouseKeyIndex:
+
+    def __init__(self, sheet_id: str, header: list, keys=(), seeded_at: float = None) -> None:
+        self.sheet_id = sheet_id
+        self.header = list(header)
+        self.keys = {tuple(key) for key in keys}
+        self.seeded_at = seeded_at or time.time()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def path_for(index_dir: str, sheet_id: str) -> str:
+        """One index file per warehouse sheet"""
+        return os.path.join(index_dir, f"dbwh_key_index_{sheet_id}.json")
+
+    @classmethod
+    def from_dataframe(cls, sheet_id: str, df, month_col="Year-Month", name_col="¿Cual es su nombre?"):
+        """Seed index from a full read of the warehouse"""
+        return cls(
+            sheet_id=sheet_id,
+            header=df.columns.to_list(),
+            keys=zip(df[month_col].to_list(), df[name_col].to_list()))
+
+    @classmethod
+    def from_chunks(cls, sheet_id: str, chunks, month_col="Year-Month", name_col="¿Cual es su nombre?"):
+        """Seed index from a streamed read of the warehouse (DataFrame chunks). None if there are no chunks"""
+        index = None
+        for chunk in chunks:
+            if index is None:
+                index = cls(sheet_id=sheet_id, header=chunk.columns.to_list())
+            index.add(chunk[month_col].to_list(), chunk[name_col].to_list())
+        return index
+
+    @classmethod
+    def load(cls, index_dir: str, sheet_id: str, max_age_days: float = None):
+        """Return index saved on disk. None if missing, unreadable or older than max_age_days,
+        meaning the caller must re-seed it from the warehouse.
+        """
+        data = load_json(cls.path_for(index_dir, sheet_id), "warehouse index", "re-seeding")
+        if data is None:
+            return None
+
+        index = cls(data["sheet_id"], data["header"], data["keys"], data["seeded_at"])
+        if max_age_days is not None and time.time() - index.seeded_at > max_age_days * 86400:
+            logging.info(f"Warehouse index for {sheet_id} is older than {max_age_days} days - re-seeding")
+            return None
+        return index
+
+    def save(self, index_dir: str) -> str:
+        return save_json(self.path_for(index_dir, self.sheet_id), {
+            "sheet_id": self.sheet_id,
+            "header": self.header,
+            "seeded_at": self.seeded_at,
+            "keys": sorted(self.keys),
+        })
+
+    def contains(self, months, names) -> list:
+        """Return list of bools, True if (month, name) is already in the warehouse"""
+        return [(month, name) in self.keys for month, name in zip(months, names)]
+
+    def add(self, months, names) -> None:
+        self.keys.update(zip(months, names))
@@ -0,0 +1,184 @@
+"""Collect a run's Sheets mutations and send them as one spreadsheets().batchUpdate per spreadsheet.
+Requests are applied by the API in the order they were planned and all-or-nothing,
+so a sheet is never left half updated (ex. Last_Name formulas written but not sorted).
+"""
+import re
+import logging
+
+MAX_CELLS_PER_REQUEST = 200_000 # keeps each batchUpdate payload well under the API request size limit
+CELL_REF = re.compile(r"^([A-Z]+)(\d+)$")
+NUMBER = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$") # what Sheets parses as a plain number
+
+
+def cell_data(value) -> dict:
+    """Return CellData for a serialized value, typed the way USER_ENTERED input would be
+    (the values().update/append fallback): strings starting with '=' are formulas, numeric
+    strings ("3", "1.5") numbers and TRUE/FALSE booleans, so both write paths store the same cell types.
+    Dates are the exception, they are stored as the text they were read as
+    """
+    if value is None or value == '':
+        return {} # clears the cell
+    if isinstance(value, bool):
+        return {'userEnteredValue': {'boolValue': value}}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    value = str(value)
+    if value.startswith('='):
+        return {'userEnteredValue': {'formulaValue': value}}
+    text = value.strip()
+    if NUMBER.match(text):
+        return {'userEnteredValue': {'numberValue': int(text) if text.lstrip('+-').isdigit() else float(text)}}
+    if text.upper() in ('TRUE', 'FALSE'):
+        return {'userEnteredValue': {'boolValue': text.upper() == 'TRUE'}}
+    return {'userEnteredValue': {'stringValue': value}}
+
+
+def row_data(values: list) -> list:
+    return [{'values': [cell_data(value) for value in row]} for row in values]
+
+
+def grid_index(cell: str) -> tuple:
+    """Return zero based (row, column) of an A1 cell, ex) 'J1' -> (0, 9)"""
+    match = CELL_REF.match(cell.upper())
+    if not match:
+        raise ValueError(f"Not an A1 cell reference: {cell}")
+    letters, row = match.groups()
+    column = 0
+    for letter in letters:
+        column = column * 26 + ord(letter) - ord('A') + 1
+    return int(row) - 1, column - 1
+
+
+class WritePlanner:
+
+    def __init__(self, sheets_service, max_cells=None) -> None:
+        self.sheets_service = sheets_service
+        self.max_cells = max_cells or MAX_CELLS_PER_REQUEST
+        self.plans = {} # spreadsheet id -> [(request, cells, description)], in planned order
+        self.callbacks = {} # spreadsheet id -> [callback], called once its writes succeeded
+
+    def _add(self, sheet_id, request, cells, description) -> None:
+        self.plans.setdefault(sheet_id, []).append((request, cells, description))
+
+    def update_cells(self, sheet_id, sheet_gid, start_cell, values, label=None) -> None:
+        """Write values (list of rows) starting at start_cell ('A2') of tab sheet_gid"""
+        if not values:
+            return
+        row, column = grid_index(start_cell)
+        width = max(len(values_row) for values_row in values) or 1
+        rows_per_request = max(1, self.max_cells // width)
+        for offset in range(0, len(values), rows_per_request):
+            chunk = values[offset:offset + rows_per_request]
+            self._add(
+                sheet_id,
+                {'updateCells': {
+                    'start': {'sheetId': int(sheet_gid), 'rowIndex': row + offset, 'columnIndex': column},
+                    'rows': row_data(chunk),
+                    'fields': 'userEnteredValue'}},
+                sum(len(chunk_row) for chunk_row in chunk),
+                f"{label or 'update'}: {len(chunk)} row(s) at gid {sheet_gid} row {row + offset + 1}")
+
+    def append_rows(self, sheet_id, sheet_gid, values, label=None) -> None:
+        """Append rows after the last row with data of tab sheet_gid"""
+        width = max((len(values_row) for values_row in values), default=1) or 1
+        rows_per_request = max(1, self.max_cells // width)
+        for offset in range(0, len(values), rows_per_request):
+            chunk = values[offset:offset + rows_per_request]
+            self._add(
+                sheet_id,
+                {'appendCells': {'sheetId': int(sheet_gid), 'rows': row_data(chunk), 'fields': 'userEnteredValue'}},
+                sum(len(chunk_row) for chunk_row in chunk),
+                f"{label or 'append'}: {len(chunk)} row(s) to gid {sheet_gid}")
+
+    def clear(self, sheet_id, sheet_gid, start_row=0, label=None) -> None:
+        """Clear every value from start_row (0 based) down, ex) before rewriting a whole tab"""
+        self._add(
+            sheet_id,
+            # updateCells without rows clears the fields of the range
+            {'updateCells': {
+                'range': {'sheetId': int(sheet_gid), 'startRowIndex': start_row}, 'fields': 'userEnteredValue'}},
+            0,
+            f"{label or 'clear'}: gid {sheet_gid} from row {start_row + 1}")
+
+    def sort(self, sheet_id, sheet_gid, column="J", order="ASCENDING", start_row=1, label=None) -> None:
+        """Sort rows from start_row (0 based, 1 = keep header) by column letter"""
+        self._add(
+            sheet_id,
+            {'sortRange': {
+                # MUST start at column 0 to sort whole rows or else data corruption occurs
+                'range': {'sheetId': int(sheet_gid), 'startRowIndex': start_row, 'startColumnIndex': 0},
+                'sortSpecs': [{'dimensionIndex': grid_index(f"{column}1")[1], 'sortOrder': order}]}},
+            0,
+            f"{label or 'sort'}: gid {sheet_gid} by {column} {order}")
+
+    def add_sheet(self, sheet_id, sheet_gid, title, label=None) -> None:
+        """Add a tab with a chosen gid, so later requests of the same plan can write to it"""
+        self._add(
+            sheet_id,
+            {'addSheet': {'properties': {'sheetId': int(sheet_gid), 'title': title}}},
+            0,
+            f"{label or 'add tab'}: {title} (gid {sheet_gid})")
+
+    def copy_values(self, sheet_id, source_gid, target_gid, rows, columns, label=None) -> None:
+        """Copy the values of the first rows x columns of tab source_gid to A1 of tab target_gid.
+        Copied by the API, so the request size doesn't depend on how many cells are copied
+        """
+        self._add(
+            sheet_id,
+            {'copyPaste': {
+                'source': {'sheetId': int(source_gid), 'startRowIndex': 0, 'endRowIndex': rows,
+                           'startColumnIndex': 0, 'endColumnIndex': columns},
+                # a one cell destination gets the whole source, larger ones would repeat it
+                'destination': {'sheetId': int(target_gid), 'startRowIndex': 0, 'endRowIndex': 1,
+                                'startColumnIndex': 0, 'endColumnIndex': 1},
+                'pasteType': 'PASTE_VALUES'}},
+            0,
+            f"{label or 'copy'}: {rows} row(s) from gid {source_gid} to gid {target_gid}")
+
+    def delete_sheet(self, sheet_id, sheet_gid, label=None) -> None:
+        self._add(sheet_id, {'deleteSheet': {'sheetId': int(sheet_gid)}}, 0, f"{label or 'delete tab'}: gid {sheet_gid}")
+
+    def on_success(self, sheet_id, callback) -> None:
+        """Call callback() after every planned write to sheet_id was applied"""
+        self.callbacks.setdefault(sheet_id, []).append(callback)
+
+    def planned(self) -> dict:
+        """Return {spreadsheet id: [description of each planned request]}"""
+        return {sheet_id: [description for _, _, description in plan] for sheet_id, plan in self.plans.items()}
+
+    def describe(self) -> str:
+        return "; ".join(
+            f"{sheet_id}: {', '.join(descriptions)}" for sheet_id, descriptions in self.planned().items()
+        ) or "no writes planned"
+
+    def batches(self, sheet_id) -> list:
+        """Requests for sheet_id grouped so no batchUpdate has more than max_cells cells.
+        Only very large writes need more than one call
+        """
+        batches, batch, batch_cells = [], [], 0
+        for request, cells, _ in self.plans.get(sheet_id, []):
+            if batch and batch_cells + cells > self.max_cells:
+                batches.append(batch)
+                batch, batch_cells = [], 0
+            batch.append(request)
+            batch_cells += cells
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def flush(self) -> dict:
+        """Send the planned writes, one batchUpdate per spreadsheet.
+        Returns {spreadsheet id: [API responses]}. Raises on the first failed spreadsheet
+        """
+        responses = {}
+        for sheet_id in list(self.plans):
+            responses[sheet_id] = [
+                self.sheets_service.spreadsheets().batchUpdate(
+                    spreadsheetId=sheet_id, body={'requests': batch}).execute()
+                for batch in self.batches(sheet_id)
+            ]
+            logging.debug(f"Flushed {len(self.plans[sheet_id])} write(s) to {sheet_id}")
+            del self.plans[sheet_id]
+            for callback in self.callbacks.pop(sheet_id, []):
+                callback()
+        return responses
@@ -0,0 +1,337 @@
+"""Historical backfill: rebuild or reconcile the data warehouse from EVERY month of the progress sheet.
+
+    python app/backfill.py                          # reconcile: append what the warehouse is missing
+    python app/backfill.py --mode rebuild           # rewrite the warehouse from the response sheets
+    python app/backfill.py --tenant north --months 2023-01 2023-02
+
+run() only looks at the current month. Here every response_sheet_url is read concurrently
+(BACKFILL_WORKERS threads, each with its own Sheets service) and every read first takes a token
+from one shared bucket (BACKFILL_READS_PER_MINUTE, below the Sheets per user read quota).
+Rate limited (429) and 5xx reads are retried with jittered backoff.
+Months go through the same path as run(): schema validation, clean_informes_data and
+format_for_datawarehouse. Each fetched month is saved in a state file (BACKFILL_STATE_DIR), so an
+interrupted backfill resumes without reading those months again. The warehouse is then written
+with one batchUpdate and the state file is removed. A rebuild too big for one batchUpdate is
+written to a staging tab first and copied over the warehouse tab by the last (atomic) batchUpdate.
+With a SQL warehouse (DBWH_BACKEND) the rows are stored there too, keyed by roster row_id like run().
+"""
+import os
+import time
+import random
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import main
+from lazy import lazy_import, preload_all
+from EntityResolver import RosterIndex
+from RateLimiter import RETRY_STATUSES, TokenBucket, backoff_seconds
+from SheetSchema import PROGRESS, PUBS, RESPONSE, WAREHOUSE, NAME_COL
+from statefile import load_json, remove, save_json
+from WarehouseIndex import WarehouseKeyIndex
+from WritePlanner import WritePlanner
+from metrics import RunSummary
+
+pd = lazy_import("pandas")
+
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", 4))
+BACKFILL_READS_PER_MINUTE = float(os.getenv("BACKFILL_READS_PER_MINUTE", 50)) # Sheets allows 60/min per user
+BACKFILL_MAX_ATTEMPTS = int(os.getenv("BACKFILL_MAX_ATTEMPTS", 5))
+BACKFILL_STATE_DIR = os.getenv("BACKFILL_STATE_DIR", "backfill_state") # fetched months of an unfinished backfill
+MAX_BACKOFF_SECONDS = 60
+MODES = ("reconcile", "rebuild")
+
+
+class BackfillState:
+    """Months already fetched and cleaned (warehouse formatted header + rows), one file per warehouse"""
+
+    def __init__(self, dbwh_sheet: str, months: dict = None) -> None:
+        self.dbwh_sheet = dbwh_sheet
+        self.months = months or {} # year_month -> {'sheet_id', 'header', 'rows'}
+
+    @staticmethod
+    def path_for(state_dir: str, dbwh_sheet: str) -> str:
+        return os.path.join(state_dir, f"backfill_{dbwh_sheet}.json")
+
+    @classmethod
+    def load(cls, state_dir: str, dbwh_sheet: str):
+        """Return saved state, empty if missing or unreadable (the months are just fetched again)"""
+        data = load_json(cls.path_for(state_dir, dbwh_sheet), "backfill state", "starting over")
+        return cls(dbwh_sheet, data.get("months") if isinstance(data, dict) else None)
+
+    def save(self, state_dir: str) -> str:
+        return save_json(
+            self.path_for(state_dir, self.dbwh_sheet), {"dbwh_sheet": self.dbwh_sheet, "months": self.months})
+
+    def clear(self, state_dir: str) -> None:
+        """Backfill finished, the next one starts from scratch"""
+        remove(self.path_for(state_dir, self.dbwh_sheet))
+
+    def fetched(self, month: str, sheet_id: str) -> bool:
+        """True if month was already fetched from this response sheet"""
+        return self.months.get(month, {}).get("sheet_id") == sheet_id
+
+    def add(self, month: str, sheet_id: str, header: list, rows: list) -> None:
+        self.months[month] = {"sheet_id": sheet_id, "header": header, "rows": rows}
+
+
+def status_of(error: Exception):
+    """HTTP status of a googleapiclient HttpError, None for anything else"""
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def read_values(service_factory, limiter, sheet_id, sheet_range, max_attempts=None, sleep=time.sleep) -> list:
+    """Raw values of a range. Every attempt waits for a token, quota/5xx errors are retried"""
+    max_attempts = max_attempts or BACKFILL_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        try:
+            return main.get_worksheet_values(service_factory(), sheet_id, sheet_range)
+        except Exception as e:
+            if int(status_of(e) or 0) not in RETRY_STATUSES or attempt == max_attempts:
+                raise
+            backoff = backoff_seconds(attempt, cap=MAX_BACKOFF_SECONDS)
+            logging.warning(f"Read of {sheet_id} failed ({status_of(e)}), retrying in {backoff:.1f}s")
+            sleep(backoff)
+
+
+def fetch_month(service_factory, limiter, month, sheet_id, sleep=time.sleep) -> tuple:
+    """Return (header, rows) of a month's responses, cleaned and formatted like run() stores them"""
+    values = read_values(service_factory, limiter, sheet_id, main.RESPONSE_SHEET_RANGE, sleep=sleep)
+    report_df = main.values_to_dataframe(values, sheet_id, RESPONSE)
+    if report_df is None:
+        return [], []
+    main.clean_informes_data(report_df)
+    warehouse_df = main.format_for_datawarehouse(report_df, month)
+    return warehouse_df.columns.to_list(), main.serialize_df(warehouse_df)
+
+
+def month_sheets(progress_df, months=None) -> list:
+    """[(year_month, response sheet id)] of every progress row (or only months), in sheet order"""
+    pairs = []
+    for month, url in zip(progress_df["year_month"], progress_df["response_sheet_url"]):
+        if months and month not in months:
+            continue
+        sheet_id, _ = main.parse_sheet_and_gid_from_url(url)
+        pairs.append((month, sheet_id))
+    return pairs
+
+
+def fetch_months(pairs, state, service_factory, limiter, state_dir, workers=None, sleep=time.sleep) -> list:
+    """Fetch every month not in state yet, concurrently. Each month is saved to state as soon as
+    it is done. Returns [(month, error)] of the months that failed
+    """
+    todo = [(month, sheet_id) for month, sheet_id in pairs if not state.fetched(month, sheet_id)]
+    if resumed := len(pairs) - len(todo):
+        logging.info(f"Backfill: {resumed} month(s) already fetched, {len(todo)} to go")
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers or BACKFILL_WORKERS) as pool:
+        futures = {
+            pool.submit(fetch_month, service_factory, limiter, month, sheet_id, sleep): (month, sheet_id)
+            for month, sheet_id in todo}
+        for future in as_completed(futures):
+            month, sheet_id = futures[future]
+            try:
+                header, rows = future.result()
+            except Exception as e:
+                logging.error(f"Backfill: could not fetch {month} ({sheet_id}): {e}")
+                failed.append((month, e))
+                continue
+            state.add(month, sheet_id, header, rows)
+            state.save(state_dir) # only the main thread touches state
+            logging.info(f"Backfill: {month} fetched, {len(rows)} row(s)")
+    return failed
+
+
+def combine(pairs, state):
+    """One DataFrame of every month in progress sheet order. Columns are the union of the
+    month headers (forms change), a (Year-Month, name) pair is kept once like the daily append does
+    """
+    frames = [pd.DataFrame(state.months[month]["rows"], columns=state.months[month]["header"])
+              for month, _ in pairs if state.months[month]["header"]]
+    if not frames:
+        return None
+    warehouse_df = pd.concat(frames, ignore_index=True)
+    return warehouse_df.drop_duplicates(["Year-Month", NAME_COL], keep="first", ignore_index=True)
+
+
+def backfill(tenant=None, mode="reconcile", months=None, workers=None, reads_per_minute=None, state_dir=None,
+             sleep=time.sleep) -> dict:
+    """Read every month of the tenant's progress sheet and rebuild or reconcile its warehouse sheet.
+
+    Args:
+        mode str: reconcile (append the (Year-Month, name) rows the warehouse is missing)
+            or rebuild (replace the warehouse with what the response sheets have)
+        months list: only these year_month values, default every month. Reconcile only
+
+    Returns:
+        dict: number of months, backfilled rows, rows written to the warehouse sheet and,
+            with a SQL warehouse, rows stored there
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown backfill mode {mode!r}, expected one of {MODES}")
+    if months and mode == "rebuild":
+        raise ValueError("A rebuild replaces the whole warehouse, it can't be limited to some months")
+    tenant = tenant or main.default_tenant()
+    state_dir = BACKFILL_STATE_DIR if state_dir is None else state_dir
+    google_client = main.get_google_client()
+
+    def service_factory():
+        return google_client.service("sheets", "v4") # built once per thread
+
+    sheets_service = service_factory()
+    preload_all() # before the fetch pool cleans names on several threads
+    workers = workers or BACKFILL_WORKERS
+    # every worker can start right away, then reads are spaced to stay under the quota
+    limiter = TokenBucket((reads_per_minute or BACKFILL_READS_PER_MINUTE) / 60, capacity=workers)
+
+    with RunSummary(f"{tenant.name}:backfill") as summary:
+        with summary.stage("read_progress"):
+            progress_df = main.values_to_dataframe(
+                read_values(service_factory, limiter, tenant.master_sheet_id, main.PROGRESS_SHEET_RANGE, sleep=sleep),
+                tenant.master_sheet_id, PROGRESS)
+        pairs = month_sheets(progress_df, months) if progress_df is not None else []
+        state = BackfillState.load(state_dir, tenant.dbwh_sheet)
+
+        with summary.stage("fetch_months"):
+            failed = fetch_months(pairs, state, service_factory, limiter, state_dir, workers, sleep)
+        if failed:
+            # nothing is written from a partial history, the next backfill resumes from the state file
+            raise RuntimeError(f"Backfill of {tenant.name} stopped, {len(failed)} month(s) failed: "
+                               f"{', '.join(month for month, _ in failed)}")
+
+        result = {"months": len(pairs), "rows": 0, "written": 0}
+        warehouse_df = combine(pairs, state)
+        if warehouse_df is not None:
+            result["rows"] = len(warehouse_df)
+            # the sheet first: a failed write leaves the SQL warehouse untouched, so a rerun still exports every row
+            if main.DBWH_BACKEND == "sheets" or main.DBWH_EXPORT_SHEET:
+                with summary.stage("warehouse"):
+                    result["written"] = write_warehouse(sheets_service, tenant.dbwh_sheet, warehouse_df, mode)
+            if main.DBWH_BACKEND != "sheets":
+                with summary.stage("read_roster"):
+                    volunteer_map_df = main.values_to_dataframe(
+                        read_values(
+                            service_factory, limiter, tenant.master_sheet_id, main.PUBS_SHEET_RANGE, sleep=sleep),
+                        tenant.master_sheet_id, PUBS)
+                with summary.stage("warehouse_db"):
+                    result["stored"] = store_warehouse(
+                        main.warehouse_engine(tenant), warehouse_df, volunteer_map_df, mode)
+        summary.rows("backfill", result["written"])
+
+    state.clear(state_dir)
+    logging.info(f"Backfill of {tenant.name} ({mode}): {result}")
+    return result
+
+
+def store_warehouse(engine, warehouse_df, volunteer_map_df, mode) -> int:
+    """Store the backfilled rows in the SQL warehouse, keyed by the roster row_id each name resolves to
+    (see main.store_in_warehouse_db). Returns number of rows stored
+    """
+    volunteer_ids = None
+    if volunteer_map_df is not None:
+        main.add_full_name(volunteer_map_df)
+        volunteer_ids = RosterIndex(volunteer_map_df).resolve(warehouse_df[NAME_COL]).row_id.to_list()
+    if mode == "rebuild":
+        return engine.replace_reports(warehouse_df, volunteer_ids)
+    return len(engine.insert_reports(warehouse_df, volunteer_ids))
+
+
+def plan_rebuild(planner, dbwh_sheet, values) -> int:
+    """Plan replacing the warehouse tab with values (header + rows). Returns gid of the staging tab, None if
+    the rebuild fits in one batchUpdate. Otherwise the rows go to a new tab over several batchUpdates and the
+    last one clears the warehouse tab, copies the staging tab over it and deletes it, so readers never see a
+    half written warehouse
+    """
+    if sum(len(row) for row in values) <= planner.max_cells:
+        planner.clear(dbwh_sheet, main.DBWH_SHEET_GID, label="warehouse clear")
+        planner.update_cells(dbwh_sheet, main.DBWH_SHEET_GID, "A1", values, label="warehouse rebuild")
+        return None
+
+    staging_gid = random.randrange(1, 2 ** 31)
+    planner.add_sheet(dbwh_sheet, staging_gid, f"backfill_{staging_gid}", label="warehouse staging")
+    planner.update_cells(dbwh_sheet, staging_gid, "A1", values, label="warehouse staging")
+    planner.clear(dbwh_sheet, main.DBWH_SHEET_GID, label="warehouse clear")
+    planner.copy_values(
+        dbwh_sheet, staging_gid, main.DBWH_SHEET_GID, len(values), max(len(row) for row in values),
+        label="warehouse swap")
+    planner.delete_sheet(dbwh_sheet, staging_gid, label="warehouse staging")
+    return staging_gid
+
+
+def write_warehouse(sheets_service, dbwh_sheet, warehouse_df, mode) -> int:
+    """Write the backfilled rows with ONE batchUpdate (a staged rebuild when they don't fit, see
+    plan_rebuild), then re-key the warehouse index. Returns number of rows written
+    """
+    planner = WritePlanner(sheets_service, max_cells=main.SHEETS_MAX_CELLS_PER_REQUEST)
+    key_index, staging_gid = None, None
+    if mode == "reconcile":
+        key_index = WarehouseKeyIndex.from_chunks(
+            dbwh_sheet, main.iter_worksheet_chunks(sheets_service, dbwh_sheet, "A:J", schema=WAREHOUSE))
+
+    if key_index is None: # rebuild, or nothing to reconcile with
+        key_index = WarehouseKeyIndex(dbwh_sheet, header=warehouse_df.columns.to_list())
+        staging_gid = plan_rebuild(planner, dbwh_sheet, [key_index.header] + main.serialize_df(warehouse_df))
+    else:
+        missing = ~pd.Series(
+            key_index.contains(warehouse_df["Year-Month"], warehouse_df[NAME_COL]), index=warehouse_df.index,
+            dtype=bool)
+        if unknown_cols := [col for col in warehouse_df.columns if col not in key_index.header]:
+            logging.warning(f"Columns not in Data Warehouse will not be saved: {unknown_cols}")
+        warehouse_df = warehouse_df[missing].reindex(columns=key_index.header)
+        planner.append_rows(
+            dbwh_sheet, main.DBWH_SHEET_GID, main.serialize_df(warehouse_df), label="warehouse reconcile")
+
+    def record_keys():
+        key_index.add(warehouse_df["Year-Month"], warehouse_df[NAME_COL])
+        key_index.save(main.DBWH_INDEX_DIR)
+
+    if len(warehouse_df):
+        logging.info(f"Backfill writes: {planner.describe()}")
+        planner.on_success(dbwh_sheet, record_keys)
+        try:
+            planner.flush()
+        except Exception:
+            if staging_gid is not None: # the warehouse tab is untouched, only the staging tab is left over
+                drop_staging_tab(sheets_service, dbwh_sheet, staging_gid)
+            raise
+    else:
+        logging.info("Backfill: warehouse already has every row")
+    return len(warehouse_df)
+
+
+def drop_staging_tab(sheets_service, dbwh_sheet, staging_gid) -> None:
+    """Best effort, a failed rebuild is reported either way"""
+    try:
+        sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=dbwh_sheet, body={"requests": [{"deleteSheet": {"sheetId": staging_gid}}]}).execute()
+    except Exception:
+        logging.warning(f"Could not delete staging tab gid {staging_gid} of {dbwh_sheet}", exc_info=True)
+
+
+def main_cli(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Rebuild or reconcile the data warehouse from every month")
+    parser.add_argument("--mode", choices=MODES, default="reconcile")
+    parser.add_argument("--tenant", help="tenant name (TENANTS_FILE), default: every tenant")
+    parser.add_argument("--months", nargs="+", help="only these year_month values")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--reads-per-minute", type=float, default=BACKFILL_READS_PER_MINUTE)
+    parser.add_argument("--state-dir", default=BACKFILL_STATE_DIR)
+    args = parser.parse_args(argv)
+
+    tenants = [tenant for tenant in main.get_tenants() if args.tenant in (None, tenant.name)]
+    if not tenants:
+        parser.error(f"Unknown tenant {args.tenant!r}")
+    # tenants one after the other, they share the read quota
+    return {
+        tenant.name: backfill(
+            tenant, args.mode, args.months, args.workers, args.reads_per_minute, args.state_dir)
+        for tenant in tenants}
+
+
+if __name__ == "__main__":
+    from logger import configure_logging
+
+    configure_logging(logging.INFO)
+    for name, result in main_cli().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,42 @@
+"""Import heavy dependencies on first use instead of at module load.
+Most scheduled runs exit early (past SCRIPT_STOP_DAY, month already completed),
+so pandas/numpy/pytz are only executed when a stage actually touches them.
+"""
+import sys
+import threading
+import importlib.util
+
+_load_lock = threading.Lock()
+_lazy_modules = [] # every module returned unloaded by lazy_import, see preload_all
+
+
+def lazy_import(name: str):
+    """Return module `name`, executed the first time one of its attributes is used.
+    ex) pd = lazy_import("pandas")
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    _lazy_modules.append(module)
+    return module
+
+
+def preload(*modules) -> None:
+    """Finish loading lazy modules now, under a lock.
+    LazyLoader is not thread safe before python 3.12, call this before worker threads use them
+    """
+    with _load_lock:
+        for module in modules:
+            module.__dict__ # any attribute access executes the module
+
+
+def preload_all() -> None:
+    """Preload every module lazy_import deferred so far. Call once before starting a thread pool"""
+    preload(*_lazy_modules)
@@ -1,2 +1,48 @@
-""" do I need this? """
-### IDEA: Create a centralized logger config to easily import and swap out if necessary
\ No newline at end of file
+"""Centralized logging config.
+Records are put on an in-memory queue by a QueueHandler and written to stderr by a
+QueueListener thread, so a slow stdout/pipe never stalls the pipeline or Twilio threads.
+"""
+import atexit
+import queue
+import logging
+import threading
+import logging.handlers
+
+LOG_FORMAT = '[%(levelname)s] %(asctime)s | %(message)s'
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S%p'
+
+_listener = None
+_lock = threading.Lock() # tenant threads configure logging concurrently
+
+
+def configure_logging(level=logging.INFO, handlers=None) -> logging.Logger:
+    """Route the root logger through a queue. Safe to call on every run, only the level changes after
+    the first call. handlers: where records end up (default: stderr)
+    """
+    global _listener
+    root = logging.getLogger()
+    with _lock:
+        root.setLevel(level)
+        if _listener is None:
+            if not handlers:
+                stream = logging.StreamHandler()
+                stream.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT))
+                handlers = [stream]
+            records = queue.SimpleQueue()
+            _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_logging)
+            root.addHandler(logging.handlers.QueueHandler(records))
+    return root
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            root = logging.getLogger()
+            for handler in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+                root.removeHandler(handler)
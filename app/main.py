@@ -1,26 +1,46 @@
+from __future__ import annotations
+
 import os
-import pytz
 import logging
-import unidecode
 import traceback
-import pandas as pd
 import datetime as dt
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from apscheduler.schedulers.blocking import BlockingScheduler
-
-#twilio imports
-from twilio.rest import Client as TwilioClient
 
-#Google Dependencies
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.service_account import Credentials
+# heavy dependencies load on first use, a run that exits early never pays for them
+from lazy import lazy_import, preload, preload_all
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+pytz = lazy_import("pytz")
+unidecode = lazy_import("unidecode") # used by Transformer.normalize_name
+
+from Transformer import (
+    Transformer, Strings, Numeric, Nullable, Category, Concat, Rename, Constant, NAME_OPS, normalize_name)
+from EntityResolver import RosterIndex
+from ContactIndex import ContactIndex
+from TwilioSender import TwilioSender
+from MessageQueue import OutboundQueue, MESSAGE_QUEUE_PATH
+from SheetsCache import SheetsCache, SHEETS_CACHE_DIR
+from tenants import TenantConfig, load_tenants, TENANTS_FILE, MAX_TENANT_WORKERS
+from GoogleClient import get_google_client
+from WarehouseIndex import WarehouseKeyIndex
+from WritePlanner import WritePlanner
+from DbEngine import DatabaseEngine
+from ReportArchive import ReportArchive
+from FinalReport import write_final_reports
+from ResponseWatermark import ResponseWatermark
+from SheetSchema import (
+    PROGRESS, PUBS, RESPONSE, WAREHOUSE, NAME_COL, column_letter, column_number)
+from logger import configure_logging
+from metrics import REGISTRY, RunSummary, start_metrics_server, METRICS_PORT
+
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
 
 
 load_dotenv()
 #### GLOBALS ####
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 RESPONSE_SHEET_RANGE = "A:I"
 COUNTRY_CODE = "+1"
 MASTER_ALERT_NUM = os.getenv("MASTER_ALERT_NUM")
@@ -28,52 +48,123 @@ MASTER_SHEET_URL = os.getenv("MASTER_SHEET_URL")
 MASTER_SHEET_ID = os.getenv("MASTER_SHEET_ID")
 RESPONSE_SHEET_GID = "0" # main sheet with all monthly progress data
 PROGRESS_SHEET_RANGE = "A:D" # These columns contain history of all links and forms per month
+PROGRESS_SHEET_GID = os.getenv("PROGRESS_SHEET_GID", "0") # progress tab of the master sheet, the first tab
 PUBS_SHEET_GID = os.getenv("PUBS_SHEET_GID") # sheet GID for volunteer map
 PUBS_SHEET_RANGE = "pubs!A:I"
 DBWH_SHEET = os.getenv("DBWH_SHEET")
 DBWH_SHEET_GID='0'
+DBWH_WRITE_MODE = os.getenv("DBWH_WRITE_MODE", "append") # append (only new rows) or rewrite (full history)
+DBWH_INDEX_DIR = os.getenv("DBWH_INDEX_DIR", ".") # where the local warehouse key index is kept
+DBWH_INDEX_MAX_AGE_DAYS = float(os.getenv("DBWH_INDEX_MAX_AGE_DAYS", 7)) # re-seed index from the sheet after this
+DBWH_BACKEND = os.getenv("DBWH_BACKEND", "sheets") # sheets (DBWH_SHEET is the warehouse), sqlite or mysql
+DBWH_DB_PATH = os.getenv("DBWH_DB_PATH") # sqlite file, defaults to one per tenant
+DBWH_EXPORT_SHEET = os.getenv("DBWH_EXPORT_SHEET", "true") == "true" # sql backends: also append new rows to DBWH_SHEET
+RESPONSE_WATERMARK_DIR = os.getenv("RESPONSE_WATERMARK_DIR", ".") # processed response rows per sheet, "" = full reads
+RESPONSE_WATERMARK_MAX_AGE_DAYS = float(os.getenv("RESPONSE_WATERMARK_MAX_AGE_DAYS", 7)) # full read after this
+REPORT_ARCHIVE_DIR = os.getenv("REPORT_ARCHIVE_DIR", "") # parquet archive of the warehouse, empty string disables it
+FINAL_REPORT_DIR = os.getenv("FINAL_REPORT_DIR", "final_reports") # filled Final Report per completed month, "" disables it
 SCRIPT_STOP_DAY= int(os.getenv("SCRIPT_STOP_DAY",5))
 ADMIN_NAME = os.getenv("ADMIN_NAME", "George Cruz")
+GROUP = os.getenv("GROUP") # group number for the Final Report title
 APP_LEVEL = os.getenv("APP_LEVEL", "dev") # prod or dev (default if missing env var)
+MESSAGE_DELIVERY = os.getenv("MESSAGE_DELIVERY", "queue") # queue (durable, drained by worker) or inline
+QUEUE_DRAIN_MINUTES = int(os.getenv("QUEUE_DRAIN_MINUTES", 5))
+SHEETS_MAX_CELLS_PER_RANGE = 20_000 # rows per range are bounded by this many cells
+SHEETS_MAX_CELLS_PER_REQUEST = 200_000 # keeps each batchUpdate payload well under the API request size limit
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", 5000)) # rows per window of iter_worksheet_chunks
+
+# data prep pipelines, compiled once per sheet layout (see Transformer)
+SHEET_PIPELINE = Transformer([Numeric('Horas')], name='sheet')
+INFORMES_PIPELINE = Transformer([Strings('¿Cual es su nombre?', *NAME_OPS)], name='informes')
+ROSTER_PIPELINE = Transformer(
+    [Concat('full_name', ['First_Name', 'Last_Name']), Strings('full_name', *NAME_OPS)], name='roster')
+# streamed chunks: nullable numbers, repeated text as categoricals
+TYPED_PIPELINE = Transformer(
+    [Nullable('Horas'), Category('Year-Month'), Category('Active?'), Category('permission_to_contact?'),
+     Category('¿Es Precursor?')], name='typed')
+WAREHOUSE_PIPELINE = Transformer(
+    [Rename({'Timestamp': 'Year-Month'}), Constant('Year-Month', param='report_month')], name='warehouse')
+
+
+def default_tenant() -> TenantConfig:
+    """Single tenant configured by env vars (the original one pod per admin setup)"""
+    return TenantConfig(
+        name='default',
+        admin_name=ADMIN_NAME,
+        master_sheet_id=MASTER_SHEET_ID,
+        dbwh_sheet=DBWH_SHEET,
+        master_alert_num=MASTER_ALERT_NUM,
+        script_stop_day=SCRIPT_STOP_DAY,
+        queue_path=MESSAGE_QUEUE_PATH,
+        group=GROUP)
+
+
+def tenant_queue_path(tenant: TenantConfig) -> str:
+    """Each tenant gets its own outbound queue file unless configured"""
+    return tenant.queue_path or f"outbound_queue_{tenant.name}.db"
 
 
 def create_service_account_creds() -> Credentials:
-    creds = {"type": "service_account",
-            "project_id": os.getenv("PROJECT_ID"),
-            "private_key_id": os.getenv("PRIVATE_KEY_ID"),
-            "private_key": os.getenv("PRIVATE_KEY").replace("\\n","\n"),
-            "client_email": os.getenv("CLIENT_EMAIL"),
-            "client_id": os.getenv("CLIENT_ID"),
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-            "client_x509_cert_url": os.getenv("CLIENT_CERT_URL")}
-
-    if missing_creds := [var for var, val in creds.items() if val is None]:
-        raise KeyError(f"Missing Environment variable(s): {','.join(missing_creds)}")
-
-    auth = Credentials.from_service_account_info(creds)
+    """Return the process wide service account Credentials (see GoogleClient.get_google_client).
+    Created once and only refreshed when close to expiry, not on every run
+    """
+    auth = get_google_client().credentials()
     assert not auth.expired, "Google Auth expired" # error will raise exception, auth will return None
     return auth
 
 
-def get_worksheet_data(sheets_service, sheet_id, range) -> pd.DataFrame:
-    """Return spreadsheet data based on sheet_id and range
+SHEETS_CACHE = None # set by configure_sheets_cache, shared by every read in the process
+
+
+def cache_metrics() -> list:
+    """Hit/miss counts of caches that keep their own stats, read on every /metrics scrape"""
+    names = normalize_name.cache_info()
+    return [('cache_hits_total', {'cache': 'names'}, names.hits),
+            ('cache_misses_total', {'cache': 'names'}, names.misses)]
+
+
+REGISTRY.collect(cache_metrics)
+
+
+def warehouse_engine(tenant: TenantConfig) -> DatabaseEngine:
+    """SQL warehouse of the tenant: one table per tenant, in one sqlite file per tenant unless DBWH_DB_PATH
+    is shared, or on the MySQL server
+    """
+    if DBWH_BACKEND == 'mysql':
+        return DatabaseEngine(
+            type='mysql',
+            table=f"reports_{tenant.name}",
+            host=os.getenv("DBWH_MYSQL_HOST"),
+            user=os.getenv("DBWH_MYSQL_USER"),
+            password=os.getenv("DBWH_MYSQL_PASSWORD"),
+            database=os.getenv("DBWH_MYSQL_DATABASE"))
+    return DatabaseEngine(
+        type='sqlite', table=f"reports_{tenant.name}", path=DBWH_DB_PATH or f"warehouse_{tenant.name}.db")
+
+
+def configure_sheets_cache(drive_service_factory, cache_dir=SHEETS_CACHE_DIR):
+    """Enable the on-disk read cache. drive_service_factory returns the calling thread's
+    Drive service, used for cheap revision checks.
+    Returns the cache, None if disabled (SHEETS_CACHE_DIR="")
+    """
+    global SHEETS_CACHE
+    if cache_dir and SHEETS_CACHE is None:
+        SHEETS_CACHE = SheetsCache(cache_dir, drive_service_factory=drive_service_factory)
+    return SHEETS_CACHE
+
+
+def values_to_dataframe(values, sheet_id=None, schema=None, first_row=2) -> pd.DataFrame:
+    """Return a DataFrame from raw Sheets API values, using the first row as the header
 
     Args:
-        sheet_id str: sheet_id found in url
-        service obj: Google sheets API service built with creds - ex) sheets api service
-        range str: A1-style ranges. Refer to sheename by '<sheetname>!<range>'
+        values list: list of lists as returned in a ValueRange 'values' key
+        sheet_id str: sheet_id, only used for logging when there is no data
+        schema SheetSchema: validate the raw values against it (raises SchemaError) before anything else
+        first_row int: sheet row of values[1], only used in SchemaError messages
 
     Returns:
-        Pandas DataFrame: tabular style column/row object - Dataframe
+        Pandas DataFrame: tabular style column/row object - Dataframe. None if there are no values
     """
-    # Call the Sheets API
-    sheet = sheets_service.spreadsheets()
-    
-    result = sheet.values().get(spreadsheetId=sheet_id,range=range).execute()
-    values = result.get('values', [])
-
     if not values:
         print(f'No data found for sid {sheet_id}.')
         return
@@ -83,12 +174,38 @@ def get_worksheet_data(sheets_service, sheet_id, range) -> pd.DataFrame:
     df = df[1:] #take the data less the header row
     df.columns = new_header #set the header row as the df header
     df.reset_index(drop=True, inplace=True) # reset index count after dropping header
-    
-    if 'Horas' in df.columns:
-        # BUG: This will fail upon using partial hours!
-        # casting to a float may cause issues when serializing to JSON obj for Sheets API
-        df.Horas = df.Horas.astype(int) 
-        # df.Horas = df.Horas.astype(float)
+    if schema is not None:
+        schema.validate(df, sheet_id, first_row)
+
+    # Horas -> numbers. Partial hours are floats, serialize_df writes them back as is
+    return SHEET_PIPELINE.apply(df)
+
+
+def get_worksheet_values(sheets_service, sheet_id, range) -> list:
+    """Return raw values (list of rows) of sheet_id's range, served from the sheets cache when unchanged"""
+    # Call the Sheets API
+    sheet = sheets_service.spreadsheets()
+
+    def fetch():
+        result = sheet.values().get(spreadsheetId=sheet_id,range=range).execute()
+        return result.get('values', [])
+
+    return SHEETS_CACHE.read(sheet_id, range, fetch) if SHEETS_CACHE else fetch()
+
+
+def get_worksheet_data(sheets_service, sheet_id, range, schema=None) -> pd.DataFrame:
+    """Return spreadsheet data based on sheet_id and range
+
+    Args:
+        sheet_id str: sheet_id found in url
+        service obj: Google sheets API service built with creds - ex) sheets api service
+        range str: A1-style ranges. Refer to sheename by '<sheetname>!<range>'
+        schema SheetSchema: optional, see values_to_dataframe
+
+    Returns:
+        Pandas DataFrame: tabular style column/row object - Dataframe
+    """
+    values = get_worksheet_values(sheets_service, sheet_id, range)
 
     # ## debugging
     # for row in values:
@@ -98,106 +215,254 @@ def get_worksheet_data(sheets_service, sheet_id, range) -> pd.DataFrame:
     #     # print(row)
     # ##
     
-    return df
+    return values_to_dataframe(values, sheet_id, schema)
 
 
-def clean_informes_data(df) -> None:
-    """Cleans data in dataframe"""
-    def trim_values(input_val):
-        """Remove any extra spaces and return string in Title Case"""
-        val = str(input_val)
-        try:
-            return val.replace("  "," ").strip().title()
-        except:
-            return val
+def window_range(sheet_range: str, first_row: int, last_row: int) -> str:
+    """Return rows first_row..last_row of a column range, ex) ('pubs!A:I', 2, 5001) -> 'pubs!A2:I5001'"""
+    sheet_name, _, columns = sheet_range.rpartition('!')
+    first_column, last_column = (column.rstrip('0123456789') for column in columns.split(':'))
+    return f"{sheet_name + '!' if sheet_name else ''}{first_column}{first_row}:{last_column}{last_row}"
 
-    def replace_spec_chars(accented_string):
-        """Remove non-Unicode characters from a string"""
-        try:
-            unaccented_string = unidecode.unidecode(accented_string)
-        except:
-            return accented_string
-        return unaccented_string
-        
-    def replace_double_space(name_string:str) -> str:
-        """Return string without consecutive spaces
-
-        Args:
-            name_string (str)
-        """
-        try:
-            if "  " in name_string:
-                return name_string.replace("  ", " ")
-            elif "   " in name_string:
-                return name_string.replace("   ", " ")
+
+def typed_chunk(header, rows, schema=None, first_row=2) -> pd.DataFrame:
+    """DataFrame of raw rows with header, typed by TYPED_PIPELINE (Int64/Float64 numbers, categoricals).
+    Validated against schema first, if given
+    """
+    df = pd.DataFrame(rows).reindex(columns=range(len(header)))
+    df.columns = header
+    if schema is not None:
+        schema.validate(df, first_row=first_row)
+    return TYPED_PIPELINE.apply(df)
+
+
+def iter_worksheet_chunks(sheets_service, sheet_id, range, chunk_rows=None, service_factory=None, schema=None):
+    """Yield a large range as typed DataFrames of at most chunk_rows rows each (see typed_chunk).
+    Rows are read in windows (A1:J5001 with the header, then A5002:J10001, ...) so only one
+    window is in memory at a time. Reading stops at the first window that isn't full.
+
+    Args:
+        service_factory callable: returns a sheets service for the calling thread. When given, the
+            next window is downloaded on a background thread while the current chunk is processed
+        schema SheetSchema: every chunk is validated against it before it is yielded
+    """
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+
+    def fetch(first_row, rows, service):
+        return get_worksheet_values(service, sheet_id, window_range(range, first_row, first_row + rows - 1))
+
+    values = fetch(1, chunk_rows + 1, sheets_service)
+    if not values:
+        return
+    header, rows, next_row = values[0], values[1:], chunk_rows + 2
+    pool = ThreadPoolExecutor(max_workers=1) if service_factory else None
+    try:
+        while True:
+            more = len(rows) >= chunk_rows
+            pending = pool.submit(
+                lambda first_row: fetch(first_row, chunk_rows, service_factory()), next_row) if more and pool else None
+            if rows:
+                yield typed_chunk(header, rows, schema, first_row=next_row - chunk_rows)
+            if not more:
+                return
+            rows = pending.result() if pending else fetch(next_row, chunk_rows, sheets_service)
+            next_row += chunk_rows
+    finally:
+        if pool:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def concat_chunks(chunks) -> pd.DataFrame:
+    """One DataFrame from typed chunks, categoricals stay categoricals (categories are unioned).
+    None if there are no chunks
+    """
+    frames = list(chunks)
+    if not frames:
+        return None
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([frame[col] for frame in frames]).categories
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_new_responses(sheets_service, sheet_id, range=RESPONSE_SHEET_RANGE, state_dir=None) -> tuple:
+    """Return (watermark, raw new rows, new rows DataFrame NOT cleaned yet) of a response sheet.
+    Only the rows below the watermark are read. Without a (valid) watermark the whole sheet is read
+    and every row is new. DataFrame is None if the sheet is empty
+    """
+    state_dir = RESPONSE_WATERMARK_DIR if state_dir is None else state_dir
+    watermark = None
+    if state_dir:
+        watermark = ResponseWatermark.load(state_dir, sheet_id, max_age_days=RESPONSE_WATERMARK_MAX_AGE_DAYS)
+
+    new_rows = None
+    if watermark is not None:
+        new_rows = watermark.new_rows(get_worksheet_values(sheets_service, sheet_id, watermark.fetch_range(range)))
+        if new_rows is None:
+            logging.warning(f"Response sheet {sheet_id} changed above row {len(watermark) + 1} - reading all of it")
+    if new_rows is None:
+        values = get_worksheet_values(sheets_service, sheet_id, range)
+        if not values:
+            return ResponseWatermark(sheet_id, header=[]), [], values_to_dataframe(values, sheet_id)
+        watermark, new_rows = ResponseWatermark(sheet_id, header=values[0]), values[1:]
+
+    logging.info(f"Response sheet {sheet_id}: {len(watermark)} processed row(s), {len(new_rows)} new")
+    return watermark, new_rows, values_to_dataframe(
+        [watermark.header] + new_rows, sheet_id, RESPONSE, first_row=len(watermark) + 2)
+
+
+def merge_responses(watermark, new_report_df) -> pd.DataFrame:
+    """Return the already processed (cleaned) rows kept in watermark followed by new_report_df"""
+    if not len(watermark):
+        return new_report_df
+    processed_df = values_to_dataframe([watermark.header] + watermark.rows, watermark.sheet_id)
+    return pd.concat([processed_df, new_report_df], ignore_index=True)
+
+
+def batch_get_worksheet_data(sheets_service, sheet_requests) -> list:
+    """Return spreadsheet data for several (sheet_id, range) pairs.
+    Ranges are grouped by spreadsheet so there is ONE batchGet call per spreadsheet,
+    instead of one values().get call per range.
+
+    Args:
+        sheets_service obj: Google sheets API service built with creds
+        sheet_requests list: list of (sheet_id, range) or (sheet_id, range, schema) tuples.
+            A1-style ranges, same as get_worksheet_data
+
+    Returns:
+        list: Pandas DataFrame (or None if empty) per request, in the same order as sheet_requests
+    """
+    frames = [None] * len(sheet_requests)
+
+    # keep the position of each range so results go back in request order
+    ranges_by_sheet = {}
+    schemas = [request[2] if len(request) > 2 else None for request in sheet_requests]
+    for position, (sheet_id, sheet_range, *_) in enumerate(sheet_requests):
+        ranges_by_sheet.setdefault(sheet_id, []).append((position, sheet_range))
+
+    sheet = sheets_service.spreadsheets()
+    for sheet_id, positioned_ranges in ranges_by_sheet.items():
+        revision = SHEETS_CACHE.revision(sheet_id) if SHEETS_CACHE else None
+
+        to_fetch = []
+        for position, sheet_range in positioned_ranges:
+            values = SHEETS_CACHE.get(sheet_id, sheet_range, revision) if SHEETS_CACHE else None
+            if values is None:
+                to_fetch.append((position, sheet_range))
             else:
-                return name_string
-        except:
-            return name_string
-        
-    df['¿Cual es su nombre?'] = df['¿Cual es su nombre?'].apply(lambda x: trim_values(x))
-    df['¿Cual es su nombre?'] = df['¿Cual es su nombre?'].apply(lambda x: replace_double_space(x))
-    df['¿Cual es su nombre?'] = df['¿Cual es su nombre?'].apply(lambda x: replace_spec_chars(x))
-    # return df # required?
+                frames[position] = values_to_dataframe(values, sheet_id, schemas[position])
 
+        if not to_fetch: # every range served from cache, no Sheets call
+            continue
 
-def get_missing_reports(df, volunteers) -> list:
-    """Returns a list of volunteers that have not reported time!
-    NOTE: This is slightly slower than using built-in pandas functions
+        result = sheet.values().batchGet(
+            spreadsheetId=sheet_id,
+            ranges=[sheet_range for _, sheet_range in to_fetch]).execute()
+
+        # valueRanges are returned in the same order the ranges were requested
+        for (position, sheet_range), value_range in zip(to_fetch, result.get('valueRanges', [])):
+            values = value_range.get('values', [])
+            if SHEETS_CACHE:
+                SHEETS_CACHE.put(sheet_id, sheet_range, values, revision)
+            frames[position] = values_to_dataframe(values, sheet_id, schemas[position])
+
+    return frames
+
+
+def clean_informes_data(df) -> None:
+    """Cleans data in dataframe. Names are trimmed, single spaced, Title Cased and accents removed
+    in one pass over the unique names (see INFORMES_PIPELINE)
     """
-    return [
-        name
-        for name in volunteers
-        if not df['¿Cual es su nombre?'].isin([name]).any()
-    ]
+    INFORMES_PIPELINE.apply(df)
+
+
+def add_full_name(volunteer_map_df) -> None:
+    """Add full_name to volunteer map, normalized the SAME way as report names so both sides match"""
+    ROSTER_PIPELINE.apply(volunteer_map_df)
 
 
-def send_twilio_message(contact_list_dict, error=None, error_message=False) -> tuple:
-    """Template for sending notifications
-    Returns list of failed messages {person: traceback}
+def get_missing_reports(df, volunteers) -> list:
+    """Returns a list of volunteers that have not reported time!
+    Submissions are matched through a RosterIndex, so small typos still count as reported
+    """
+    roster_df = pd.DataFrame({'row_id': list(volunteers), 'full_name': list(volunteers)})
+    reported = RosterIndex(roster_df).resolve(df['¿Cual es su nombre?']).matched_ids
+    return [name for name in volunteers if name not in reported]
+
+
+def build_reminder_body(name, form_link, admin_name=None) -> str:
+    """Reminder text sent to volunteers (or their delegate)"""
+    admin_name = admin_name or ADMIN_NAME
+    return  f"¡Hola! Este es un mensaje automatizado de parte de {admin_name}\n" \
+            f"Por favor de entregar el informe para {name.split(' ')[0]}.\n" \
+            f"Si tiente alguna pregunta, favor de contactar a {admin_name.split(' ')[0]} directamente.\n" \
+            f"Muchas gracias.\n" \
+            f"Enlace para informe: {form_link}"
+
+
+def build_reminder_messages(contact_list_dict, admin_name=None) -> list:
+    """Return [{'name', 'to', 'body'}] reminders for contacts from generate_alert_list"""
+    messages = []
+    for contact_dict in contact_list_dict:
+        if not contact_dict or not contact_dict.get('name') or not contact_dict.get('number'):
+            print('No contact name - skipping')
+            continue
+        messages.append({
+            'name': contact_dict['name'],
+            'to': contact_dict['number'].strip('\u202c').strip(),
+            'body': build_reminder_body(contact_dict['name'], contact_dict['form_link'], admin_name),
+        })
+    return messages
+
+
+def drain_outbound_queue(queue=None, sender=None, tenant=None) -> list:
+    """Worker: send everything waiting in the outbound queue. Admin is alerted about messages
+    that failed for good (after QUEUE_MAX_ATTEMPTS)
+    """
+    tenant = tenant or default_tenant()
+    queue = queue or OutboundQueue(tenant_queue_path(tenant))
+    sender = sender or TwilioSender(from_=tenant.twilio_num)
+    drained = queue.drain(sender)
+
+    if sent := [result for _, result in drained if result.ok]:
+        logging.info(f"Sent {len(sent)} messages")
+    failed = [row for row, result in drained if not result.ok and row['attempts'] + 1 >= queue.max_attempts]
+    if failed:
+        logging.error(f"Message Send Failure(s): {len(failed)}")
+        send_twilio_message(
+            {}, f"Message Send Failure(s): {[row['name'] for row in failed]}",
+            error_message=True, sender=sender, tenant=tenant)
+    return drained
+
+
+def send_twilio_message(contact_list_dict, error=None, error_message=False, sender=None, tenant=None) -> tuple:
+    """Template for sending notifications. Messages are sent concurrently by TwilioSender,
+    rate limited and retried on transient errors.
+    Returns list of failed messages {person: error} and list of sent MessageResult
     """
     # debugging
     # return None, None
     #
-    account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-    auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-    twilio_num = os.getenv('TWILIO_NUM')
-    client = TwilioClient(account_sid, auth_token)
-    logging.info(f"twilio logging level: {client.http_client.logger.level}")
-    message_stats = []
-    failed_messages = []
+    tenant = tenant or default_tenant()
+    sender = sender or TwilioSender(from_=tenant.twilio_num)
 
     if error_message:
-        message = client.messages \
-                    .create(
-                        body=error,
-                        from_=twilio_num,
-                        to=COUNTRY_CODE + MASTER_ALERT_NUM
-                    )
-        message_stats.append(message)
+        results = [sender.send_one(COUNTRY_CODE + tenant.master_alert_num, str(error), name=tenant.admin_name)]
 
     else:
-        for contact_dict in contact_list_dict:
-            if contact_dict is None or contact_dict['name'] == "" or contact_dict['number'] == "":
-                print('No contact name - skipping')
-            try:
-                msg_body =  f"¡Hola! Este es un mensaje automatizado de parte de {ADMIN_NAME}\n" \
-                            f"Por favor de entregar el informe para {contact_dict['name'].split(' ')[0]}.\n" \
-                            f"Si tiente alguna pregunta, favor de contactar a {ADMIN_NAME.split(' ')[0]} directamente.\n" \
-                            f"Muchas gracias.\n" \
-                            f"Enlace para informe: {contact_dict['form_link']}"
-
-                message = client.messages.create(
-                        body=msg_body,
-                        from_=twilio_num,
-                        to=contact_dict['number'].strip('\u202c').strip()
-                    )
-                
-                message_stats.append(message)
-            except Exception as e:
-                logging.error(f"Failed msg for {contact_dict['name'].split(' ')[0]}", exc_info=True)
-                failed_messages.append({contact_dict['name']:traceback.format_exc()})
-
+        results = sender.send_many(build_reminder_messages(contact_list_dict, tenant.admin_name))
+
+    message_stats = [result for result in results if result.ok]
+    failed_messages = [{result.name: result.error} for result in results if not result.ok]
+    kind = 'alert' if error_message else 'reminder'
+    REGISTRY.inc('messages_total', len(message_stats), outcome='sent', kind=kind, tenant=tenant.name)
+    REGISTRY.inc('messages_total', len(failed_messages), outcome='failed', kind=kind, tenant=tenant.name)
+    if results:
+        logging.debug(
+            f"Twilio: {len(message_stats)} sent, {len(failed_messages)} failed, "
+            f"slowest {max(result.elapsed for result in results):.2f}s")
     return failed_messages, message_stats
 
 
@@ -208,6 +473,7 @@ def update_sheets_range(sheets_service, sheet_id, range_to_update, new_value):
         sheets_service: obj
         sheet_id: str
         range_to_update: str - A1 style range: "A1" or "A1:C1"
+        new_value: single value or DataFrame for multi cell ranges
 
     Returns:
         str: API response
@@ -218,7 +484,7 @@ def update_sheets_range(sheets_service, sheet_id, range_to_update, new_value):
 
     value_range_body = {
         "majorDimension": "ROWS",
-        "values": [[new_value]] # any update MUST be list of lists!
+        "values": serialize_values(new_value) # any update MUST be list of lists!
     }
 
     request = sheets_service.spreadsheets().values().update(
@@ -230,109 +496,188 @@ def update_sheets_range(sheets_service, sheet_id, range_to_update, new_value):
     return request.execute()
 
 
-def update_master_db(sheets_service, sheet_id, df, sheet_range):
-    """Modify sheet data"""
+def to_json_value(val):
+    """Return a single value that is safe to send to the Sheets API (JSON serializable)"""
+    if isinstance(val, str):
+        return val
+    if val is None or pd.isna(val):
+        return ''
+    if isinstance(val, (bool, np.bool_)):
+        return bool(val)
+    if isinstance(val, (int, float, np.number)):
+        if not np.isfinite(float(val)):
+            return '' # inf is not valid JSON, same as a missing value
+        return int(val) if float(val).is_integer() else float(val)
+    if isinstance(val, dt.datetime): # pd.Timestamp is a datetime too
+        return val.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(val, dt.date):
+        return val.isoformat()
+    return str(val)
+
+
+def serialize_column(series) -> list:
+    """Return a column as JSON safe python values, converted in one vectorized pass.
+    NaN/None/inf -> '', whole numbers -> int, partial numbers (ex: 1.5 Horas) -> float, timestamps -> str
+    """
+    if pd.api.types.is_bool_dtype(series) and not series.hasnans:
+        return series.astype(bool).tolist()
+
+    if pd.api.types.is_integer_dtype(series) and not series.hasnans:
+        return series.astype('int64').tolist() # python ints
+
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        out = np.empty(len(values), dtype=object)
+        out[:] = values.tolist() # python floats
+        is_missing = ~np.isfinite(values) # NaN and +-inf, inf can't be sent as JSON nor cast to int
+        is_whole = ~is_missing & (values == np.floor(values))
+        out[is_whole] = values[is_whole].astype(np.int64).tolist()
+        out[is_missing] = ''
+        return out.tolist()
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('').tolist()
+
+    # object/string columns: strings pass through untouched, only the rest is converted
+    values = series.to_numpy(dtype=object)
+    is_str = np.fromiter((isinstance(val, str) for val in values), dtype=bool, count=len(values))
+    if not is_str.all():
+        values = values.copy()
+        converted = np.empty((~is_str).sum(), dtype=object)
+        converted[:] = [to_json_value(val) for val in values[~is_str]]
+        values[~is_str] = converted
+    return values.tolist()
+
+
+def serialize_df(df) -> list:
+    """Return DataFrame rows as a list of lists that can be sent to the Sheets API.
+    Works column by column, so cost does not grow with pandas calls per row.
+    """
+    if not len(df.columns):
+        return [[] for _ in range(len(df))]
+    columns = [serialize_column(df.iloc[:, position]) for position in range(len(df.columns))]
+    return [list(row) for row in zip(*columns)]
 
-    # How the input data should be interpreted.
-    value_input_option = 'USER_ENTERED'
-    json_val_list = []
 
-    # _range = f'J1:J{len(df) + 1}' # must add column header, but index doesn't count in len
-    _range = sheet_range
+def serialize_values(new_value) -> list:
+    """Return any value to write (DataFrame, list of lists or single value) as a JSON safe list of lists"""
+    if isinstance(new_value, pd.DataFrame):
+        return serialize_df(new_value)
+    if isinstance(new_value, (list, tuple)):
+        return [[to_json_value(val) for val in row] for row in new_value]
+    return [[to_json_value(new_value)]]
 
-    for ix,_ in df.iterrows():
-        data_to_serialize = [
-            int(val) 
-            if not isinstance(val,str) 
-            else val 
-            for val in df.iloc[ix].fillna('').to_list()]
-        json_val_list.append(data_to_serialize) # will fill Empty values as strings
 
-    value_range_body = {
-        "majorDimension": "ROWS",
-        "values": json_val_list
-    }
+def chunk_values(values, start_cell='A1', sheet_name=None, max_cells=None) -> list:
+    """Split a list of lists into ranges of at most max_cells cells for values().batchUpdate
 
-    request = sheets_service.spreadsheets().values().update(
-        spreadsheetId=sheet_id, 
-        range=_range,
-        valueInputOption=value_input_option, 
-        body=value_range_body)
-    return request.execute()
+    Args:
+        values list: list of lists (rows) to write
+        start_cell str: top left cell of the data, A1 style: "A2"
+        sheet_name str: optional sheet (tab) name to prefix ranges with
+        max_cells int: defaults to SHEETS_MAX_CELLS_PER_RANGE
 
+    Returns:
+        list: [{'range': 'A2:J2001', 'values': [...]}, ...]
+    """
+    max_cells = max_cells or SHEETS_MAX_CELLS_PER_RANGE
+    start_col = ''.join(char for char in start_cell if char.isalpha()).upper()
+    start_row = int(''.join(char for char in start_cell if char.isdigit()) or 1)
+    width = max((len(row) for row in values), default=1) or 1
+    end_col = column_letter(column_number(start_col) + width - 1)
+    rows_per_chunk = max(max_cells // width, 1)
+    prefix = f"{sheet_name}!" if sheet_name else ''
 
-def add_last_name_to_report(google_service, sheet_id, current_month_df):
-    """Append the last name to the report for sorting.
+    return [
+        {
+            'range': f"{prefix}{start_col}{start_row + offset}:{end_col}{start_row + offset + len(chunk) - 1}",
+            'values': chunk,
+        }
+        for offset in range(0, len(values), rows_per_chunk)
+        if (chunk := values[offset:offset + rows_per_chunk])
+    ]
 
-    Args:
-        sheet_id (str): [description]
-        google_service (google ): [description]
-        current_month_df ([type]): [description]
+
+def batch_update_values(sheets_service, sheet_id, value_ranges, value_input_option='USER_ENTERED') -> dict:
+    """Write many ranges with values().batchUpdate. Ranges are grouped so no single request
+    has more than SHEETS_MAX_CELLS_PER_REQUEST cells.
 
     Returns:
-        [type]: [description]
+        dict: combined response with totalUpdatedRows/totalUpdatedCells and every API response
     """
+    groups, group, group_cells = [], [], 0
+    for value_range in value_ranges:
+        cells = sum(len(row) for row in value_range['values'])
+        if group and group_cells + cells > SHEETS_MAX_CELLS_PER_REQUEST:
+            groups.append(group)
+            group, group_cells = [], 0
+        group.append(value_range)
+        group_cells += cells
+    if group:
+        groups.append(group)
+
+    combined = {'spreadsheetId': sheet_id, 'totalUpdatedRows': 0, 'totalUpdatedCells': 0, 'responses': []}
+    for group in groups:
+        response = sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=sheet_id,
+            body={'valueInputOption': value_input_option, 'data': group}).execute()
+        combined['totalUpdatedRows'] += response.get('totalUpdatedRows', 0)
+        combined['totalUpdatedCells'] += response.get('totalUpdatedCells', 0)
+        combined['responses'].extend(response.get('responses', []))
+    return combined
 
-    # How the input data should be interpreted.
-    value_input_option = 'USER_ENTERED'  # TODO: Update placeholder value.
-    json_val_list = []
 
-    _range = f'J1:J{len(current_month_df) + 1}' # must add column header, but index doesn't count in len
+def update_master_db(sheets_service, sheet_id, df, sheet_range):
+    """Modify sheet data. Large frames are written as several ranges in size bounded batchUpdate calls
 
-    for row in range(len(current_month_df) + 1):
-        if row == 0:
-            json_val_list.append(["Last_Name"])
-        else:
-            current_row = row + 1
-            json_val_list.append([f"=TRIM(PROPER(MID(B{current_row},SEARCH(\" \",B{current_row})+1,LEN(B{current_row}))))"])
+    Args:
+        sheet_range: str - A1 style range, only the top left cell is used: "A2:J100"
+    """
+    sheet_name, _, cells = sheet_range.rpartition('!')
+    start_cell = cells.split(':')[0]
+
+    value_ranges = chunk_values(serialize_df(df), start_cell=start_cell, sheet_name=sheet_name or None)
+    return batch_update_values(sheets_service, sheet_id, value_ranges)
+
+
+def append_sheets_rows(sheets_service, sheet_id, df, sheet_range):
+    """Append DataFrame rows after the last row of data in sheet_range.
+    Only the new rows are sent, no matter how big the sheet is.
+
+    Args:
+        sheets_service: obj
+        sheet_id: str
+        df: DataFrame - columns MUST already be in the same order as the sheet
+        sheet_range: str - A1 style range of the table to append to: "A:J"
 
+    Returns:
+        dict: API response
+    """
     value_range_body = {
         "majorDimension": "ROWS",
-        "values": json_val_list
+        "values": serialize_df(df.reset_index(drop=True))
     }
 
-    request = google_service.spreadsheets().values().update(
-        spreadsheetId=sheet_id, 
-        range=_range,
-        valueInputOption=value_input_option, 
+    request = sheets_service.spreadsheets().values().append(
+        spreadsheetId=sheet_id,
+        range=sheet_range,
+        valueInputOption='USER_ENTERED',
+        insertDataOption='INSERT_ROWS', # never overwrite rows under the table
         body=value_range_body)
-    # pprint(response) # debugging
     return request.execute()
 
 
-def sort_sheet(sheet_service, spreadsheet_id, sheet_gid, column_to_sort="J", sort_type="DESCENDING"):
-    sort_success = False
-    try:
-        requests = {
-            "requests": [
-                {
-                    "sortRange": {
-                            "range": {
-                                "sheetId": sheet_gid,
-                                "startRowIndex": 1, # DON'T start at 0, this is the header row.
-                                "startColumnIndex": 0 # MUST start at 0 to sort rows or else data corruptioon occurs
-                            },
-                            "sortSpecs": [
-                                {
-                                    "dataSourceColumnReference": {
-                                        "name": column_to_sort # column by letter to sort! J = Last Name
-                                    },
-                                    "sortOrder": sort_type # ASC/DESC - Spelled out in CAPS
-                                }
-                            ]
-                    }
-                }
-            ]
-        }
-        response = sheet_service.spreadsheets().batchUpdate(body=requests, spreadsheetId=spreadsheet_id).execute()
-        if response:
-            sort_success = True
-        return sort_success
-        
-    except Exception as e:
-        print(e)
-        send_twilio_message({},error=e,error_message=True)
-        return sort_success
+def last_name_formulas(report_rows: int, first_row: int = 0, name_letter: str = 'B') -> list:
+    """Return the Last_Name column (header + one formula per report row) used to sort the report.
+    With first_row only the formulas of report rows first_row.. are returned (no header), to write at
+    J{first_row + 2}. name_letter is the column of the name question
+    """
+    # index starts at 0 & header doesn't count, so report row n is sheet row n + 2
+    name = name_letter
+    return [["Last_Name"]] * (first_row == 0) + [
+        [f"=TRIM(PROPER(MID({name}{row},SEARCH(\" \",{name}{row})+1,LEN({name}{row}))))"]
+        for row in range(first_row + 2, report_rows + 2)
+    ]
 
 
 def parse_sheet_and_gid_from_url(url):
@@ -347,15 +692,91 @@ def parse_sheet_and_gid_from_url(url):
     return sheet_name, sheet_gid
 
 
-def update_datawarehouse(sheets_service, current_report_df, current_report_month, range='A:J'):
-    '''get current data from master DW sheet. Append data that is NEW for specified month'''
+def format_for_datawarehouse(current_report_df, current_report_month) -> pd.DataFrame:
+    """Return copy of the report with Timestamp replaced by Year-Month, as stored in the warehouse"""
+    return WAREHOUSE_PIPELINE.apply(current_report_df.reset_index(drop=True), report_month=current_report_month)
+
+
+def store_in_warehouse_db(engine, current_report_df, current_report_month, volunteer_ids=None,
+                          planner=None, dbwh_sheet=None) -> pd.DataFrame:
+    """Insert the month's new reports into the SQL warehouse, keyed by the roster row_id each report
+    resolved to (volunteer_ids, in row order). Returns the warehouse formatted rows that were new
+
+    With a planner the rows are only inserted once the planner applied its writes to dbwh_sheet, where
+    the caller exports them (export_to_datawarehouse_sheet). A failed export leaves them new for the next run
+    """
+    warehouse_df = format_for_datawarehouse(current_report_df, current_report_month)
+    if planner is None:
+        new_reports_df = engine.insert_reports(warehouse_df, volunteer_ids)
+    else:
+        new_reports_df, new_ids = engine.new_reports(warehouse_df, volunteer_ids)
+        if len(new_reports_df):
+            planner.on_success(dbwh_sheet, lambda: engine.insert_reports(new_reports_df, new_ids))
+    logging.info(f"Warehouse DB: {len(new_reports_df)} new report(s) for {current_report_month}")
+    return new_reports_df
+
+
+def export_to_datawarehouse_sheet(sheets_service, warehouse_df, range='A:J', dbwh_sheet=None, planner=None):
+    """Append rows the SQL warehouse just stored (see store_in_warehouse_db) to the warehouse sheet.
+    Only the sheet's header is read, to line the columns up. An empty sheet gets the report's header
+    """
+    dbwh_sheet = dbwh_sheet or DBWH_SHEET
+    if warehouse_df.empty:
+        logging.info("No new data for Data Warehouse!")
+        return
+
+    header = next(iter(get_worksheet_values(sheets_service, dbwh_sheet, '1:1')), [])
+    if header:
+        if unknown_cols := [col for col in warehouse_df.columns if col not in header]:
+            logging.warning(f"Columns not in Data Warehouse will not be saved: {unknown_cols}")
+        values = serialize_df(warehouse_df.reindex(columns=header).reset_index(drop=True))
+    else: # brand new warehouse
+        values = [warehouse_df.columns.to_list()] + serialize_df(warehouse_df.reset_index(drop=True))
+
+    if planner is not None:
+        planner.append_rows(dbwh_sheet, DBWH_SHEET_GID, values, label='warehouse export')
+        return
+
+    value_range_body = {"majorDimension": "ROWS", "values": values}
+    dw_update_response = sheets_service.spreadsheets().values().append(
+        spreadsheetId=dbwh_sheet, range=range, valueInputOption='USER_ENTERED', insertDataOption='INSERT_ROWS',
+        body=value_range_body).execute()
+    if dw_update_response and dw_update_response.get('updates'):
+        logging.info(f'Appended {dw_update_response["updates"]["updatedRows"]} rows to Master Sheet')
+    else:
+        logging.error(f"Possible Warehouse Update error: {dw_update_response}")
+        raise Exception("Data warehouse update error")
+
+
+def archive_reports(current_report_df, current_report_month, dbwh_sheet, archive_dir=None) -> None:
+    """Add the month's reports to the warehouse's Parquet archive (one archive per warehouse sheet)"""
+    archive = ReportArchive(os.path.join(archive_dir or REPORT_ARCHIVE_DIR, dbwh_sheet))
+    try:
+        archive.write(format_for_datawarehouse(current_report_df, current_report_month))
+    except Exception:
+        # analytics only, the warehouse itself is still updated
+        logging.error(f"Could not archive reports for {current_report_month}", exc_info=True)
+
+
+def update_datawarehouse(sheets_service, current_report_df, current_report_month, range='A:J', write_mode=None,
+                         dbwh_sheet=None, planner=None):
+    '''get current data from master DW sheet. Append data that is NEW for specified month.
+    With a WritePlanner the write is only planned, it is sent when the planner flushes
+    '''
+    dbwh_sheet = dbwh_sheet or DBWH_SHEET
+
+    if REPORT_ARCHIVE_DIR:
+        archive_reports(current_report_df, current_report_month, dbwh_sheet)
+
+    if (write_mode or DBWH_WRITE_MODE) == 'append':
+        return append_to_datawarehouse(
+            sheets_service, current_report_df, current_report_month, range=range, dbwh_sheet=dbwh_sheet,
+            planner=planner)
     
-    data_warehouse_df = get_worksheet_data(sheets_service, DBWH_SHEET, range=range)
+    data_warehouse_df = get_worksheet_data(sheets_service, dbwh_sheet, range=range, schema=WAREHOUSE)
     dw_cur_month_df = data_warehouse_df[data_warehouse_df['Year-Month'] == current_report_month]
 
-    temp_df = current_report_df.rename(columns={'Timestamp':'Year-Month'})
-    temp_df.reset_index(drop=True, inplace=True)
-    temp_df['Year-Month'] = current_report_month
+    temp_df = format_for_datawarehouse(current_report_df, current_report_month)
     temp_df = temp_df[ # drop those that are already in datawarehouse. No duplicates!
         ~(temp_df['¿Cual es su nombre?'].isin(dw_cur_month_df['¿Cual es su nombre?'].to_list()))
         ]
@@ -367,60 +788,99 @@ def update_datawarehouse(sheets_service, current_report_df, current_report_month
     temp_df = pd.concat([data_warehouse_df,temp_df])
     temp_df.reset_index(drop=True, inplace=True)
 
-    dw_update_response = update_master_db(sheets_service, DBWH_SHEET, temp_df, f'A2:J{len(temp_df) + 1}')
+    if planner is not None:
+        planner.update_cells(dbwh_sheet, DBWH_SHEET_GID, 'A2', serialize_df(temp_df), label='warehouse rewrite')
+        return
+
+    dw_update_response = update_master_db(sheets_service, dbwh_sheet, temp_df, f'A2:J{len(temp_df) + 1}')
 
     if dw_update_response:
-        logging.info(f'Updated Master Sheet with {dw_update_response["updatedRows"]}')
+        logging.info(f'Updated Master Sheet with {dw_update_response["totalUpdatedRows"]}')
     else:
         logging.error(f"Possible Warehouse Update error: {dw_update_response}")
         raise Exception("Data warehouse update error")
 
 
-def generate_alert_list(current_form_url, missing_reports_df, volunteer_map_df):
-    '''Generate list of alerts by person based on contact rules. (ie. Escalation rules)'''
-    
-    format_number = lambda x: \
-        f"{COUNTRY_CODE}{x.replace('(','').replace(')','').replace(' ','').replace('  ','').replace('-','').strip()}" \
-        if x is not None or x != "" \
-        else MASTER_ALERT_NUM
-
-    twilio_message_list = []
-
-    for (ix,row) in missing_reports_df.iterrows():
-        permissions = row['permission_to_contact?']
-        contact_delegation = ''
-
-        if row['Active?'] == 'n':
-            print(f'Skipping inactive volunteer {row["full_name"]}')
-            continue # skip inactive volunteers
-
-        elif permissions == 'y':
-            twilio_message_list.append(
-                {
-                    'name': row['full_name'],
-                    'number': format_number(row['Cell']).replace('\u202d','').replace('\u202c','') , 
-                    'form_link': current_form_url
-                }
-            )
-
-        elif permissions == 'n' and not pd.isnull(row['delegate_notification_to']):
-            contact_delegation = \
-                volunteer_map_df[
-                    volunteer_map_df.row_id == row['delegate_notification_to']
-                    ]['Cell'].item()
-            if isinstance(contact_delegation,list):
-                contact_delegation = contact_delegation[0]
-            if contact_delegation == "":
-                raise Exception(f"{row['full_name']} should delegate to id {contact_delegation} - but is Null")
-
-            twilio_message_list.append(
-                {
-                    'name': row['full_name'],
-                    'number': format_number(contact_delegation).replace('\u202d','').replace('\u202c',''), 
-                    'form_link': current_form_url
-                }
-            )
-    return twilio_message_list
+def append_to_datawarehouse(sheets_service, current_report_df, current_report_month, range='A:J', dbwh_sheet=None,
+                            planner=None):
+    '''Incremental warehouse update. Only (Year-Month, name) rows that are not in the
+    local key index are appended. The warehouse is only read when the index must be (re)seeded.
+    '''
+    dbwh_sheet = dbwh_sheet or DBWH_SHEET
+    key_index = WarehouseKeyIndex.load(DBWH_INDEX_DIR, dbwh_sheet, max_age_days=DBWH_INDEX_MAX_AGE_DAYS)
+
+    temp_df = format_for_datawarehouse(current_report_df, current_report_month)
+
+    if key_index is None:
+        logging.info(f"Seeding warehouse key index for {dbwh_sheet}")
+        # streamed, the whole warehouse is never in memory
+        key_index = WarehouseKeyIndex.from_chunks(
+            dbwh_sheet, iter_worksheet_chunks(sheets_service, dbwh_sheet, range, schema=WAREHOUSE))
+        if key_index is None: # brand new warehouse, take header from report
+            key_index = WarehouseKeyIndex(dbwh_sheet, header=temp_df.columns.to_list())
+
+    temp_df = temp_df[ # drop those that are already in datawarehouse. No duplicates!
+        ~pd.Series(
+            key_index.contains(temp_df['Year-Month'], temp_df['¿Cual es su nombre?']),
+            index=temp_df.index,
+            dtype=bool)
+        ]
+
+    if temp_df.empty:
+        logging.info("No new data for Data Warehouse!")
+        key_index.save(DBWH_INDEX_DIR)
+        return
+
+    if unknown_cols := [col for col in temp_df.columns if col not in key_index.header]:
+        logging.warning(f"Columns not in Data Warehouse will not be saved: {unknown_cols}")
+
+    # columns MUST line up with the warehouse header, missing columns are left blank
+    temp_df = temp_df.reindex(columns=key_index.header)
+
+    def record_keys():
+        key_index.add(temp_df['Year-Month'], temp_df['¿Cual es su nombre?'])
+        key_index.save(DBWH_INDEX_DIR)
+
+    if planner is not None:
+        # the index only learns the keys once the rows were really written
+        planner.append_rows(
+            dbwh_sheet, DBWH_SHEET_GID, serialize_df(temp_df.reset_index(drop=True)), label='warehouse append')
+        planner.on_success(dbwh_sheet, record_keys)
+        return
+
+    dw_update_response = append_sheets_rows(sheets_service, dbwh_sheet, temp_df, range)
+
+    if dw_update_response and dw_update_response.get('updates'):
+        logging.info(f'Appended {dw_update_response["updates"]["updatedRows"]} rows to Master Sheet')
+    else:
+        logging.error(f"Possible Warehouse Update error: {dw_update_response}")
+        raise Exception("Data warehouse update error")
+
+    record_keys()
+
+
+def generate_alert_list(current_form_url, missing_reports_df, volunteer_map_df, contact_index=None,
+                        fallback_number=None):
+    '''Generate list of alerts by person based on contact rules. (ie. Escalation rules)
+    Numbers and delegation are resolved once by ContactIndex, alerts are a join on row_id
+    '''
+    if contact_index is None:
+        contact_index = ContactIndex(
+            volunteer_map_df, country_code=COUNTRY_CODE, fallback_number=fallback_number or MASTER_ALERT_NUM)
+
+    # skip inactive volunteers
+    active_df = missing_reports_df[missing_reports_df['Active?'] != 'n']
+    if skipped := len(missing_reports_df) - len(active_df):
+        logging.info(f'Skipping {skipped} inactive volunteer(s)')
+
+    alerts_df = active_df[['row_id', 'full_name']].join(
+        contact_index.alerts_for(active_df['row_id']), on='row_id')
+    alerts_df = alerts_df[alerts_df['number'].notna()]
+
+    return [
+        {'name': name, 'number': number, 'form_link': current_form_url}
+        for name, number in zip(alerts_df['full_name'], alerts_df['number'])
+    ]
 
 
 def append_day_suffix(day) -> str:
@@ -444,8 +904,18 @@ def append_day_suffix(day) -> str:
 
 
 
-def run():
+def run(tenant=None):
+    """Daily pipeline for one tenant (defaults to the env var tenant).
+    Credentials are shared by every run, API services are reused per thread.
+    Stage timings and counts are logged as one run summary (see metrics.RunSummary)
+    """
+    tenant = tenant or default_tenant()
+    with RunSummary(tenant.name) as summary:
+        run_pipeline(tenant, summary)
+
 
+def run_pipeline(tenant, summary):
+    """Body of run(), stages are timed into summary (metrics.RunSummary)"""
     # APP_ENV is either prod or dev. If missing var, run as dev
     if APP_LEVEL != "prod":
         from pprint import pprint
@@ -453,26 +923,37 @@ def run():
     else:
         logging_level = logging.INFO
 
-    logging.basicConfig(format='[%(levelname)s] %(asctime)s | %(message)s', datefmt='%m/%d/%Y %I:%M:%S%p', level=logging_level)
+    configure_logging(logging_level)
 
 
+    preload(pytz)
     today = dt.datetime.now(tz=pytz.timezone('US/Central'))
     tomorrow = today + dt.timedelta(days=1)
 
     # run on last date of the month up until max day in month. 
     # example: runs on 28th if tomorrow is the 1st. (Will consider leap years!)
     #          AND runs on 1st up until the 7th (SCRIPT_STOP_DAY)
-    if today.day >= SCRIPT_STOP_DAY and tomorrow.day != 1 and APP_LEVEL != "dev":
-        logging.info(f"It's past the {append_day_suffix(SCRIPT_STOP_DAY)} - Manual intervention required!")
+    if today.day >= tenant.script_stop_day and tomorrow.day != 1 and APP_LEVEL != "dev":
+        logging.info(f"[{tenant.name}] It's past the {append_day_suffix(tenant.script_stop_day)} - Manual intervention required!")
+        summary.outcome = 'skipped'
         return
 
 
     try:
-        creds = create_service_account_creds()
-        sheets_service = build('sheets', 'v4', credentials=creds)
-
-        # 1 get last sheet in progress_master sheet
-        progress_df = get_worksheet_data(sheets_service, MASTER_SHEET_ID, PROGRESS_SHEET_RANGE)
+        preload(np, pd, unidecode) # before any tenant thread touches them
+        google_client = get_google_client()
+        sheets_service = google_client.service('sheets', 'v4')
+        # every write of this run is sent at the end, one batchUpdate per spreadsheet
+        planner = WritePlanner(sheets_service, max_cells=SHEETS_MAX_CELLS_PER_REQUEST)
+        configure_sheets_cache(lambda: google_client.service('drive', 'v3'))
+
+        # 1 get last sheet in progress_master sheet AND volunteer data in one round trip
+        with summary.stage('read_master'):
+            # validated on load: a renamed header stops the run here, before any write or text
+            progress_df, volunteer_map_df = batch_get_worksheet_data(
+                sheets_service,
+                [(tenant.master_sheet_id, PROGRESS_SHEET_RANGE, PROGRESS),
+                 (tenant.master_sheet_id, PUBS_SHEET_RANGE, PUBS)])
 
         # get last row from sheet
         # should we use a date parser to sort by date instead? - This would be more "fail safe"
@@ -484,19 +965,16 @@ def run():
             # no need to continue, all volunteer data has been collected!
             # print(f"Exiting... All volunteer data has been collected for {current_report_month}.")
             logging.info(f"Exiting... All volunteer data has been collected for {current_report_month}")
+            summary.outcome = 'collected'
             return
 
 
-        # get volunteer data 
-        volunteer_map_df = get_worksheet_data(sheets_service, MASTER_SHEET_ID, PUBS_SHEET_RANGE)
-
         # get current month's data
         report_sheet_id,report_sheet_gid = parse_sheet_and_gid_from_url(progress_df['response_sheet_url'].item())
 
-        current_report_df = get_worksheet_data(
-            sheets_service=sheets_service,
-            sheet_id=report_sheet_id,
-            range=RESPONSE_SHEET_RANGE)
+        # only the rows submitted since the last run are read, see ResponseWatermark
+        with summary.stage('read_report'):
+            watermark, new_rows, new_report_df = get_new_responses(sheets_service, report_sheet_id)
 
         """ If there is any data:
             1. Clean data
@@ -508,40 +986,52 @@ def run():
             7. OR send message to proper contact 
             8. Update Datawarehouse 
         """
-        if len(current_report_df):
-            # clean data - Passed by ref, so this modifies object
-            # upon new month with empty df, do not make all these api calls
-            clean_informes_data(current_report_df)
-
-            # append last name via Google Sheets API call
-            add_name_reponse = add_last_name_to_report(sheets_service,sheet_id=report_sheet_id,current_month_df=current_report_df)
-
-            # check if proper # of rows were updated: len(df) + header row "Last_Name"
-            assert add_name_reponse['updatedCells'] == (len(current_report_df)+1), "Updated rows does not match length of report df"
-
-            sort_response = sort_sheet(
-                sheet_service=sheets_service,
-                spreadsheet_id=report_sheet_id,
-                sheet_gid=report_sheet_gid,
-                column_to_sort="J",
-                sort_type="ASCENDING")
-
-            assert sort_response, "Sorting report failed"
-
-            duplicates_df = current_report_df[current_report_df['¿Cual es su nombre?'].duplicated()]
-            if len(duplicates_df):
-                ### do something with this... Alert?
-                logging.warning(f"There are duplicates!{duplicates_df['¿Cual es su nombre?'].to_list()}")
-            del duplicates_df
+        # Add full_name field, normalized the same way as report names
+        with summary.stage('clean'):
+            add_full_name(volunteer_map_df)
+            reported_ids, volunteer_ids = set(), None
+
+            if new_report_df is not None and len(new_report_df):
+                # clean data - Passed by ref, so this modifies object
+                # upon new month with empty df, do not make all these api calls
+                clean_informes_data(new_report_df)
+
+                # last name formulas for the new rows, then sort the whole report by it (same batchUpdate, never half done)
+                report_gid, first_row = report_sheet_gid or 0, len(watermark)
+                report_letters = RESPONSE.letters(watermark.header)
+                last_name = report_letters['Last_Name']
+                planner.update_cells(
+                    report_sheet_id, report_gid, f'{last_name}{first_row + 2}' if first_row else f'{last_name}1',
+                    last_name_formulas(first_row + len(new_report_df), first_row, report_letters[NAME_COL]),
+                    label='Last_Name')
+                planner.sort(
+                    report_sheet_id, report_gid, column=last_name, order="ASCENDING", label='sort by Last_Name')
+
+                if RESPONSE_WATERMARK_DIR:
+                    cleaned_rows = serialize_df(new_report_df)
+
+                    def advance_watermark():
+                        # only once the new rows really got their Last_Name
+                        watermark.add(new_rows, cleaned_rows)
+                        watermark.save(RESPONSE_WATERMARK_DIR)
+                    planner.on_success(report_sheet_id, advance_watermark)
+
+            current_report_df = merge_responses(watermark, new_report_df)
+            if len(current_report_df):
+                # match each submission to a volunteer row_id. Typos, unknown names
+                # and duplicate submissions are logged instead of texting the volunteer
+                resolution = RosterIndex(volunteer_map_df).resolve(current_report_df[NAME_COL])
+                resolution.log_issues()
+                reported_ids = resolution.matched_ids
+                volunteer_ids = resolution.row_id.to_list() # warehouse key of each report
+        summary.rows('roster', len(volunteer_map_df))
+        summary.rows('report', len(current_report_df))
+        summary.rows('report_new', len(new_rows))
 
         #### If current_report_df is empty, we need to begin sending reminder messages 
 
-        # Find those who haven't submitted their report
-        # Add full_name field
-        volunteer_map_df['full_name'] = volunteer_map_df.apply(lambda row: f"{row['First_Name']} {row['Last_Name']}",axis=1)
-
         # get df of missing reports, if any. 
-        missing_reports_df = volunteer_map_df[~volunteer_map_df['full_name'].isin(current_report_df['¿Cual es su nombre?'])]
+        missing_reports_df = volunteer_map_df[~volunteer_map_df['row_id'].isin(reported_ids)]
 
         # drop inactive volunteers
         missing_reports_df.drop(index=missing_reports_df.loc[ lambda df: df['Active?'] == 'n' ].index,inplace=True)
@@ -550,58 +1040,150 @@ def run():
             # Collection has been Completed!
 
             # Update the progress_sheet to complete if there are no more to collect!
-            # index starts at 0 & header doesn't count so +2 to index. Column D is progress
-            try:
-                cell_to_update = f"D{progress_df.index.to_list()[0] + 2}"
-                progress_completion_update = update_sheets_range(sheets_service,
-                                                MASTER_SHEET_ID,
-                                                range_to_update=cell_to_update, 
-                                                new_value='complete')
-                ###TODO: Add code to email secretary!
-                logging.info(f"Report collections for {progress_df['year_month'].item()} Complete!")
-
-            except:
-                logging.error(traceback.format_exc())
-                raise Exception(f"Error updating progress sheet! {progress_completion_update}")
+            # index starts at 0 & header doesn't count so +2 to index. Column D (status) is progress
+            cell_to_update = f"{PROGRESS.letter('status', progress_df.columns)}{progress_df.index.to_list()[0] + 2}"
+            planner.update_cells(
+                tenant.master_sheet_id, PROGRESS_SHEET_GID, cell_to_update, [['complete']], label='progress status')
+            ###TODO: Add code to email secretary!
         else:
-            # IF there are any missing reports, contact volunteer
-
+            # IF there are any missing reports, contact volunteer (after the writes below)
             current_form_url = progress_df['form_url'].item()
-            twilio_message_list = generate_alert_list(current_form_url, missing_reports_df, volunteer_map_df)
-            errors_from_twilio, message_stats = send_twilio_message(twilio_message_list,None)
-            if message_stats:
-                logging.info(f"Sent {len(message_stats)} messages")
-
-            if errors_from_twilio:
-                raise Exception(f"Message Send Failure(s): {len(errors_from_twilio)}")
-
-        # Finally, copy formatted volunteer data to datawarehouse
-        if len(current_report_df):
-            update_datawarehouse(sheets_service, current_report_df, current_report_month, range='A:J')
+            with summary.stage('alerts'):
+                twilio_message_list = generate_alert_list(
+                    current_form_url, missing_reports_df, volunteer_map_df, fallback_number=tenant.master_alert_num)
+            summary.rows('missing', len(missing_reports_df))
+
+        # Then, copy formatted volunteer data to datawarehouse (SQL and/or sheet)
+        with summary.stage('warehouse'):
+            if len(current_report_df) and DBWH_BACKEND != 'sheets':
+                # with a sheet export, the SQL rows are inserted once the export was written
+                new_reports_df = store_in_warehouse_db(
+                    warehouse_engine(tenant), current_report_df, current_report_month, volunteer_ids,
+                    planner=planner if DBWH_EXPORT_SHEET else None, dbwh_sheet=tenant.dbwh_sheet)
+                if REPORT_ARCHIVE_DIR:
+                    archive_reports(current_report_df, current_report_month, tenant.dbwh_sheet)
+                if DBWH_EXPORT_SHEET:
+                    # the SQL warehouse dropped the duplicates, only its new rows are exported
+                    export_to_datawarehouse_sheet(
+                        sheets_service, new_reports_df, dbwh_sheet=tenant.dbwh_sheet, planner=planner)
+            elif len(current_report_df):
+                update_datawarehouse(
+                    sheets_service, current_report_df, current_report_month, range='A:J',
+                    dbwh_sheet=tenant.dbwh_sheet, planner=planner)
+
+        logging.info(f"[{tenant.name}] Sheets writes: {planner.describe()}")
+        try:
+            with summary.stage('sheets_writes'):
+                planner.flush()
+        finally:
+            # reminders never wait on the sheets writes: a failed flush still alerts the admin (below),
+            # volunteers are texted either way
+            if not missing_reports_df.empty:
+                deliver_reminders(tenant, twilio_message_list, current_report_month, today.date(), summary)
+        if missing_reports_df.empty:
+            logging.info(f"Report collections for {progress_df['year_month'].item()} Complete!")
+            if FINAL_REPORT_DIR and len(current_report_df):
+                with summary.stage('final_report'):
+                    write_final_reports(
+                        [(current_report_df, current_report_month, tenant.group)],
+                        os.path.join(FINAL_REPORT_DIR, tenant.name))
 
     except Exception as e:
         logging.error(e)
-        send_twilio_message({}, traceback.format_exc(), error_message=True)
+        summary.outcome = 'error'
+        send_twilio_message({}, f"[{tenant.name}] {traceback.format_exc()}", error_message=True, tenant=tenant)
+
+    logging.info(f"[{tenant.name}] DONE")
+
+
+def deliver_reminders(tenant, twilio_message_list, current_report_month, day, summary) -> None:
+    """Queue (MESSAGE_DELIVERY=queue) or send the month's reminders. Raises if an inline send failed"""
+    if MESSAGE_DELIVERY == 'queue':
+        # durable + idempotent per day: a rerun or crash later in this run won't re-text anyone
+        with summary.stage('enqueue_messages'):
+            queued = OutboundQueue(tenant_queue_path(tenant)).enqueue(
+                current_report_month,
+                build_reminder_messages(twilio_message_list, tenant.admin_name),
+                day=day.isoformat())
+        REGISTRY.inc('messages_total', queued, outcome='queued', tenant=tenant.name)
+        logging.info(f"Queued {queued} new messages")
+        return
+
+    with summary.stage('send_messages'):
+        errors_from_twilio, message_stats = send_twilio_message(twilio_message_list,None,tenant=tenant)
+    if message_stats:
+        logging.info(f"Sent {len(message_stats)} messages")
+
+    if errors_from_twilio:
+        raise Exception(f"Message Send Failure(s): {len(errors_from_twilio)}")
 
-    logging.info("DONE")
+
+def get_tenants() -> list:
+    """Tenants from TENANTS_FILE, or the single env var tenant"""
+    return load_tenants(TENANTS_FILE) if TENANTS_FILE else [default_tenant()]
+
+
+def run_all_tenants(tenants=None, max_workers=None) -> dict:
+    """Run every tenant's pipeline concurrently in a bounded pool.
+    Credentials (and the sheets cache / Twilio rate limit) are shared. A failing tenant never stops the others.
+    Returns {tenant name: None or exception}
+    """
+    tenants = tenants or get_tenants()
+    preload_all() # numpy, pandas, unidecode... LazyLoader is not thread safe before python 3.12
+    try:
+        create_service_account_creds() # one token exchange, shared by every tenant
+    except Exception:
+        # every run() retries and alerts its own admin
+        logging.error("Could not create shared Google credentials", exc_info=True)
+    outcomes = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_TENANT_WORKERS) as pool:
+        futures = {pool.submit(run, tenant): tenant for tenant in tenants}
+        for future in as_completed(futures):
+            tenant = futures[future]
+            try:
+                future.result() # run() alerts its own admin, this only catches what escapes it
+                outcomes[tenant.name] = None
+            except Exception as e:
+                logging.error(f"[{tenant.name}] run failed", exc_info=True)
+                outcomes[tenant.name] = e
+    return outcomes
+
+
+def drain_all_tenants(tenants=None) -> None:
+    """Worker: drain every tenant's outbound queue"""
+    for tenant in tenants or get_tenants():
+        try:
+            drain_outbound_queue(tenant=tenant)
+        except Exception:
+            logging.error(f"[{tenant.name}] queue drain failed", exc_info=True)
 
 
 if __name__=='__main__':
-    
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
     ## debugging
     ## TODO: use pytest to create unit tests
     # current_form_link = "https://forms.gle/79BW1bGsJDMJiuAQ6"
     # send_twilio_message([{"name": "Test Person", "number": MASTER_ALERT_NUM, "form_link": current_form_link}], None)
     ##
 
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
     print("Running upon deployment...")
-    run()
+    run_all_tenants()
+    if MESSAGE_DELIVERY == 'queue':
+        drain_all_tenants()
 
 
     # Schedule this script to run at a specific cadence
     scheduler = BlockingScheduler()
     #24 hr format: Runs at 6pm CST
-    scheduler.add_job(func=run, trigger='cron', hour=18, timezone='US/Central')
+    scheduler.add_job(func=run_all_tenants, trigger='cron', hour=18, timezone='US/Central')
+    if MESSAGE_DELIVERY == 'queue':
+        # worker delivers queued messages independently of run()
+        scheduler.add_job(func=drain_all_tenants, trigger='interval', minutes=QUEUE_DRAIN_MINUTES)
     print('Starting scheduler...')
     scheduler.start()
 
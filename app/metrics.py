@@ -0,0 +1,203 @@
+"""Pipeline instrumentation: counters, stage timings and a per-run summary.
+Everything is kept in process (no client library) and rendered in the Prometheus text
+format by an optional /metrics endpoint, see start_metrics_server (METRICS_PORT).
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+import contextlib
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0)) # 0 = no /metrics endpoint
+RUN_SUMMARY_PATH = os.getenv("RUN_SUMMARY_PATH", "") # json lines file of run summaries, "" = only logged
+PREFIX = "volunteer_"
+HELP = {
+    "stage_seconds": ("summary", "Time spent in each pipeline stage"),
+    "runs_total": ("counter", "Pipeline runs by outcome"),
+    "rows_total": ("counter", "Rows processed by stage"),
+    "google_requests_total": ("counter", "Google API HTTP requests by api and status"),
+    "google_bytes_total": ("counter", "Google API payload bytes by api and direction"),
+    "messages_total": ("counter", "Reminder/alert messages by outcome"),
+    "twilio_requests_total": ("counter", "Twilio message create attempts by outcome"),
+    "twilio_bytes_total": ("counter", "Twilio message body bytes sent"),
+    "twilio_throttled_seconds_total": ("counter", "Time Twilio sends waited on the rate limit"),
+    "cache_hits_total": ("counter", "Cache hits by cache"),
+    "cache_misses_total": ("counter", "Cache misses by cache"),
+}
+
+
+def format_value(value) -> str:
+    """Sample value at full precision: integers without a decimal point, NaN/+Inf/-Inf as Prometheus spells them"""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() and abs(value) < 2 ** 53 else repr(value)
+
+
+def escape(label_value) -> str:
+    return str(label_value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    """Thread safe counters and (sum, count) summaries keyed by (name, sorted labels)"""
+
+    def __init__(self) -> None:
+        self.counters = {}
+        self.summaries = {}
+        self.collectors = [] # called on render, return [(name, labels, value)] read from elsewhere
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if run := current_run():
+            run.count(name, value, **labels)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            total, count = self.summaries.get(key, (0.0, 0))
+            self.summaries[key] = (total + value, count + 1)
+
+    def value(self, name: str, **labels) -> float:
+        """Counter value, summed over every label set matching labels"""
+        with self.lock:
+            return sum(value for (key_name, key_labels), value in self.counters.items()
+                       if key_name == name and set(labels.items()) <= set(key_labels))
+
+    def collect(self, collector) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        with self.lock:
+            counters, summaries = dict(self.counters), dict(self.summaries)
+        for collector in self.collectors:
+            try:
+                for name, labels, value in collector():
+                    counters[(name, tuple(sorted(labels.items())))] = value
+            except Exception:
+                logging.debug("metrics collector failed", exc_info=True)
+
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), (total, count) in summaries.items():
+            samples.setdefault(name, []).extend([(f"{name}_sum", labels, total), (f"{name}_count", labels, count)])
+
+        lines = []
+        for name in sorted(samples):
+            kind, description = HELP.get(name, ("untyped", name))
+            lines += [f"# HELP {PREFIX}{name} {description}", f"# TYPE {PREFIX}{name} {kind}"]
+            for sample_name, labels, value in samples[name]:
+                label_text = ",".join(f'{key}="{escape(val)}"' for key, val in labels)
+                lines.append(f"{PREFIX}{sample_name}{{{label_text}}} {format_value(value)}" if label_text
+                             else f"{PREFIX}{sample_name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_local = threading.local()
+
+
+def current_run():
+    """RunSummary of the run executing in this thread, None outside of a run"""
+    return getattr(_local, "run", None)
+
+
+class RunSummary:
+    """Stage timings and counts of ONE run. Counters incremented on the run's thread are
+    added here as well as to the registry (Google services are per thread, so their calls land here)
+    """
+
+    def __init__(self, tenant: str, registry: Registry = None) -> None:
+        self.tenant = tenant
+        self.registry = registry or REGISTRY
+        self.started = time.time()
+        self.stages = {} # stage -> seconds, in the order they ran
+        self.counts = {} # "name{label=value}" -> value
+        self.outcome = None
+
+    def __enter__(self):
+        self.previous, _local.run = current_run(), self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _local.run = self.previous
+        self.finish("error" if exc_type or self.outcome == "error" else self.outcome or "ok")
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Time a pipeline stage (nested stages are timed on their own too)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.registry.observe("stage_seconds", seconds, stage=name, tenant=self.tenant)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        labels.pop("tenant", None) # the whole summary is one tenant's
+        key = name + ("{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}" if labels else "")
+        self.counts[key] = self.counts.get(key, 0) + value
+
+    def rows(self, stage: str, rows: int) -> None:
+        self.registry.inc("rows_total", rows, stage=stage, tenant=self.tenant)
+
+    def as_dict(self) -> dict:
+        return {
+            "tenant": self.tenant,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "seconds": round(time.time() - self.started, 3),
+            "outcome": self.outcome,
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "counts": self.counts,
+        }
+
+    def finish(self, outcome: str) -> dict:
+        """Record the outcome and write the structured summary (log line + RUN_SUMMARY_PATH)"""
+        self.outcome = outcome
+        self.registry.inc("runs_total", outcome=outcome, tenant=self.tenant)
+        summary = self.as_dict()
+        line = json.dumps(summary, default=str)
+        logging.info(f"run summary {line}")
+        if RUN_SUMMARY_PATH:
+            with open(RUN_SUMMARY_PATH, "a", encoding="utf-8") as summary_file:
+                summary_file.write(line + "\n")
+        return summary
+
+
+def start_metrics_server(port: int = None, registry: Registry = None):
+    """Serve GET /metrics on port (default METRICS_PORT, 0 = any free port) from a daemon thread.
+    Returns the server, server.server_address has the bound port
+    """
+    port = METRICS_PORT if port is None else port
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args): # scrapes every 15s would flood the logs
+            pass
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Serving metrics on :{server.server_address[1]}/metrics")
+    return server
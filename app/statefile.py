@@ -0,0 +1,38 @@
+"""Small JSON state files kept between runs: response watermarks, warehouse key indexes and
+backfill progress. Written to a temp file and renamed, so a crash never leaves a half written file.
+"""
+import os
+import json
+import logging
+
+
+def load_json(path: str, name: str, fallback: str):
+    """Return the object saved at path. None if missing or unreadable (logged with name and what
+    the caller does instead, ex) 'full read')
+    """
+    try:
+        with open(path, encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logging.warning(f"Unreadable {name} {path} - {fallback}", exc_info=True)
+        return None
+
+
+def save_json(path: str, data) -> str:
+    """Write data to path atomically, creating its directory. Returns path"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as state_file:
+        json.dump(data, state_file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def remove(path: str) -> None:
+    """Delete a state file, missing is fine"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,61 @@
+"""Tenant (admin/group) configuration.
+One process can serve many groups: each tenant has its own sheets, admin and alert number,
+while credentials, HTTP pools, caches and the Twilio rate limit are shared.
+"""
+import os
+import csv
+import json
+from dataclasses import MISSING, dataclass, fields
+
+TENANTS_FILE = os.getenv("TENANTS_FILE") # json list or csv of tenants. Unset = single tenant from env vars
+MAX_TENANT_WORKERS = int(os.getenv("MAX_TENANT_WORKERS", 4))
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    name: str
+    admin_name: str
+    master_sheet_id: str
+    dbwh_sheet: str
+    master_alert_num: str
+    script_stop_day: int = 5
+    twilio_num: str = None # defaults to TWILIO_NUM
+    queue_path: str = None # defaults to one queue file per tenant
+    group: str = None # group number shown in the Final Report title, blank if unset
+
+    def __post_init__(self):
+        object.__setattr__(self, 'script_stop_day', int(self.script_stop_day))
+
+    def validate(self) -> None:
+        """Raise ValueError if a required field is empty"""
+        if missing := [field.name for field in fields(self)
+                       if field.default is MISSING and not getattr(self, field.name)]:
+            raise ValueError(f"Tenant {self.name!r} is missing: {','.join(missing)}")
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Build tenant from a dict, unknown keys are ignored and empty values use the default"""
+        values = {}
+        for field in fields(cls):
+            value = data.get(field.name)
+            if value not in (None, ''):
+                values[field.name] = value
+            elif field.default is MISSING:
+                values[field.name] = None # reported by validate()
+        return cls(**values)
+
+
+def load_tenants(path: str) -> list:
+    """Return list of TenantConfig from a .json (list of objects) or .csv (header row) file"""
+    with open(path, encoding='utf-8', newline='') as tenants_file:
+        if path.endswith('.csv'):
+            rows = list(csv.DictReader(tenants_file))
+        else:
+            rows = json.load(tenants_file)
+
+    tenants = [TenantConfig.from_dict(row) for row in rows]
+    for tenant in tenants:
+        tenant.validate()
+    if len({tenant.name for tenant in tenants}) != len(tenants):
+        raise ValueError(f"Tenant names must be unique in {path}")
+    return tenants
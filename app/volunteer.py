@@ -1,50 +1,231 @@
-"""example file, not used for prod"""
-import pandas as pd
+"""In-memory volunteer model.
+VolunteerRegistry keeps roster attributes in arrays (one slot per volunteer) and every
+metric in one (volunteer x month x metric) float array, so per period reports, per
+volunteer summaries and totals are array slices instead of nested dicts.
+Volunteer is a small view onto one registry slot.
+"""
+from ContactIndex import is_blank, normalize_numbers
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+INITIAL_CAPACITY = 64 # arrays double when full
+
+
+class VolunteerRegistry:
+
+    def __init__(self, metric_names=()) -> None:
+        self.ids = [] # slot -> volunteer id
+        self.slots = {} # volunteer id -> slot
+        self.full_names, self.phone_numbers, self.delegation_rules = [], [], []
+        self.can_contact = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.is_active = np.zeros(INITIAL_CAPACITY, dtype=bool)
+
+        self.periods, self.period_index = [], {}
+        self.metric_names = list(metric_names)
+        self.metric_index = {name: i for i, name in enumerate(self.metric_names)}
+        # NaN = not reported
+        self.metrics = np.full((INITIAL_CAPACITY, 4, max(1, len(self.metric_names))), np.nan)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, volunteer_id) -> bool:
+        return volunteer_id in self.slots
+
+    def __getitem__(self, volunteer_id) -> "Volunteer":
+        return Volunteer.view(self, self.slots[volunteer_id])
+
+    def __iter__(self):
+        return (Volunteer.view(self, slot) for slot in range(len(self.ids)))
+
+    def _grow(self, volunteers=0, periods=0, metrics=0) -> None:
+        """Make room for at least this many volunteers/periods/metrics (doubling)"""
+        shape = self.metrics.shape
+        new_shape = tuple(
+            size if needed <= size else max(needed, size * 2)
+            for size, needed in zip(shape, (volunteers, periods, metrics)))
+        if new_shape != shape:
+            grown = np.full(new_shape, np.nan)
+            grown[:shape[0], :shape[1], :shape[2]] = self.metrics
+            self.metrics = grown
+        if new_shape[0] > len(self.can_contact):
+            self.can_contact = np.resize(self.can_contact, new_shape[0])
+            self.is_active = np.resize(self.is_active, new_shape[0])
+
+    def add(self, id, full_name: str, phone_number: str = None, can_contact: bool = True,
+            delegation_rules: dict = None, is_active: bool = True) -> "Volunteer":
+        """Add (or update) a volunteer, returns its Volunteer view"""
+        slot = self.slots.get(id)
+        if slot is None:
+            slot = len(self.ids)
+            self._grow(volunteers=slot + 1)
+            self.ids.append(id)
+            self.slots[id] = slot
+            self.full_names.append(None)
+            self.phone_numbers.append(None)
+            self.delegation_rules.append(None)
+        self.full_names[slot] = full_name
+        self.phone_numbers[slot] = phone_number
+        self.delegation_rules[slot] = delegation_rules or {}
+        self.can_contact[slot] = can_contact
+        self.is_active[slot] = is_active
+        return Volunteer.view(self, slot)
+
+    @classmethod
+    def from_roster(cls, volunteer_map_df, id_col="row_id", name_col="full_name", metric_names=(), country_code="+1"):
+        """Build registry from the volunteer map (pubs sheet, see main.add_full_name and SheetSchema.PUBS).
+        Cell is normalized like ContactIndex does, can_contact is permission_to_contact? == 'y' and
+        delegate_notification_to goes in delegation_rules. Missing optional columns keep the defaults
+        """
+        registry = cls(metric_names)
+
+        def column(name, default):
+            if name in volunteer_map_df:
+                return volunteer_map_df[name]
+            return pd.Series([default] * len(volunteer_map_df), index=volunteer_map_df.index, dtype=object)
+
+        active = column('Active?', '') != 'n'
+        phones = normalize_numbers(column('Cell', None), country_code)
+        permissions = column('permission_to_contact?', 'y').fillna('').astype(str).str.strip().str.lower()
+        delegates = column('delegate_notification_to', None)
+        for volunteer_id, name, phone, permission, delegate, is_active in zip(
+                volunteer_map_df[id_col], volunteer_map_df[name_col], phones, permissions, delegates, active):
+            registry.add(
+                volunteer_id, name, phone, can_contact=permission == 'y',
+                delegation_rules=None if is_blank(delegate) else {'delegate_notification_to': delegate},
+                is_active=bool(is_active))
+        return registry
+
+    def period_slot(self, period: str) -> int:
+        if period not in self.period_index:
+            self._grow(periods=len(self.periods) + 1)
+            self.period_index[period] = len(self.periods)
+            self.periods.append(period)
+        return self.period_index[period]
+
+    def metric_slot(self, metric: str) -> int:
+        if metric not in self.metric_index:
+            self._grow(metrics=len(self.metric_names) + 1)
+            self.metric_index[metric] = len(self.metric_names)
+            self.metric_names.append(metric)
+        return self.metric_index[metric]
+
+    def set_metrics(self, volunteer_id, period: str, values: dict) -> None:
+        """Set numeric metrics of one volunteer for one period, ex) {'Horas': 10}"""
+        slot, period_slot = self.slots[volunteer_id], self.period_slot(period)
+        for metric, value in values.items():
+            self.metrics[slot, period_slot, self.metric_slot(metric)] = np.nan if value is None else value
+
+    def add_reports(self, period: str, reports_df, id_col="row_id", metric_cols=None) -> None:
+        """Vectorized: set metric_cols (default: every numeric column) of every row for period.
+        Rows whose id is not in the registry are ignored
+        """
+        metric_cols = metric_cols or [
+            col for col in reports_df.columns if col != id_col and pd.api.types.is_numeric_dtype(reports_df[col])]
+        period_slot = self.period_slot(period)
+        metric_slots = [self.metric_slot(metric) for metric in metric_cols]
+
+        slots = reports_df[id_col].map(self.slots)
+        known = slots.notna().to_numpy()
+        rows = slots[known].to_numpy(dtype=int)
+        values = reports_df.loc[known, metric_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        self.metrics[np.ix_(rows, [period_slot], metric_slots)] = values[:, None, :]
+
+    def remove_period(self, volunteer_id, period: str) -> None:
+        """Clear one volunteer's metrics for period. Raises KeyError if the period does not exist"""
+        self.metrics[self.slots[volunteer_id], self.period_index[period], :] = np.nan
+
+    def _used(self):
+        return self.metrics[:len(self.ids), :len(self.periods), :len(self.metric_names)]
+
+    def report(self, period: str):
+        """DataFrame (volunteers x metrics) for period, only volunteers that reported"""
+        values = self._used()[:, self.period_index[period], :]
+        reported = ~np.isnan(values).all(axis=1)
+        return pd.DataFrame(
+            values[reported], index=pd.Index(np.asarray(self.ids, dtype=object)[reported], name='id'),
+            columns=self.metric_names)
+
+    def summary(self, volunteer_id):
+        """DataFrame (periods x metrics) of one volunteer, periods sorted, unreported periods dropped"""
+        values = self._used()[self.slots[volunteer_id]]
+        order = np.argsort(self.periods, kind='stable')
+        df = pd.DataFrame(values[order], index=pd.Index(np.asarray(self.periods)[order], name='period'),
+                          columns=self.metric_names)
+        return df.dropna(how='all')
+
+    def totals(self, period: str = None):
+        """Sum of every metric across volunteers (DataFrame periods x metrics), or one period (Series)"""
+        sums = np.nansum(self._used(), axis=0)
+        totals = pd.DataFrame(sums, index=pd.Index(self.periods, name='period'), columns=self.metric_names)
+        return totals.loc[period] if period is not None else totals.sort_index()
 
 
 class Volunteer:
+    """View onto a VolunteerRegistry slot. Creating one directly registers it in `registry`
+    (a private registry by default)
+    """
+    __slots__ = ('registry', 'slot')
 
     def __init__(
-            self, 
-            id: int, 
-            full_name: str, 
+            self,
+            id: int,
+            full_name: str,
             phone_number: str,
             can_contact: bool,
             delegation_rules: dict,
             is_active: bool = True,
-            metrics: dict[str: dict] = {}
+            metrics: dict = None, # {period: {metric: value}}
+            registry: VolunteerRegistry = None,
         ):
+        self.registry = registry if registry is not None else VolunteerRegistry()
+        self.slot = self.registry.add(
+            id, full_name, phone_number, can_contact, delegation_rules, is_active).slot
+        if metrics:
+            self.add_metrics(metrics)
 
-        self.id = id
-        self.full_name = full_name
-        self.phone_number = phone_number
-        self.can_contact = can_contact
-        self.delegation_rules = delegation_rules
-        self.is_active = is_active
+    @classmethod
+    def view(cls, registry: VolunteerRegistry, slot: int) -> "Volunteer":
+        volunteer = cls.__new__(cls)
+        volunteer.registry, volunteer.slot = registry, slot
+        return volunteer
 
-        self.metrics = metrics
+    id = property(lambda self: self.registry.ids[self.slot])
+    full_name = property(lambda self: self.registry.full_names[self.slot])
+    phone_number = property(lambda self: self.registry.phone_numbers[self.slot])
+    delegation_rules = property(lambda self: self.registry.delegation_rules[self.slot])
+    can_contact = property(lambda self: bool(self.registry.can_contact[self.slot]))
+    is_active = property(lambda self: bool(self.registry.is_active[self.slot]))
+
+    @property
+    def metrics(self) -> dict:
+        """{period: {metric: value}} of reported periods (built on demand)"""
+        return {period: row.dropna().to_dict() for period, row in self.registry.summary(self.id).iterrows()}
 
     def __str__(self) -> str:
         return f"{self.id}: {self.full_name}"
 
-    def add_metrics(self, report_data: dict[str: list]):
-        """Add metrics per month & year. Will overwrite data if exists"""
-        self.metrics.update(report_data)
-    
+    def add_metrics(self, report_data: dict):
+        """Add metrics per month & year: {period: {metric: value}}. Will overwrite data if exists"""
+        for period, values in report_data.items():
+            self.registry.set_metrics(self.id, period, values)
+
     def remove_metrics(self, report_year_month: str):
         """Remove report month. Raises KeyError if it does not exist"""
         result = self.metrics.pop(report_year_month)
+        self.registry.remove_period(self.id, report_year_month)
         return f"Removed {result}"
-    
+
     def get_report_summary(self):
         return {
             self.id: {self.full_name: self.metrics}
         }
-    
+
     def get_report_by_period(self, reporting_period: str):
         return {
             self.id: {
                 self.full_name: self.metrics[reporting_period]
             }
         }
-
@@ -0,0 +1,146 @@
+"""End-to-end benchmark of run() against the in-memory Sheets/Drive/Twilio fakes (tests/fakes.py).
+
+    python benchmarks/end_to_end.py                                  # 1k volunteers, 10k row warehouse, 2 runs
+    python benchmarks/end_to_end.py --volunteers 5000 --sheets-latency 0.3
+    python benchmarks/end_to_end.py --delivery queue                 # enqueue, then drain like the worker
+
+Reports, per run, the API calls made per endpoint and where the wall clock time went.
+The second run reuses the sheets cache and warehouse key index of the first one, like the
+next day's run would. Stages can nest (ex. get_worksheet_data inside update_datawarehouse).
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import functools
+import contextlib
+from collections import Counter
+from unittest import mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "app")]
+
+import main # noqa: E402
+from WritePlanner import WritePlanner # noqa: E402
+from tenants import TenantConfig # noqa: E402
+from synthetic import Synthetic # noqa: E402
+from tests.fakes import FakeDrive, FakeGoogle, FakeSheets, FakeTwilio, offline_run # noqa: E402
+
+REPORT_MONTH = "2023-10"
+# (object, attribute) timed as a stage
+STAGES = [
+    (main, "batch_get_worksheet_data"),
+    (main, "get_worksheet_data"),
+    (main, "add_full_name"),
+    (main, "clean_informes_data"),
+    (main, "generate_alert_list"),
+    (main, "update_datawarehouse"),
+    (WritePlanner, "flush"),
+    (main, "send_twilio_message"),
+    (main.OutboundQueue, "enqueue"),
+    (main, "drain_outbound_queue"),
+]
+
+
+def sheet_values(df) -> list:
+    return [df.columns.to_list()] + df.astype(str).to_numpy().tolist()
+
+
+def build_world(args) -> tuple:
+    synth = Synthetic(args.seed)
+    roster = synth.roster(args.volunteers)
+    report = synth.report(roster, reported_share=args.reported)
+    progress = [
+        ["year_month", "response_sheet_url", "form_url", "status"],
+        [REPORT_MONTH, "https://docs.google.com/spreadsheets/d/report-sheet/edit#gid=0", "https://forms.gle/x", ""],
+    ]
+    sheets = FakeSheets(
+        {
+            "master": {"progress": progress, "pubs": sheet_values(roster)},
+            "report-sheet": sheet_values(report),
+            "dbwh": synth.warehouse_values(args.warehouse_rows),
+        },
+        latency=args.sheets_latency, quota=args.quota, error_rate=args.error_rate, seed=args.seed)
+    drive = FakeDrive(sheets, latency=args.drive_latency)
+    return FakeGoogle(sheets, drive), FakeTwilio(latency=args.twilio_latency)
+
+
+@contextlib.contextmanager
+def timed_stages(seconds: Counter):
+    def timed(name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds[name] += time.perf_counter() - started
+        return wrapper
+
+    with contextlib.ExitStack() as stack:
+        for owner, name in STAGES:
+            stack.enter_context(mock.patch.object(owner, name, timed(name, getattr(owner, name))))
+        yield seconds
+
+
+def run_once(google, twilio, tenant, workdir, args) -> dict:
+    for api in (google.sheets, google.drive, twilio):
+        api.reset_counts()
+    sent_before = len(twilio.sent)
+    stages = Counter()
+
+    with offline_run(google, twilio, workdir, twilio_mps=args.twilio_mps, MESSAGE_DELIVERY=args.delivery), \
+            timed_stages(stages):
+        started = time.perf_counter()
+        main.run(tenant)
+        if args.delivery == "queue":
+            main.drain_outbound_queue(tenant=tenant)
+        total = time.perf_counter() - started
+
+    calls = {**google.call_counts(), **{f"twilio.{endpoint}": n for endpoint, n in sorted(twilio.calls.items())}}
+    return {"total": total, "stages": stages, "calls": calls, "sent": len(twilio.sent) - sent_before}
+
+
+def report(run_number, result) -> None:
+    print(f"\nrun {run_number}: {result['total']:.2f}s, {sum(result['calls'].values())} API calls, "
+          f"{result['sent']} messages sent")
+    for endpoint, calls in result["calls"].items():
+        print(f"  {endpoint:<28} {calls:>6} call(s)")
+    for stage, seconds in result["stages"].most_common():
+        print(f"  {stage:<28} {seconds * 1000:>9.1f} ms")
+
+
+def main_cli(argv=None) -> list:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volunteers", type=int, default=1_000)
+    parser.add_argument("--reported", type=float, default=0.8, help="share of volunteers that already reported")
+    parser.add_argument("--warehouse-rows", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--delivery", choices=["inline", "queue"], default="inline")
+    parser.add_argument("--sheets-latency", type=float, default=0.15, help="seconds per Sheets call")
+    parser.add_argument("--drive-latency", type=float, default=0.05, help="seconds per Drive metadata call")
+    parser.add_argument("--twilio-latency", type=float, default=0.1, help="seconds per message")
+    parser.add_argument("--twilio-mps", type=float, default=1_000, help="Twilio rate limit, messages per second")
+    parser.add_argument("--quota", type=int, help="Sheets calls allowed per minute")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Sheets calls failing with a 503")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    google, twilio = build_world(args)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        tenant = TenantConfig(
+            name="bench", admin_name="Bench Admin", master_sheet_id="master", dbwh_sheet="dbwh",
+            master_alert_num="5550000000", queue_path=os.path.join(workdir, "outbound.db"))
+        for run_number in range(1, args.runs + 1):
+            results.append(run_once(google, twilio, tenant, workdir, args))
+            report(run_number, results[-1])
+    return results
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL) # pipeline logging would bury the report
+    main_cli()
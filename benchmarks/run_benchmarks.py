@@ -0,0 +1,205 @@
+"""Offline micro-benchmarks of the pipeline's pure functions on synthetic data.
+
+    python benchmarks/run_benchmarks.py                      # 100 .. 100k rows, compare with baseline.csv
+    python benchmarks/run_benchmarks.py --stress             # also 1M rows
+    python benchmarks/run_benchmarks.py --save baseline.csv  # record a new baseline
+
+Each case is timed (best of --repeat, no tracing) and then run once more under
+tracemalloc for peak memory. Exits 1 if a case is slower than the baseline by more
+than --tolerance.
+"""
+import os
+import re
+import sys
+import csv
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from unittest import mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "app"))
+
+import main # noqa: E402
+from synthetic import Synthetic # noqa: E402
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000]
+STRESS_SIZES = [1_000_000]
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.csv")
+MIN_REGRESSION_SECONDS = 0.005 # differences below this are timer noise
+FIELDS = ["case", "rows", "seconds", "peak_mb"]
+
+
+ROW_WINDOW = re.compile(r"[A-Z]+(\d+):[A-Z]+(\d+)$")
+
+
+class StubSheets:
+    """Just enough of the Sheets service for the warehouse path: get() returns (rows of) the warehouse"""
+
+    def __init__(self, warehouse_values) -> None:
+        self.warehouse_values = warehouse_values
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, range, **kwargs):
+        values = self.warehouse_values
+        if window := ROW_WINDOW.search(range): # A2:J5001 style windows of iter_worksheet_chunks
+            values = values[int(window[1]) - 1:int(window[2])]
+        return mock.Mock(execute=lambda: {'values': values})
+
+    def append(self, body, **kwargs):
+        return mock.Mock(execute=lambda: {'updates': {'updatedRows': len(body['values'])}})
+
+
+def setup_clean(synth, n):
+    report = synth.report(synth.roster(n))
+    return lambda: main.clean_informes_data(report.copy())
+
+
+def setup_missing_reports(synth, n):
+    roster = synth.roster(n)
+    main.add_full_name(roster)
+    report = synth.report(roster)
+    main.clean_informes_data(report)
+    volunteers = roster['full_name'].to_list()
+    return lambda: main.get_missing_reports(report, volunteers)
+
+
+def setup_alert_list(synth, n):
+    roster = synth.roster(n)
+    main.add_full_name(roster)
+    missing = roster.sample(frac=0.2, random_state=synth.seed)
+    return lambda: main.generate_alert_list("https://forms.gle/x", missing, roster, fallback_number="5550000000")
+
+
+def setup_serialize(synth, n):
+    report = synth.report(synth.roster(n), reported_share=1.0)
+    return lambda: main.chunk_values(main.serialize_df(report), start_cell='A2')
+
+
+def setup_warehouse_dedup(synth, n):
+    service = StubSheets(synth.warehouse_values(n))
+    month_report = synth.report(synth.roster(max(1, n // 12)))
+    main.clean_informes_data(month_report)
+
+    def run():
+        # fresh index every time: measures reading + seeding + dedup of the whole warehouse
+        with tempfile.TemporaryDirectory() as index_dir, mock.patch.object(main, "DBWH_INDEX_DIR", index_dir):
+            main.update_datawarehouse(service, month_report, "2023-12", write_mode="append", dbwh_sheet="bench")
+    return run
+
+
+def setup_read_full(synth, n):
+    service = StubSheets(synth.warehouse_values(n))
+    return lambda: main.get_worksheet_data(service, "bench", "A:J")["Horas"].sum()
+
+
+def setup_read_streamed(synth, n):
+    service = StubSheets(synth.warehouse_values(n))
+    return lambda: sum(chunk["Horas"].sum() for chunk in main.iter_worksheet_chunks(service, "bench", "A:J"))
+
+
+def setup_validate(synth, n):
+    roster = synth.roster(n)
+    report = synth.report(roster, reported_share=1.0).astype(str) # raw sheet values are strings
+    return lambda: (main.PUBS.validate(roster), main.RESPONSE.validate(report))
+
+
+CASES = {
+    "clean_informes_data": setup_clean,
+    "get_missing_reports": setup_missing_reports,
+    "generate_alert_list": setup_alert_list,
+    "serialize_df+chunk_values": setup_serialize,
+    "update_datawarehouse(append)": setup_warehouse_dedup,
+    "read warehouse (full)": setup_read_full,
+    "read warehouse (streamed)": setup_read_streamed,
+    "schema validate (pubs+response)": setup_validate,
+}
+
+
+def measure(func, repeat: int) -> tuple:
+    """Return (best seconds, peak MB)"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024 / 1024
+
+
+def run_benchmarks(sizes, cases=None, repeat=3, seed=42) -> list:
+    synth = Synthetic(seed)
+    results = []
+    for case in cases or CASES:
+        for n in sizes:
+            seconds, peak_mb = measure(CASES[case](synth, n), repeat if n < 100_000 else 1)
+            results.append({"case": case, "rows": n, "seconds": round(seconds, 5), "peak_mb": round(peak_mb, 2)})
+            print(f"{case:<30} {n:>9,} rows {seconds * 1000:>10.1f} ms {peak_mb:>9.1f} MB", flush=True)
+    return results
+
+
+def load_results(path) -> dict:
+    with open(path, newline='') as results_file:
+        return {(row["case"], int(row["rows"])): row for row in csv.DictReader(results_file)}
+
+
+def save_results(results, path) -> None:
+    with open(path, "w", newline='') as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def regressions(results, baseline: dict, tolerance: float) -> list:
+    """Cases slower than baseline * (1 + tolerance)"""
+    slower = []
+    for result in results:
+        base = baseline.get((result["case"], result["rows"]))
+        if base is None:
+            continue
+        base_seconds = float(base["seconds"])
+        if (result["seconds"] > base_seconds * (1 + tolerance)
+                and result["seconds"] - base_seconds > MIN_REGRESSION_SECONDS):
+            slower.append(f"{result['case']} @ {result['rows']:,}: {result['seconds']:.4f}s vs {base_seconds:.4f}s")
+    return slower
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--stress", action="store_true", help="add 1,000,000 row runs")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 = +50%%")
+    parser.add_argument("--save", help="write results as CSV (ex. a new baseline)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL) # pipeline logging would dominate small cases
+    sizes = args.sizes + (STRESS_SIZES if args.stress else [])
+    results = run_benchmarks(sizes, args.cases, args.repeat, args.seed)
+
+    if args.save:
+        save_results(results, args.save)
+    if args.baseline and os.path.exists(args.baseline) and os.path.abspath(args.save or '') != os.path.abspath(args.baseline):
+        if slower := regressions(results, load_results(args.baseline), args.tolerance):
+            print("\nREGRESSIONS:\n  " + "\n  ".join(slower))
+            return 1
+        print("\nNo regressions against", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,91 @@
+"""Seeded synthetic rosters, monthly reports and warehouses, shaped like the real sheets.
+Names come from the `names` package data files (like tests/test_main.py), read once at import;
+a pool of first and last names is drawn by frequency and combined, so a million unique volunteers
+are cheap to build.
+"""
+import numpy as np
+import pandas as pd
+import names
+
+NAME_COL = "¿Cual es su nombre?"
+CATEGORIES = ["Regular (Precursor de Tiempo Completo)", "Auxiliar", "No"]
+POOL_SIZE = 2_000 # first x last names = 4M unique full names
+
+
+def load_names(*paths) -> tuple:
+    """Return (capitalized names, frequency share) from `names` data files ('NAME freq cumulative rank' lines)"""
+    frequencies = {}
+    for path in paths:
+        with open(path) as name_file:
+            for line in name_file:
+                name, frequency, _, _ = line.split()
+                frequencies[name.capitalize()] = frequencies.get(name.capitalize(), 0) + float(frequency)
+    weights = np.array(list(frequencies.values()))
+    return np.array(list(frequencies)), weights / weights.sum()
+
+
+# the names package re-reads its files on every get_*_name() call, so the pools are loaded once here
+FIRST_NAMES = load_names(names.FILES['first:male'], names.FILES['first:female'])
+LAST_NAMES = load_names(names.FILES['last'])
+
+
+class Synthetic:
+
+    def __init__(self, seed: int = 42) -> None:
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.first_names = self.pool(*FIRST_NAMES)
+        self.last_names = self.pool(*LAST_NAMES)
+
+    def pool(self, all_names, weights):
+        """POOL_SIZE distinct names, common ones more likely (like names.get_*_name)"""
+        return np.sort(self.rng.choice(all_names, size=min(POOL_SIZE, len(all_names)), replace=False, p=weights))
+
+    def full_names(self, n: int) -> tuple:
+        """Return (first, last) arrays of n unique name pairs"""
+        pairs = self.rng.choice(len(self.first_names) * len(self.last_names), size=n, replace=False)
+        return self.first_names[pairs // len(self.last_names)], self.last_names[pairs % len(self.last_names)]
+
+    def roster(self, n: int) -> pd.DataFrame:
+        """Volunteer map (pubs sheet): ~80% contact themselves, the rest delegate to a parent"""
+        first, last = self.full_names(n)
+        row_ids = np.arange(1, n + 1).astype(str)
+        numbers = np.char.add("(555) ", self.rng.integers(1_000_000, 9_999_999, n).astype(str))
+        delegates = np.where(self.rng.random(n) < 0.2, self.rng.integers(1, n + 1, n).astype(str), "")
+        delegates[delegates == row_ids] = "" # nobody delegates to themselves
+        return pd.DataFrame({
+            "row_id": row_ids,
+            "First_Name": first,
+            "Last_Name": last,
+            "Cell": numbers,
+            "permission_to_contact?": np.where(delegates == "", "y", "n"),
+            "delegate_notification_to": delegates,
+            "Active?": np.where(self.rng.random(n) < 0.05, "n", "y"),
+        })
+
+    def report(self, roster: pd.DataFrame, reported_share: float = 0.8) -> pd.DataFrame:
+        """Monthly responses for part of the roster, with messy spelling like real form input"""
+        sample = roster.sample(frac=reported_share, random_state=self.seed)
+        full_names = (sample["First_Name"] + "  " + sample["Last_Name"]).to_numpy(dtype=object)
+        messy = self.rng.random(len(full_names))
+        full_names[messy < 0.3] = [f" {name.lower()} " for name in full_names[messy < 0.3]]
+        full_names[messy > 0.9] = [name.upper() for name in full_names[messy > 0.9]]
+        n = len(sample)
+        return pd.DataFrame({
+            "Timestamp": "10/1/2023 10:00:00",
+            NAME_COL: full_names,
+            "¿Es Precursor?": self.rng.choice(CATEGORIES, n, p=[0.1, 0.15, 0.75]),
+            "Horas": self.rng.integers(0, 100, n),
+            "Cursos bíblicos": self.rng.integers(0, 5, n),
+            "Comentarios": np.where(self.rng.random(n) < 0.1, "Some random note", ""),
+        }).reset_index(drop=True)
+
+    def warehouse_values(self, n: int, months: int = 12) -> list:
+        """Raw Sheets values (header + rows) of a warehouse with n rows over `months` months"""
+        first, last = self.full_names(max(1, n // months))
+        volunteers = np.char.add(np.char.add(first.astype(str), " "), last.astype(str))
+        year_months = [f"{2022 + month // 12}-{month % 12 + 1:02d}" for month in range(months)]
+        rows = [["Year-Month", NAME_COL, "Horas"]]
+        for i in range(n):
+            rows.append([year_months[i // len(volunteers) % months], volunteers[i % len(volunteers)], str(i % 100)])
+        return rows
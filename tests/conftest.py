@@ -0,0 +1,6 @@
+import os
+import sys
+
+# app modules import each other by file name (the Docker image runs from inside app/),
+# so app/ must be on the path for `from app.main import ...` to work under pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
@@ -0,0 +1,373 @@
+"""In-memory stand-ins for the Google Sheets/Drive services and the Twilio client.
+Spreadsheets live in dicts, every API call is counted per endpoint and can be slowed
+down (latency), rate limited (quota) or made to fail, so run() can be exercised and
+benchmarked offline. Used by tests/test_end_to_end.py and benchmarks/end_to_end.py.
+"""
+import re
+import time
+import random
+import threading
+import contextlib
+from collections import Counter, deque
+from types import SimpleNamespace
+from unittest import mock
+
+RANGE = re.compile(r"^(?:(?P<tab>.+)!)?(?P<start>[A-Z]*\d*)(?::(?P<end>[A-Z]*\d*))?$")
+QUOTA_WINDOW_SECONDS = 60 # Google quotas are per minute
+
+
+def column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def parse_range(a1_range: str) -> tuple:
+    """Return (tab, first row, first column, last row, last column) of an A1 range, zero based.
+    Open ends are None, ex) 'pubs!A2:C' -> ('pubs', 1, 0, None, 2)
+    """
+    match = RANGE.match(a1_range.replace("'", ""))
+    if not match:
+        raise ValueError(f"Not an A1 range: {a1_range}")
+    start = re.match(r"([A-Z]*)(\d*)", match['start']).groups()
+    end = re.match(r"([A-Z]*)(\d*)", match['end']).groups() if match['end'] is not None else start
+    return (
+        match['tab'],
+        int(start[1]) - 1 if start[1] else 0,
+        column_index(start[0]) if start[0] else 0,
+        int(end[1]) - 1 if end[1] else None,
+        column_index(end[0]) if end[0] else None,
+    )
+
+
+def trim(rows: list) -> list:
+    """Drop trailing empty cells and rows, like the Sheets API does"""
+    rows = [list(row) for row in rows]
+    for row in rows:
+        while row and row[-1] in ('', None):
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def cell_value(cell: dict) -> str:
+    """CellData (see WritePlanner.cell_data) -> the string the Sheets API would return"""
+    value = cell.get('userEnteredValue', {})
+    if 'numberValue' in value:
+        number = value['numberValue']
+        return str(int(number)) if float(number).is_integer() else str(number)
+    if 'boolValue' in value:
+        return str(value['boolValue']).upper()
+    return value.get('formulaValue', value.get('stringValue', ''))
+
+
+class FakeRequest:
+    """What the googleapiclient methods return: nothing happens until execute()"""
+
+    def __init__(self, api, endpoint, func) -> None:
+        self.api, self.endpoint, self.func = api, endpoint, func
+
+    def execute(self):
+        return self.api.call(self.endpoint, self.func)
+
+
+class FakeApi:
+    """Counting, latency, quota and failure injection shared by every fake.
+
+    Args:
+        latency float|dict: seconds added to every call, or {endpoint: seconds}
+        quota int: max calls per QUOTA_WINDOW_SECONDS, further calls fail with 429
+        error_rate float: share of calls failing with a 503, drawn from random.Random(seed)
+    """
+
+    def __init__(self, latency=0.0, quota=None, error_rate=0.0, seed=0, clock=time.monotonic, sleep=time.sleep) -> None:
+        self.latency = latency
+        self.quota = quota
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.clock, self.sleep = clock, sleep
+        self.calls = Counter() # endpoint -> calls, including failed ones
+        self.errors = Counter() # endpoint -> failed calls
+        self.seconds = Counter() # endpoint -> time spent in calls
+        self.failures = {} # endpoint -> deque of statuses to fail with, see fail_next
+        self.recent = deque() # call times inside the quota window
+        self.lock = threading.Lock()
+
+    def fail_next(self, endpoint: str, status: int = 500, times: int = 1) -> None:
+        """Make the next `times` calls to endpoint fail with status"""
+        self.failures.setdefault(endpoint, deque()).extend([status] * times)
+
+    def error(self, endpoint: str, status: int) -> Exception:
+        raise NotImplementedError
+
+    def call(self, endpoint: str, func):
+        started = time.perf_counter()
+        with self.lock:
+            self.calls[endpoint] += 1
+            status = self._injected_status(endpoint)
+        delay = self.latency.get(endpoint, 0.0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            self.sleep(delay)
+        try:
+            if status:
+                with self.lock:
+                    self.errors[endpoint] += 1
+                raise self.error(endpoint, status)
+            with self.lock: # one call at a time, like a server applying requests in order
+                return func()
+        finally:
+            with self.lock:
+                self.seconds[endpoint] += time.perf_counter() - started
+
+    def _injected_status(self, endpoint):
+        if self.failures.get(endpoint):
+            return self.failures[endpoint].popleft()
+        if self.quota is not None:
+            now = self.clock()
+            while self.recent and now - self.recent[0] >= QUOTA_WINDOW_SECONDS:
+                self.recent.popleft()
+            if len(self.recent) >= self.quota:
+                return 429
+            self.recent.append(now)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 503
+        return None
+
+    def reset_counts(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.seconds.clear()
+
+
+class FakeSheets(FakeApi):
+    """sheets v4 service. spreadsheets: {spreadsheet id: {tab title: rows}}, the first tab has gid 0"""
+
+    def __init__(self, spreadsheets=None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.tabs = {} # spreadsheet id -> [[title, rows, gid]], gids of the initial tabs are their position
+        self.revisions = Counter() # spreadsheet id -> number of writes, read by FakeDrive
+        for sheet_id, tabs in (spreadsheets or {}).items():
+            self.add_spreadsheet(sheet_id, tabs)
+
+    def add_spreadsheet(self, sheet_id: str, tabs) -> None:
+        """tabs: {title: rows} or just the rows of a single 'Sheet1' tab"""
+        tabs = tabs if isinstance(tabs, dict) else {'Sheet1': tabs}
+        self.tabs[sheet_id] = [
+            [title, [[str(value) for value in row] for row in rows], gid] for gid, (title, rows) in enumerate(tabs.items())]
+
+    def rows(self, sheet_id: str, tab=None) -> list:
+        """Current rows of a tab (title, gid or None for the first one), as the API would return them"""
+        return trim(self._tab(sheet_id, tab))
+
+    def _tab(self, sheet_id, tab=None) -> list:
+        if sheet_id not in self.tabs:
+            raise self.error('get', 404)
+        for title, rows, gid in self.tabs[sheet_id]:
+            if tab is None or tab == title or str(tab) == str(gid):
+                return rows
+        raise self.error('get', 400)
+
+    def error(self, endpoint, status):
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        return HttpError(httplib2.Response({'status': status}), f'{{"error": "fake {endpoint}"}}'.encode())
+
+    # googleapiclient style resource chain: service.spreadsheets().values().get(...)
+    def spreadsheets(self):
+        return SimpleNamespace(values=lambda: self._values_resource(), batchUpdate=self._batch_update)
+
+    def _values_resource(self):
+        return SimpleNamespace(
+            get=self._get, batchGet=self._batch_get, update=self._update, append=self._append,
+            batchUpdate=self._values_batch_update)
+
+    def _read(self, sheet_id, a1_range) -> list:
+        tab, row, column, last_row, last_column = parse_range(a1_range)
+        rows = self._tab(sheet_id, tab)
+        stop = None if last_row is None else last_row + 1
+        column_stop = None if last_column is None else last_column + 1
+        return trim(row_values[column:column_stop] for row_values in rows[row:stop])
+
+    def _write(self, sheet_id, rows, row, column, values) -> int:
+        for offset, row_values in enumerate(values):
+            while len(rows) <= row + offset:
+                rows.append([])
+            target = rows[row + offset]
+            target.extend([''] * (column + len(row_values) - len(target)))
+            target[column:column + len(row_values)] = ['' if value is None else str(value) for value in row_values]
+        self.revisions[sheet_id] += 1
+        return len(values)
+
+    def _get(self, spreadsheetId, range, **kwargs):
+        return FakeRequest(self, 'values.get', lambda: self._value_range(spreadsheetId, range))
+
+    def _value_range(self, sheet_id, a1_range) -> dict:
+        values = self._read(sheet_id, a1_range)
+        return {'range': a1_range, 'majorDimension': 'ROWS', **({'values': values} if values else {})}
+
+    def _batch_get(self, spreadsheetId, ranges, **kwargs):
+        return FakeRequest(self, 'values.batchGet', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self._value_range(spreadsheetId, a1_range) for a1_range in ranges]})
+
+    def _update_range(self, sheet_id, a1_range, values) -> dict:
+        tab, row, column, _, _ = parse_range(a1_range)
+        updated = self._write(sheet_id, self._tab(sheet_id, tab), row, column, values)
+        return {'updatedRange': a1_range, 'updatedRows': updated}
+
+    def _update(self, spreadsheetId, range, body, **kwargs):
+        return FakeRequest(self, 'values.update', lambda: {
+            'spreadsheetId': spreadsheetId, **self._update_range(spreadsheetId, range, body['values'])})
+
+    def _values_batch_update(self, spreadsheetId, body, **kwargs):
+        def run():
+            responses = [self._update_range(spreadsheetId, data['range'], data['values']) for data in body['data']]
+            return {'spreadsheetId': spreadsheetId, 'responses': responses,
+                    'totalUpdatedRows': sum(response['updatedRows'] for response in responses)}
+        return FakeRequest(self, 'values.batchUpdate', run)
+
+    def _append(self, spreadsheetId, range, body, **kwargs):
+        def run():
+            tab, _, column, _, _ = parse_range(range)
+            rows = self._tab(spreadsheetId, tab)
+            updated = self._write(spreadsheetId, rows, len(trim(rows)), column, body['values'])
+            return {'spreadsheetId': spreadsheetId, 'updates': {'updatedRows': updated}}
+        return FakeRequest(self, 'values.append', run)
+
+    def _batch_update(self, spreadsheetId, body, **kwargs):
+        def run():
+            replies = []
+            for request in body['requests']:
+                (kind, params), = request.items()
+                if kind in ('addSheet', 'deleteSheet', 'copyPaste'):
+                    replies.append(self._tab_request(spreadsheetId, kind, params))
+                    continue
+                grid = params.get('start') or params.get('range') or params # where each kind keeps sheetId
+                rows = self._tab(spreadsheetId, grid.get('sheetId', 0))
+                values = [[cell_value(cell) for cell in row.get('values', [])] for row in params.get('rows', [])]
+                if kind == 'updateCells' and 'range' in params: # no rows = clear the range
+                    del rows[params['range'].get('startRowIndex', 0):]
+                    self.revisions[spreadsheetId] += 1
+                elif kind == 'updateCells':
+                    self._write(spreadsheetId, rows, params['start']['rowIndex'], params['start']['columnIndex'], values)
+                elif kind == 'appendCells':
+                    self._write(spreadsheetId, rows, len(trim(rows)), 0, values)
+                elif kind == 'sortRange':
+                    self._sort(rows, params)
+                    self.revisions[spreadsheetId] += 1
+                else:
+                    raise self.error('batchUpdate', 400)
+                replies.append({})
+            return {'spreadsheetId': spreadsheetId, 'replies': replies}
+        return FakeRequest(self, 'batchUpdate', run)
+
+    def _tab_request(self, sheet_id, kind, params) -> dict:
+        """addSheet, deleteSheet and copyPaste (values of a bounded source range to one cell)"""
+        tabs = self.tabs[sheet_id]
+        if kind == 'addSheet':
+            properties = params['properties']
+            tabs.append([properties['title'], [], properties['sheetId']])
+            return {'addSheet': {'properties': properties}}
+        if kind == 'deleteSheet':
+            self._tab(sheet_id, params['sheetId'])
+            tabs[:] = [tab for tab in tabs if str(tab[2]) != str(params['sheetId'])]
+            return {}
+        source, destination = params['source'], params['destination']
+        values = [row[source['startColumnIndex']:source['endColumnIndex']]
+                  for row in self._tab(sheet_id, source['sheetId'])[source['startRowIndex']:source['endRowIndex']]]
+        self._write(sheet_id, self._tab(sheet_id, destination['sheetId']), destination['startRowIndex'],
+                    destination['startColumnIndex'], values)
+        return {}
+
+    @staticmethod
+    def _sort(rows, params) -> None:
+        start = params['range'].get('startRowIndex', 0)
+        for spec in reversed(params['sortSpecs']): # stable sorts, last key first
+            index = spec['dimensionIndex']
+            rows[start:] = sorted(
+                rows[start:], key=lambda row: row[index] if index < len(row) else '',
+                reverse=spec.get('sortOrder') == 'DESCENDING')
+
+
+class FakeDrive(FakeApi):
+    """drive v3 files().get() metadata. version changes whenever the FakeSheets spreadsheet is written"""
+
+    def __init__(self, sheets: FakeSheets, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.sheets = sheets
+
+    def error(self, endpoint, status):
+        return self.sheets.error(endpoint, status)
+
+    def files(self):
+        return SimpleNamespace(get=lambda fileId, **kwargs: FakeRequest(
+            self, 'files.get', lambda: {'version': str(self.sheets.revisions[fileId] + 1)}))
+
+
+class FakeGoogle:
+    """Stands in for GoogleClient.GoogleServiceClient: same services on every thread, no credentials"""
+
+    def __init__(self, sheets: FakeSheets, drive: FakeDrive = None) -> None:
+        self.sheets = sheets
+        self.drive = drive or FakeDrive(sheets)
+
+    def credentials(self):
+        return SimpleNamespace(expired=False, token='fake')
+
+    def service(self, api='sheets', version='v4'):
+        return {'sheets': self.sheets, 'drive': self.drive}[api]
+
+    def call_counts(self) -> dict:
+        """{'sheets.values.get': n, 'drive.files.get': n, ...}"""
+        return {f"{name}.{endpoint}": calls
+                for name, api in (('sheets', self.sheets), ('drive', self.drive))
+                for endpoint, calls in sorted(api.calls.items())}
+
+
+class FakeTwilio(FakeApi):
+    """twilio.rest.Client with messages.create(). Sent messages are kept in `sent`"""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.sent = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    def error(self, endpoint, status):
+        from twilio.base.exceptions import TwilioRestException
+
+        return TwilioRestException(status, '/Messages.json', msg=f"fake {endpoint} error")
+
+    def _create(self, body, from_, to, **kwargs):
+        def send():
+            self.sent.append({'body': body, 'from_': from_, 'to': to})
+            return SimpleNamespace(sid=f"SM{len(self.sent):032d}", status='queued')
+        return self.call('messages.create', send)
+
+
+@contextlib.contextmanager
+def offline_run(google: FakeGoogle, twilio: FakeTwilio, workdir: str, twilio_mps: float = 1000, **settings):
+    """Patch main so run() only talks to the fakes and only writes under workdir.
+    settings override main globals, ex) MESSAGE_DELIVERY='inline'
+    """
+    import os
+    import main
+    import TwilioSender
+    from RateLimiter import TokenBucket
+    from SheetsCache import SheetsCache
+
+    settings = {
+        'APP_LEVEL': 'dev', 'DBWH_BACKEND': 'sheets', 'DBWH_WRITE_MODE': 'append', 'REPORT_ARCHIVE_DIR': '',
+        'DBWH_INDEX_DIR': workdir, 'RESPONSE_WATERMARK_DIR': workdir, 'FINAL_REPORT_DIR': os.path.join(workdir, 'final_reports'),
+        'SHEETS_CACHE': SheetsCache(os.path.join(workdir, 'sheets_cache'), drive_service_factory=lambda: google.drive),
+        **settings}
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(main, 'get_google_client', lambda: google))
+        stack.enter_context(mock.patch.object(TwilioSender, '_client', twilio))
+        stack.enter_context(mock.patch.object(TwilioSender, '_limiter', TokenBucket(twilio_mps)))
+        for name, value in settings.items():
+            stack.enter_context(mock.patch.object(main, name, value))
+        yield main
@@ -0,0 +1,161 @@
+import json
+
+import pandas as pd
+import pytest
+
+import backfill
+from tenants import TenantConfig
+from tests.fakes import FakeGoogle, FakeSheets, FakeTwilio, offline_run
+
+TENANT = TenantConfig(
+    name='test', admin_name='Admin Name', master_sheet_id='master', dbwh_sheet='dbwh', master_alert_num='5550000000')
+NAME_COL = '¿Cual es su nombre?'
+HEADER = ['Year-Month', NAME_COL, 'Horas']
+
+
+def history(months=('2023-08', '2023-09', '2023-10'), **sheets_kwargs):
+    progress = [['year_month', 'response_sheet_url', 'form_url', 'status']]
+    sheets = {}
+    for number, month in enumerate(months):
+        progress.append([month, f'https://docs.google.com/spreadsheets/d/report{number}/edit#gid=0', 'x', 'completed'])
+        sheets[f'report{number}'] = [['Timestamp', NAME_COL, 'Horas'],
+                                     ['1/1/2023', ' jose  perez ', str(number + 1)],
+                                     ['1/2/2023', 'ANA LOPEZ', '1.5'],
+                                     ['1/3/2023', 'jose perez', '9']] # 2nd submission, daily runs kept the 1st
+    sheets['master'] = progress
+    sheets['dbwh'] = [HEADER, ['2023-08', 'Jose Perez', '1'], ['2023-07', 'Luis Diaz', '3']]
+    return FakeGoogle(FakeSheets(sheets, **sheets_kwargs))
+
+
+def run_backfill(google, tmp_path, **kwargs):
+    with offline_run(google, FakeTwilio(), str(tmp_path)):
+        return backfill.backfill(TENANT, state_dir=str(tmp_path / 'state'), reads_per_minute=60_000,
+                                 sleep=lambda seconds: None, **kwargs)
+
+
+def test_reconcile_appends_missing_rows_in_one_write(tmp_path):
+    google = history()
+    result = run_backfill(google, tmp_path)
+
+    assert result == {'months': 3, 'rows': 6, 'written': 5}
+    rows = google.sheets.rows('dbwh')
+    assert rows[:3] == [HEADER, ['2023-08', 'Jose Perez', '1'], ['2023-07', 'Luis Diaz', '3']] # untouched
+    assert sorted(rows[3:]) == [['2023-08', 'Ana Lopez', '1.5'], ['2023-09', 'Ana Lopez', '1.5'],
+                                ['2023-09', 'Jose Perez', '2'], ['2023-10', 'Ana Lopez', '1.5'],
+                                ['2023-10', 'Jose Perez', '3']]
+    assert google.sheets.calls['batchUpdate'] == 1
+    assert google.sheets.calls['values.get'] == 5 # progress, 3 months, warehouse
+    assert not (tmp_path / 'state').exists() or not list((tmp_path / 'state').iterdir())
+
+    # nothing left to reconcile, and the key index knows every row
+    assert run_backfill(google, tmp_path)['written'] == 0
+    index = json.loads((tmp_path / 'dbwh_key_index_dbwh.json').read_text())
+    assert len(index['keys']) == 7
+
+
+def test_rebuild_replaces_warehouse(tmp_path):
+    google = history()
+    result = run_backfill(google, tmp_path, mode='rebuild')
+
+    assert result['written'] == 6
+    rows = google.sheets.rows('dbwh')
+    assert rows[0] == HEADER and len(rows) == 7 # Luis' stale 2023-07 row is gone
+    assert ['2023-10', 'Jose Perez', '3'] in rows
+    with pytest.raises(ValueError, match="whole warehouse"):
+        run_backfill(google, tmp_path, mode='rebuild', months=['2023-10'])
+
+
+def test_failed_month_stops_backfill_and_resumes(tmp_path):
+    google = history()
+    del google.sheets.tabs['report1'] # 404, not retried
+    with pytest.raises(RuntimeError, match="1 month\\(s\\) failed: 2023-09"):
+        run_backfill(google, tmp_path)
+    assert google.sheets.calls['batchUpdate'] == 0
+    state = json.loads((tmp_path / 'state' / 'backfill_dbwh.json').read_text())
+    assert sorted(state['months']) == ['2023-08', '2023-10']
+
+    google.sheets.add_spreadsheet('report1', [['Timestamp', NAME_COL, 'Horas'], ['1/1/2023', 'Luis Diaz', '4']])
+    google.sheets.reset_counts()
+    assert run_backfill(google, tmp_path)['written'] == 4 # Luis' 2023-09 and the months fetched before
+    assert google.sheets.calls['values.get'] == 2 # the missing month and the warehouse, progress is cached
+
+
+def test_quota_errors_are_retried(tmp_path):
+    google = history(months=('2023-10',))
+    google.sheets.fail_next('values.get', status=429, times=2)
+    assert run_backfill(google, tmp_path, workers=2)['written'] == 2
+    assert google.sheets.errors['values.get'] == 2
+
+
+def test_rebuild_too_big_for_one_request_is_staged(tmp_path):
+    google = history()
+    with offline_run(google, FakeTwilio(), str(tmp_path), SHEETS_MAX_CELLS_PER_REQUEST=6):
+        result = backfill.backfill(TENANT, mode='rebuild', state_dir=str(tmp_path / 'state'), reads_per_minute=60_000,
+                                   sleep=lambda seconds: None)
+
+    assert result['written'] == 6 and google.sheets.calls['batchUpdate'] == 4 # 21 cells, 6 per request
+    rows = google.sheets.rows('dbwh')
+    assert rows[0] == HEADER and len(rows) == 7 and ['2023-10', 'Jose Perez', '3'] in rows
+    assert [tab[0] for tab in google.sheets.tabs['dbwh']] == ['Sheet1'] # staging tab swapped in and deleted
+
+
+def test_failed_staged_rebuild_leaves_warehouse_untouched(tmp_path):
+    google = history()
+    before = google.sheets.rows('dbwh')
+    batch_update, bodies = google.sheets._batch_update, []
+
+    def fail_second(spreadsheetId, body, **kwargs):
+        bodies.append(body)
+        if len(bodies) == 2:
+            raise google.sheets.error('batchUpdate', 500)
+        return batch_update(spreadsheetId, body, **kwargs)
+    google.sheets._batch_update = fail_second
+
+    with offline_run(google, FakeTwilio(), str(tmp_path), SHEETS_MAX_CELLS_PER_REQUEST=6), pytest.raises(Exception):
+        backfill.backfill(TENANT, mode='rebuild', state_dir=str(tmp_path / 'state'), reads_per_minute=60_000,
+                          sleep=lambda seconds: None)
+    assert google.sheets.rows('dbwh') == before
+    assert [tab[0] for tab in google.sheets.tabs['dbwh']] == ['Sheet1'] # staging tab dropped
+    assert bodies[-1] == {'requests': [{'deleteSheet': {'sheetId': bodies[0]['requests'][0]['addSheet']['properties']['sheetId']}}]}
+
+
+def with_roster(google):
+    progress = google.sheets.rows('master')
+    google.sheets.add_spreadsheet('master', {'progress': progress, 'pubs': [
+        ['row_id', 'First_Name', 'Last_Name', 'Cell', 'permission_to_contact?', 'delegate_notification_to', 'Active?'],
+        ['1', 'Jose', 'Perez', '', 'y', '', 'y'],
+        ['2', 'Ana', 'Lopez', '', 'y', '', 'y'],
+    ]})
+    return google
+
+
+@pytest.mark.parametrize("mode", ['reconcile', 'rebuild'])
+def test_sql_warehouse_is_backfilled(tmp_path, mode):
+    google = with_roster(history())
+    settings = dict(DBWH_BACKEND='sqlite', DBWH_DB_PATH=str(tmp_path / 'warehouse.db'), DBWH_EXPORT_SHEET=False)
+    with offline_run(google, FakeTwilio(), str(tmp_path), **settings) as main:
+        engine = main.warehouse_engine(TENANT)
+        engine.insert_reports(pd.DataFrame({'Year-Month': ['2023-07'], NAME_COL: ['Luis Diaz'], 'Horas': [3]}))
+        result = backfill.backfill(TENANT, mode=mode, state_dir=str(tmp_path / 'state'), reads_per_minute=60_000,
+                                   sleep=lambda seconds: None)
+        stored = engine.history('1')
+
+    assert result == {'months': 3, 'rows': 6, 'written': 0, 'stored': 6}
+    assert google.sheets.calls['batchUpdate'] == 0 # no sheet export
+    assert stored[['year_month', 'hours']].values.tolist() == [['2023-08', 1.0], ['2023-09', 2.0], ['2023-10', 3.0]]
+    assert len(engine.month('2023-07')) == (1 if mode == 'reconcile' else 0) # a rebuild drops what isn't in the sheets
+
+
+@pytest.mark.parametrize("mode", ['reconcile', 'rebuild'])
+def test_failed_sheet_export_leaves_sql_warehouse_untouched(tmp_path, mode):
+    google = with_roster(history())
+    google.sheets.fail_next('batchUpdate', status=400)
+    settings = dict(DBWH_BACKEND='sqlite', DBWH_DB_PATH=str(tmp_path / 'warehouse.db'), DBWH_EXPORT_SHEET=True)
+    with offline_run(google, FakeTwilio(), str(tmp_path), **settings) as main:
+        engine = main.warehouse_engine(TENANT)
+        engine.insert_reports(pd.DataFrame({'Year-Month': ['2023-07'], NAME_COL: ['Luis Diaz'], 'Horas': [3]}))
+        with pytest.raises(Exception):
+            backfill.backfill(TENANT, mode=mode, state_dir=str(tmp_path / 'state'), reads_per_minute=60_000,
+                              sleep=lambda seconds: None)
+        assert engine.history('1').empty
+        assert len(engine.month('2023-07')) == 1
@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import end_to_end # noqa: E402
+from run_benchmarks import CASES, regressions, run_benchmarks # noqa: E402
+from synthetic import Synthetic # noqa: E402
+
+
+def test_synthetic_data_is_seeded():
+    first, second = Synthetic(7).roster(50), Synthetic(7).roster(50)
+    assert first.equals(second)
+    assert first["row_id"].is_unique and len(first) == 50
+
+
+def test_every_case_runs_and_regressions_are_flagged():
+    results = run_benchmarks([100], repeat=1)
+    assert [result["case"] for result in results] == list(CASES)
+
+    baseline = {(result["case"], result["rows"]): {"seconds": result["seconds"] / 10} for result in results}
+    slow = [{**result, "seconds": result["seconds"] + 1} for result in results]
+    assert len(regressions(slow, baseline, tolerance=0.5)) == len(CASES)
+    assert regressions(results, {key: {"seconds": 10} for key in baseline}, tolerance=0.5) == []
+
+
+def test_end_to_end_benchmark_counts_calls():
+    args = ["--volunteers", "50", "--warehouse-rows", "100", "--sheets-latency", "0", "--drive-latency", "0",
+            "--twilio-latency", "0", "--delivery", "queue"]
+    first, second = end_to_end.main_cli(args)
+    assert first["calls"]["sheets.values.batchGet"] == 1 and "sheets.values.batchGet" not in second["calls"]
+    assert first["sent"] == first["calls"]["twilio.messages.create"] > 0
+    assert first["stages"]["drain_outbound_queue"] > 0
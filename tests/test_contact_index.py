@@ -0,0 +1,60 @@
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+import app.main as main
+from app.main import generate_alert_list
+from ContactIndex import ContactIndex, ContactResolutionError, normalize_numbers
+
+
+def volunteer_map(rows):
+    return pd.DataFrame(rows, columns=[
+        "row_id", "full_name", "Cell", "permission_to_contact?", "delegate_notification_to", "Active?"])
+
+
+VOLUNTEERS = volunteer_map([
+    ["1", "Jose Perez", "(555) 111-2222", "y", "", "y"],
+    ["2", "Ana Perez", "", "n", "1", "y"], # child, parent texted
+    ["3", "Luis Perez", None, "n", "2", "y"], # chain 3 -> 2 -> 1
+    ["4", "Maria Gomez", "\u202d555 333 4444\u202c", "y", None, "n"], # inactive
+    ["5", "Pedro Diaz", "", "y", None, "y"], # no number, admin gets it
+])
+
+
+def test_normalize_numbers():
+    numbers = pd.Series(["(555) 111-2222", "+52 55 1234 5678", "15551112222", "", None])
+    assert normalize_numbers(numbers).to_list() == [
+        "+15551112222", "+525512345678", "+15551112222", None, None]
+
+
+def test_delegation_chains_resolved():
+    contacts = ContactIndex(VOLUNTEERS, fallback_number="5550000000").contacts
+    assert contacts.loc["3"].to_list() == ["1", "+15551112222"]
+    assert contacts.loc["5"].number == "+15550000000"
+
+
+def test_generate_alert_list_join():
+    with mock.patch.object(main, "MASTER_ALERT_NUM", "5550000000"):
+        alerts = generate_alert_list("https://forms.gle/x", VOLUNTEERS, VOLUNTEERS)
+
+    assert [(alert["name"], alert["number"]) for alert in alerts] == [
+        ("Jose Perez", "+15551112222"),
+        ("Ana Perez", "+15551112222"),
+        ("Luis Perez", "+15551112222"),
+        ("Pedro Diaz", "+15550000000"),
+    ]
+    assert {alert["form_link"] for alert in alerts} == {"https://forms.gle/x"}
+
+
+@pytest.mark.parametrize("rows, message", [
+    ([["1", "A", "", "n", "2", "y"], ["2", "B", "", "n", "1", "y"]], "cycle"),
+    ([["1", "A", "", "n", "9", "y"]], "not in volunteer map"),
+    ([["1", "A", "", "n", "2", "y"], ["2", "B", "", "y", "", "y"]], "is Null"),
+])
+def test_bad_delegation_raises(rows, message):
+    missing_df = volunteer_map(rows)
+    index = ContactIndex(missing_df)
+    assert message in index.errors["1"]
+    with pytest.raises(ContactResolutionError, match=message):
+        generate_alert_list("", missing_df.iloc[:1], missing_df, contact_index=index)
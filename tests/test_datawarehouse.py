@@ -0,0 +1,65 @@
+from unittest import mock
+
+import pandas as pd
+
+import app.main as main
+from app.main import update_datawarehouse
+from WarehouseIndex import WarehouseKeyIndex
+
+
+WAREHOUSE_VALUES = [
+    ["Year-Month", "¿Cual es su nombre?", "Horas"],
+    ["2023-09", "Jose Perez", "10"],
+    ["2023-10", "Jose Perez", "12"],
+]
+
+
+def report_df():
+    return pd.DataFrame({
+        "Timestamp": ["10/1/2023", "10/2/2023"],
+        "¿Cual es su nombre?": ["Jose Perez", "Ana Lopez"],
+        "Horas": [12, 5],
+    })
+
+
+def mock_service():
+    service = mock.MagicMock()
+    values = service.spreadsheets.return_value.values.return_value
+    values.get.return_value.execute.return_value = {"values": WAREHOUSE_VALUES}
+    values.append.return_value.execute.return_value = {"updates": {"updatedRows": 1}}
+    return service, values
+
+
+def test_append_only_new_rows(tmp_path):
+    service, values = mock_service()
+    with mock.patch.object(main, "DBWH_INDEX_DIR", str(tmp_path)), \
+            mock.patch.object(main, "DBWH_SHEET", "dbwh"):
+        update_datawarehouse(service, report_df(), "2023-10", write_mode="append")
+
+    values.update.assert_not_called()
+    body = values.append.call_args.kwargs["body"]
+    assert body["values"] == [["2023-10", "Ana Lopez", 5]]
+
+    index = WarehouseKeyIndex.load(str(tmp_path), "dbwh")
+    assert ("2023-10", "Ana Lopez") in index.keys
+    assert len(index) == 3
+
+
+def test_index_avoids_reading_warehouse(tmp_path):
+    WarehouseKeyIndex(
+        "dbwh", WAREHOUSE_VALUES[0], [("2023-10", "Jose Perez"), ("2023-10", "Ana Lopez")]
+    ).save(str(tmp_path))
+
+    service, values = mock_service()
+    with mock.patch.object(main, "DBWH_INDEX_DIR", str(tmp_path)), \
+            mock.patch.object(main, "DBWH_SHEET", "dbwh"):
+        update_datawarehouse(service, report_df(), "2023-10", write_mode="append")
+
+    values.get.assert_not_called()
+    values.append.assert_not_called()
+
+
+def test_stale_index_is_reseeded(tmp_path):
+    WarehouseKeyIndex("dbwh", WAREHOUSE_VALUES[0], seeded_at=1).save(str(tmp_path))
+    assert WarehouseKeyIndex.load(str(tmp_path), "dbwh", max_age_days=7) is None
+    assert WarehouseKeyIndex.load(str(tmp_path), "dbwh") is not None
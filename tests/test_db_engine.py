@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from DbEngine import DatabaseEngine, volunteer_id
+
+
+def warehouse_df(names, hours, year_month="2023-10"):
+    return pd.DataFrame({
+        "Year-Month": [year_month] * len(names),
+        "¿Cual es su nombre?": names,
+        "Horas": hours,
+        "Comentarios": ["" if n % 2 else "ok" for n in range(len(names))],
+    })
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return DatabaseEngine(type="sqlite", path=str(tmp_path / "warehouse.db"))
+
+
+def test_insert_keeps_the_first_report_and_returns_new_rows(engine):
+    assert len(engine.insert_reports(warehouse_df(["Jose Perez", "Ana Lopez"], [10, 5]))) == 2
+    new = engine.insert_reports(warehouse_df(["Jose  perez", "Luis Diaz", "Luis Diaz"], [12, 1.5, 3]))
+    assert new["¿Cual es su nombre?"].to_list() == ["Luis Diaz"]
+    assert new["Horas"].to_list() == [1.5] # same as the sheet warehouse, the first report wins
+
+    month = engine.month("2023-10")
+    assert month["name"].to_list() == ["Ana Lopez", "Jose Perez", "Luis Diaz"]
+    assert month.set_index("volunteer_id").loc[volunteer_id("Jose Perez"), "hours"] == 10
+    assert engine.existing_ids("2023-09") == set()
+
+
+def test_reports_are_keyed_by_roster_row_id(engine):
+    # two spellings of the same volunteer resolve to one row_id, an unmatched name keeps its name key
+    new = engine.insert_reports(warehouse_df(["Jose Perez", "Jose P.", "Nadie"], [10, 12, 1]), ["1", "1", None])
+    assert new["¿Cual es su nombre?"].to_list() == ["Jose Perez", "Nadie"]
+    assert engine.existing_ids("2023-10") == {"1", "nadie"}
+
+
+def test_new_reports_stores_nothing(engine):
+    engine.insert_reports(warehouse_df(["Ana Lopez"], [5]), ["2"])
+    new, new_ids = engine.new_reports(warehouse_df(["Ana L.", "Jose Perez", "Jose P."], [7, 10, 12]), ["2", "1", "1"])
+    assert new["Horas"].to_list() == [10] and new_ids == ["1"]
+    assert engine.existing_ids("2023-10") == {"2"}
+
+
+def test_history_and_extra_columns(engine):
+    engine.insert_reports(warehouse_df(["Ana Lopez"], [5], "2023-09"), ["2"])
+    engine.insert_reports(warehouse_df(["Ana Lopez"], [7], "2023-10"), ["2"])
+
+    history = engine.history("2")
+    assert history["year_month"].to_list() == ["2023-09", "2023-10"]
+    assert history["extra"].to_list() == ['{"Comentarios": "ok"}'] * 2
+
+
+def test_lookups_use_the_indexes(engine):
+    with engine.connect() as conn:
+        month_plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT volunteer_id FROM reports WHERE year_month = ?", ("2023-10",)).fetchall()
+        history_plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM reports WHERE volunteer_id = ?", ("ana lopez",)).fetchall()
+    assert "USING" in month_plan[0][-1] and "INDEX" in month_plan[0][-1]
+    assert "reports_volunteer" in history_plan[0][-1]
+
+
+def test_unknown_engine_type():
+    with pytest.raises(ValueError):
+        DatabaseEngine(type="oracle")
+    with pytest.raises(ValueError):
+        DatabaseEngine(type="sqlite", table="reports; DROP TABLE x")
@@ -0,0 +1,165 @@
+from unittest import mock
+
+import pytest
+
+from tenants import TenantConfig
+from tests.fakes import FakeGoogle, FakeSheets, FakeTwilio, offline_run
+
+TENANT = TenantConfig(
+    name='test', admin_name='Admin Name', master_sheet_id='master', dbwh_sheet='dbwh', master_alert_num='5550000000')
+NAME_COL = '¿Cual es su nombre?'
+
+
+def fake_world(**sheets_kwargs):
+    sheets = FakeSheets({
+        'master': {
+            'progress': [
+                ['year_month', 'response_sheet_url', 'form_url', 'status'],
+                ['2023-10', 'https://docs.google.com/spreadsheets/d/report123/edit#gid=0', 'https://forms.gle/x', ''],
+            ],
+            'pubs': [
+                ['row_id', 'First_Name', 'Last_Name', 'Cell', 'permission_to_contact?', 'delegate_notification_to', 'Active?'],
+                ['1', 'Jose', 'Perez', '(555) 000-0001', 'y', '', 'y'],
+                ['2', 'Ana', 'Lopez', '(555) 000-0002', 'y', '', 'y'],
+                ['3', 'Luis', 'Diaz', '(555) 000-0003', 'y', '', 'n'],
+            ],
+        },
+        'report123': [['Timestamp', NAME_COL, 'Horas'], ['10/1/2023 10:00:00', ' jose  perez ', '10']],
+        'dbwh': [['Year-Month', NAME_COL, 'Horas'], ['2023-09', 'Jose Perez', '4']],
+    }, **sheets_kwargs)
+    return FakeGoogle(sheets), FakeTwilio()
+
+
+def test_run_round_trips(tmp_path):
+    google, twilio = fake_world()
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline') as main:
+        main.run(TENANT)
+
+    assert google.call_counts() == {
+        'sheets.batchUpdate': 2, # report sheet (Last_Name + sort) and warehouse append
+        'sheets.values.batchGet': 1, # progress + pubs
+        'sheets.values.get': 2, # report + warehouse (seeds the key index)
+        'drive.files.get': 3, # one revision check per spreadsheet
+    }
+    assert [message['to'] for message in twilio.sent] == ['+15550000002'] # Ana, Luis is inactive
+    assert google.sheets.rows('dbwh')[-1] == ['2023-10', 'Jose Perez', '10']
+    assert google.sheets.rows('report123')[0][-1] == 'Last_Name'
+
+    # next run: unchanged master sheet comes from the cache, the key index replaces the warehouse read
+    # and without new submissions nothing is written
+    google.sheets.reset_counts()
+    google.drive.reset_counts()
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline') as main:
+        main.run(TENANT)
+    assert google.call_counts() == {'sheets.values.get': 1, 'drive.files.get': 2}
+
+
+def test_sql_warehouse_exports_only_new_rows(tmp_path):
+    google, twilio = fake_world()
+    google.sheets.spreadsheets().values().append(
+        spreadsheetId='report123', range='A:C', body={'values': [['10/2/2023 09:00:00', 'Jose Perez', '12']]}).execute()
+    settings = dict(MESSAGE_DELIVERY='inline', DBWH_BACKEND='sqlite', DBWH_DB_PATH=str(tmp_path / 'warehouse.db'))
+    with offline_run(google, twilio, str(tmp_path), **settings) as main:
+        main.run(TENANT)
+        stored = main.warehouse_engine(TENANT).month('2023-10')
+
+    assert stored[['volunteer_id', 'hours']].values.tolist() == [['1', 10.0]] # roster row_id, first report wins
+    assert google.sheets.rows('dbwh')[-1] == ['2023-10', 'Jose Perez', '10']
+    assert google.sheets.calls['values.get'] == 2 # report + the warehouse header, never the whole warehouse
+
+    google.sheets.reset_counts()
+    with offline_run(google, twilio, str(tmp_path), **settings) as main:
+        main.run(TENANT)
+    assert len(google.sheets.rows('dbwh')) == 3 # nothing new, nothing exported
+    assert 'batchUpdate' not in google.sheets.calls
+
+
+def test_sql_warehouse_waits_for_the_sheet_export(tmp_path):
+    google, twilio = fake_world()
+    settings = dict(MESSAGE_DELIVERY='inline', DBWH_BACKEND='sqlite', DBWH_DB_PATH=str(tmp_path / 'warehouse.db'))
+    google.sheets.fail_next('batchUpdate', status=503)
+    with offline_run(google, twilio, str(tmp_path), **settings) as main:
+        main.run(TENANT)
+        assert main.warehouse_engine(TENANT).month('2023-10').empty # export failed, nothing stored
+    assert len(google.sheets.rows('dbwh')) == 2
+
+    with offline_run(google, twilio, str(tmp_path), **settings) as main:
+        main.run(TENANT)
+        stored = main.warehouse_engine(TENANT).month('2023-10')
+    assert stored['volunteer_id'].tolist() == ['1']
+    assert google.sheets.rows('dbwh')[-1] == ['2023-10', 'Jose Perez', '10'] # exported by the rerun
+
+
+def test_completed_month_marks_the_progress_tab(tmp_path):
+    google, twilio = fake_world()
+    google.sheets.spreadsheets().values().append(
+        spreadsheetId='report123', range='A:C', body={'values': [['10/2/2023 09:00:00', 'ana lopez', '7']]}).execute()
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline', PROGRESS_SHEET_GID='0') as main:
+        main.run(TENANT)
+
+    assert google.sheets.rows('master', 'progress')[1][3] == 'complete'
+    assert google.sheets.rows('master', 'pubs')[0][3] == 'Cell' # pubs tab untouched
+    assert twilio.sent == [] # everyone active reported
+
+
+def run_twice(tmp_path, change_sheet):
+    """Run, change the report sheet (like the form/admin would) and run again like the next day.
+    Returns the fakes and what clean_informes_data got on the second run
+    """
+    google, twilio = fake_world()
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline') as main:
+        main.run(TENANT)
+    change_sheet(google.sheets.spreadsheets().values())
+    google.sheets.reset_counts()
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline') as main, \
+            mock.patch.object(main, 'clean_informes_data', wraps=main.clean_informes_data) as clean:
+        main.run(TENANT)
+    return google, twilio, clean.call_args.args[0]
+
+
+def test_only_new_submissions_are_processed(tmp_path):
+    google, twilio, cleaned = run_twice(tmp_path, lambda values: values.append(
+        spreadsheetId='report123', range='A:C', body={'values': [['10/2/2023 09:00:00', 'ana lopez', '7']]}).execute())
+
+    assert cleaned[NAME_COL].to_list() == ['Ana Lopez'] # Jose's row came from the watermark
+    assert google.sheets.calls['values.get'] == 1 # rows 2.. of the report, the key index covers the warehouse
+    report_rows = google.sheets.rows('report123')
+    assert sum(row[1] == 'ana lopez' and 'B3' in row[-1] for row in report_rows) == 1 # only her Last_Name written
+    assert google.sheets.rows('dbwh')[-1] == ['2023-10', 'Ana Lopez', '7']
+    assert len(twilio.sent) == 1 # everyone active reported, no reminders on the 2nd run
+
+
+def test_rows_changed_above_watermark_trigger_full_read(tmp_path):
+    # Jose's row deleted and Ana's submission took its place
+    google, twilio, cleaned = run_twice(tmp_path, lambda values: values.update(
+        spreadsheetId='report123', range='A2', body={'values': [['10/2/2023 09:00:00', 'ana lopez', '7']]}).execute())
+
+    assert cleaned[NAME_COL].to_list() == ['Ana Lopez']
+    assert google.sheets.calls['values.get'] == 2 # rows 2.., then all of it
+    assert [message['to'] for message in twilio.sent] == ['+15550000002', '+15550000001'] # now Jose is missing
+
+
+@pytest.mark.parametrize("endpoint, texted", [
+    ('values.batchGet', ['+15550000000']),
+    ('batchUpdate', ['+15550000002', '+15550000000']), # a failed sheets write still reminds Ana
+])
+def test_api_failure_alerts_admin(tmp_path, endpoint, texted):
+    google, twilio = fake_world()
+    google.sheets.fail_next(endpoint, status=503)
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline') as main:
+        main.run(TENANT)
+
+    assert google.sheets.errors[endpoint] == 1
+    assert [message['to'] for message in twilio.sent] == texted
+    assert 'HttpError' in twilio.sent[-1]['body']
+
+
+def test_latency_and_quota_are_injected():
+    sleeps = []
+    sheets = FakeSheets({'s': [['a'], ['1']]}, latency={'values.get': 0.5}, quota=2, clock=lambda: 0, sleep=sleeps.append)
+    request = sheets.spreadsheets().values().get(spreadsheetId='s', range='A2:A')
+    assert request.execute()['values'] == [['1']]
+    request.execute()
+    with pytest.raises(Exception, match='429'):
+        request.execute()
+    assert sleeps == [0.5] * 3 and sheets.calls['values.get'] == 3 and sheets.errors['values.get'] == 1
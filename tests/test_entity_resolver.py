@@ -0,0 +1,41 @@
+import pandas as pd
+
+from app.main import get_missing_reports
+from EntityResolver import RosterIndex, phonetic_key
+
+
+ROSTER = pd.DataFrame({
+    "row_id": ["1", "2", "3", "4"],
+    "full_name": ["Jose Perez", "Ana Lopez", "Maria Gomez", "Luis Diaz"],
+})
+
+
+def test_phonetic_key():
+    assert phonetic_key("Perez") == phonetic_key("Peres") == phonetic_key("Perrez")
+    assert phonetic_key("Vasquez") == phonetic_key("Basques")
+
+
+def test_resolve_exact_fuzzy_and_unmatched():
+    submitted = pd.Series(["Jose Perez", "Ana Lopes", "Gomez Maria", "Pedro Infante"])
+
+    resolution = RosterIndex(ROSTER).resolve(submitted)
+
+    assert resolution.matches.row_id.to_list()[:3] == ["1", "2", "3"]
+    assert resolution.matches.confidence.to_list() == ["exact", "low", "fuzzy", "unmatched"]
+    assert resolution.matched_ids == {"1", "2", "3"}
+    assert resolution.low_confidence.submitted_name.to_list() == ["Ana Lopes"]
+    assert resolution.unmatched.submitted_name.to_list() == ["Pedro Infante"]
+
+
+def test_duplicate_submissions():
+    submitted = pd.Series(["Luis Diaz", "Ana Lopez", "Luis Dias"], index=[5, 6, 7])
+
+    duplicates = RosterIndex(ROSTER).resolve(submitted).duplicates
+
+    assert duplicates.index.to_list() == [5, 7]
+    assert set(duplicates.row_id) == {"4"}
+
+
+def test_get_missing_reports_tolerates_typos():
+    report_df = pd.DataFrame({"¿Cual es su nombre?": ["Jose Peres", "Ana Lopez"]})
+    assert get_missing_reports(report_df, ROSTER.full_name.to_list()) == ["Maria Gomez", "Luis Diaz"]
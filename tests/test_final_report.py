@@ -0,0 +1,53 @@
+import pandas as pd
+from openpyxl import load_workbook
+
+from FinalReport import categorize, summarize, write_final_report, write_final_reports
+
+
+def report_df(n_publicadores=3):
+    names = [f"Publicador {n:02d}" for n in range(n_publicadores)] + ["Ana Lopez", "Jose Perez", "Luis Diaz"]
+    return pd.DataFrame({
+        "Timestamp": ["10/1/2023"] * len(names),
+        "¿Cual es su nombre?": names,
+        "¿Es Precursor?": ["No"] * n_publicadores + ["Auxiliar", "Regular (Precursor de Tiempo Completo)", "Regular"],
+        "¿Participó en la predicación?": ["Sí"] * len(names),
+        "Horas": [0] * n_publicadores + [30, 50, 45.5],
+        "Cursos bíblicos": [1] * n_publicadores + [2, 3, None],
+        "Comentarios": [None] * (len(names) - 1) + ["enfermo"],
+    })
+
+
+def test_categorize_and_totals():
+    assert categorize(["Regular (Precursor de Tiempo Completo)", " auxiliar", "No", None]).to_list() == [
+        "Regular", "Auxiliar", "Publicador", "Publicador"]
+
+    rows, totals = summarize(report_df())
+    assert totals.loc["Regular", "hours"] == 95.5
+    assert totals.loc["Regular", "volunteers"] == 2
+    assert totals.loc["Publicador", "studies"] == 3
+    assert rows["name"].to_list()[:2] == ["Ana Lopez", "Publicador 00"] # by category, then name
+
+
+def test_report_follows_template_layout(tmp_path):
+    path = write_final_report(report_df(), "2023-10", str(tmp_path / "report.xlsx"), group="7")
+    sheet = load_workbook(path).active
+
+    assert sheet["C1"].value == "Grupo#: 7" and sheet["D1"].value == "Mes: 2023-10"
+    assert sheet["A2"].value.strip() == "PUBLICADOR" and sheet["A3"].value == "Publicador 00"
+    assert sheet["A6"].value == "TOTAL (3)" and sheet["C6"].value == 3
+    # blocks keep the template's size: headers at the same rows as the template
+    assert sheet["A26"].value.strip() == "PRECURSOR AUXILIAR" and sheet["B27"].value == 30
+    assert sheet["A36"].value.strip() == "PRECURSOR REGULAR"
+    assert [sheet["A37"].value, sheet["A38"].value, sheet["D38"].value] == ["Jose Perez", "Luis Diaz", "enfermo"]
+    assert sheet["B39"].value == 95.5
+    assert sheet["A2"].border.bottom.style == "thick"
+
+
+def test_blocks_grow_past_template_rows(tmp_path):
+    paths = write_final_reports(
+        ((report_df(40), month, "g1") for month in ("2023-09", "2023-10")), str(tmp_path))
+
+    assert [p.rsplit("/", 1)[-1] for p in paths] == ["Final_Report_g1_2023-09.xlsx", "Final_Report_g1_2023-10.xlsx"]
+    sheet = load_workbook(paths[0]).active
+    assert sheet["A43"].value == "TOTAL (40)" # 40 rows + total from row 3
+    assert sheet["A44"].value.strip() == "PRECURSOR AUXILIAR"
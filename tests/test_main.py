@@ -8,6 +8,7 @@ import random
 
 from dotenv import load_dotenv
 import logging
+from googleapiclient.discovery import build
 
 try:
     from app.main import *
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from app.main import drain_outbound_queue
+from MessageQueue import OutboundQueue
+from TwilioSender import MessageResult
+
+
+MESSAGES = [
+    {"name": "Jose Perez", "to": "+15551112222", "body": "hola"},
+    {"name": "Ana Perez", "to": "+15551112222", "body": "hola"}, # same parent, different child
+    {"name": "Luis Diaz", "to": "+15553334444", "body": "hola"},
+]
+
+
+class FakeSender:
+    def __init__(self, fail_for=()):
+        self.fail_for = set(fail_for)
+        self.sent = []
+
+    def send_many(self, messages):
+        self.sent.extend(messages)
+        return [
+            MessageResult(name=m["name"], to=m["to"], error="boom" if m["name"] in self.fail_for else None,
+                          sid=None if m["name"] in self.fail_for else "SM1")
+            for m in messages
+        ]
+
+    def send_one(self, to, body, name=None):
+        self.sent.append({"name": name, "to": to, "body": body})
+        return MessageResult(name=name, to=to, sid="SM2")
+
+
+def test_enqueue_is_idempotent_per_day(tmp_path):
+    queue = OutboundQueue(str(tmp_path / "queue.db"))
+
+    assert queue.enqueue("2023-10", MESSAGES, day="2023-11-01") == 3
+    assert queue.enqueue("2023-10", MESSAGES, day="2023-11-01") == 0 # rerun same day
+    assert queue.enqueue("2023-10", MESSAGES[:1], day="2023-11-02") == 1 # next day's reminder
+    assert queue.counts() == {"pending": 4}
+
+
+def test_drain_acks_sent_messages(tmp_path):
+    queue = OutboundQueue(str(tmp_path / "queue.db"))
+    queue.enqueue("2023-10", MESSAGES, day="2023-11-01")
+    sender = FakeSender()
+
+    drain_outbound_queue(queue, sender)
+    drain_outbound_queue(queue, sender) # nothing left, nothing re-sent
+
+    assert len(sender.sent) == 3
+    assert queue.counts() == {"sent": 3}
+
+
+def test_failed_messages_retry_then_alert(tmp_path):
+    queue = OutboundQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    queue.enqueue("2023-10", MESSAGES, day="2023-11-01")
+    sender = FakeSender(fail_for={"Luis Diaz"})
+
+    with mock.patch("app.main.MASTER_ALERT_NUM", "5550000000"):
+        drain_outbound_queue(queue, sender)
+        assert queue.counts() == {"pending": 1, "sent": 2}
+        drain_outbound_queue(queue, sender)
+
+    assert queue.counts() == {"failed": 1, "sent": 2}
+    assert "Luis Diaz" in sender.sent[-1]["body"] # admin alert
+
+
+def test_expired_claims_are_reclaimed(tmp_path):
+    queue = OutboundQueue(str(tmp_path / "queue.db"), lease_seconds=-1)
+    queue.enqueue("2023-10", MESSAGES[:1], day="2023-11-01")
+
+    assert len(queue.claim()) == 1 # worker dies before ack
+    assert len(queue.claim()) == 1
@@ -0,0 +1,134 @@
+import json
+import logging
+import threading
+import logging.handlers
+import urllib.request
+from unittest import mock
+
+import metrics
+from logger import configure_logging, stop_logging
+from metrics import Registry, RunSummary, start_metrics_server
+from tenants import TenantConfig
+from tests.fakes import FakeGoogle, FakeSheets, FakeTwilio, offline_run
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    registry.inc("rows_total", 3, stage="report", tenant='a"b')
+    registry.observe("stage_seconds", 0.5, stage="clean")
+    registry.observe("stage_seconds", 1.5, stage="clean")
+    registry.collect(lambda: [("cache_hits_total", {"cache": "names"}, 7)])
+
+    text = registry.render()
+    assert '# TYPE volunteer_rows_total counter' in text
+    assert 'volunteer_rows_total{stage="report",tenant="a\\"b"} 3' in text
+    assert 'volunteer_stage_seconds_sum{stage="clean"} 2' in text
+    assert 'volunteer_stage_seconds_count{stage="clean"} 2' in text
+    assert 'volunteer_cache_hits_total{cache="names"} 7' in text
+
+
+def test_render_keeps_full_precision():
+    registry = Registry()
+    registry.inc("google_bytes_total", 123456789, api="sheets")
+    registry.observe("stage_seconds", 0.123456789, stage="read")
+    registry.collect(lambda: [("cache_hits_total", {}, float("inf"))])
+
+    text = registry.render()
+    assert 'volunteer_google_bytes_total{api="sheets"} 123456789\n' in text # {:g} gave 1.23457e+08
+    assert 'volunteer_stage_seconds_sum{stage="read"} 0.123456789\n' in text
+    assert 'volunteer_cache_hits_total +Inf\n' in text
+
+
+def test_run_summary_collects_counts_of_its_thread(tmp_path):
+    registry = Registry()
+    path = tmp_path / "runs.jsonl"
+    with mock.patch.object(metrics, "RUN_SUMMARY_PATH", str(path)):
+        with RunSummary("t1", registry) as summary:
+            with summary.stage("read"):
+                registry.inc("google_requests_total", api="sheets", status=200)
+            summary.rows("report", 10)
+        registry.inc("google_requests_total", api="sheets", status=200) # outside of the run
+
+    written = json.loads(path.read_text())
+    assert written["outcome"] == "ok" and list(written["stages"]) == ["read"]
+    assert written["counts"] == {"google_requests_total{api=sheets,status=200}": 1, "rows_total{stage=report}": 10}
+    assert registry.value("google_requests_total", api="sheets") == 2
+    assert registry.value("runs_total", outcome="ok") == 1
+
+
+def test_metrics_endpoint():
+    registry = Registry()
+    registry.inc("runs_total", outcome="ok")
+    server = start_metrics_server(0, registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'volunteer_runs_total{outcome="ok"} 1' in response.read().decode()
+    finally:
+        server.shutdown()
+
+
+def test_logging_goes_through_queue():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    stop_logging()
+    try:
+        configure_logging(logging.INFO, handlers=[handler])
+        assert any(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers)
+        logging.info("queued")
+    finally:
+        stop_logging() # flushes the queue
+    assert [record.getMessage() for record in records] == ["queued"]
+
+
+def test_concurrent_configure_starts_one_listener():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    stop_logging()
+    start = threading.Barrier(8)
+
+    def configure():
+        start.wait()
+        configure_logging(logging.INFO, handlers=[handler])
+
+    threads = [threading.Thread(target=configure) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.handlers.QueueHandler)]
+        assert len(queue_handlers) == 1
+        logging.info("once")
+    finally:
+        stop_logging()
+    assert [record.getMessage() for record in records] == ["once"]
+
+
+def test_run_is_instrumented(tmp_path):
+    sheets = FakeSheets({
+        'master': {
+            'progress': [['year_month', 'response_sheet_url', 'form_url', 'status'],
+                         ['2023-10', 'https://docs.google.com/spreadsheets/d/report123/edit#gid=0', 'x', '']],
+            'pubs': [['row_id', 'First_Name', 'Last_Name', 'Cell', 'permission_to_contact?',
+                      'delegate_notification_to', 'Active?'],
+                     ['1', 'Ana', 'Lopez', '5550000002', 'y', '', 'y']],
+        },
+        'report123': [['Timestamp', '¿Cual es su nombre?', 'Horas']],
+        'dbwh': [['Year-Month', '¿Cual es su nombre?', 'Horas']],
+    })
+    tenant = TenantConfig('metrics', 'Admin Name', 'master', 'dbwh', '5550000000')
+    path = tmp_path / "runs.jsonl"
+    with mock.patch.object(metrics, "RUN_SUMMARY_PATH", str(path)), \
+            offline_run(FakeGoogle(sheets), FakeTwilio(), str(tmp_path), MESSAGE_DELIVERY='inline') as main:
+        main.run(tenant)
+
+    summary = json.loads(path.read_text())
+    assert summary["outcome"] == "ok"
+    assert {"read_master", "read_report", "clean", "alerts", "sheets_writes", "send_messages"} <= set(summary["stages"])
+    assert summary["counts"]["rows_total{stage=roster}"] == 1
+    assert metrics.REGISTRY.value("messages_total", outcome="sent", tenant="metrics") == 1
+    assert metrics.REGISTRY.value("twilio_requests_total", outcome="sent") >= 1
@@ -0,0 +1,54 @@
+from unittest import mock
+
+import pandas as pd
+
+import app.main as main
+from app.main import update_datawarehouse
+from ReportArchive import ReportArchive
+
+
+def month_df(year_month, names, hours):
+    return pd.DataFrame({
+        "Year-Month": [year_month] * len(names),
+        "¿Cual es su nombre?": names,
+        "Horas": hours,
+    })
+
+
+def test_partitions_merge_and_range_reads(tmp_path):
+    archive = ReportArchive(str(tmp_path))
+    archive.write(pd.concat([month_df("2022-12", ["Ana Lopez"], [3]), month_df("2023-01", ["Ana Lopez"], [4])]))
+    archive.write(month_df("2023-01", ["Ana Lopez", "Jose Perez"], [6, 2.5])) # Ana reported twice
+
+    assert archive.partitions() == ["2022-12", "2023-01"]
+    january = archive.read(start="2023-01")
+    assert january["Horas"].to_list() == [4.0, 2.5] # first report wins, like the warehouse
+    assert isinstance(january["¿Cual es su nombre?"].dtype, pd.CategoricalDtype)
+    assert archive.read(end="2022-12")["Year-Month"].to_list() == ["2022-12"]
+
+
+def test_only_requested_partitions_and_columns_are_read(tmp_path):
+    archive = ReportArchive(str(tmp_path))
+    archive.write(month_df("2023-01", ["Ana Lopez"], [4]).assign(Comentarios="ok"))
+    archive.write(month_df("2023-02", ["Ana Lopez"], [5]))
+
+    import pyarrow.parquet as pq
+    with mock.patch.object(pq, "read_table", wraps=pq.read_table) as read_table:
+        hours = archive.read(columns=["Horas"], start="2023-02")
+
+    assert list(hours.columns) == ["Year-Month", "Horas"]
+    assert read_table.call_count == 1
+    assert read_table.call_args.kwargs["columns"] == ["Horas"]
+    # months with different questions can still be read together
+    assert archive.read()["Comentarios"].to_list() == ["ok", None]
+
+
+def test_update_datawarehouse_writes_archive(tmp_path):
+    service = mock.MagicMock()
+    report = pd.DataFrame({"Timestamp": ["10/1/2023"], "¿Cual es su nombre?": ["Ana Lopez"], "Horas": [5]})
+    with mock.patch.object(main, "REPORT_ARCHIVE_DIR", str(tmp_path)), \
+            mock.patch.object(main, "append_to_datawarehouse") as append:
+        update_datawarehouse(service, report, "2023-10", dbwh_sheet="dbwh")
+
+    append.assert_called_once()
+    assert ReportArchive(str(tmp_path / "dbwh")).read()["Horas"].to_list() == [5.0]
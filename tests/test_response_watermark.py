@@ -0,0 +1,38 @@
+import os
+import time
+
+from ResponseWatermark import ResponseWatermark
+
+HEADER = ["Timestamp", "¿Cual es su nombre?", "Horas"]
+ROWS = [["10/1/2023", " jose perez", "10"], ["10/2/2023", "ana lopez", "7"]]
+
+
+def test_reads_below_watermark_and_checks_boundary(tmp_path):
+    watermark = ResponseWatermark("sheet", HEADER)
+    assert watermark.fetch_range("A:I") == "A:I"
+    watermark.add(ROWS, [["10/1/2023", "Jose Perez", 10], ["10/2/2023", "Ana Lopez", 7]])
+    watermark.save(str(tmp_path))
+
+    loaded = ResponseWatermark.load(str(tmp_path), "sheet", max_age_days=1)
+    assert len(loaded) == 2 and loaded.rows[1] == ["10/2/2023", "Ana Lopez", 7]
+    assert loaded.fetch_range("A:I") == "A3:I" # last processed row and below
+    new = ["10/3/2023", "luis diaz", "1"]
+    assert loaded.new_rows([ROWS[0], new]) == [new] # sorted sheet: any processed row may be last
+    assert loaded.new_rows([new]) is None # a processed row was removed
+    assert loaded.new_rows([]) is None
+    assert loaded.new_rows([ROWS[0], ROWS[1], new]) is None # a row inserted above pushed Ana's down
+    loaded.add([new], [["10/3/2023", "Luis Diaz", 1]])
+    assert loaded.new_rows([new]) == []
+
+
+def test_old_or_corrupt_state_means_full_read(tmp_path):
+    watermark = ResponseWatermark("sheet", HEADER, seeded_at=time.time() - 10 * 86400)
+    watermark.add(ROWS, ROWS)
+    path = watermark.save(str(tmp_path))
+    assert ResponseWatermark.load(str(tmp_path), "sheet", max_age_days=7) is None
+
+    with open(path, "w") as state_file:
+        state_file.write("{not json")
+    assert ResponseWatermark.load(str(tmp_path), "sheet") is None
+    assert ResponseWatermark.load(str(tmp_path), "other") is None
+    assert os.path.basename(path) == "response_watermark_sheet.json"
@@ -0,0 +1,64 @@
+import json
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import app.main as main
+from app.main import chunk_values, column_letter, serialize_df, update_master_db
+
+
+def test_serialize_df_is_json_safe():
+    df = pd.DataFrame({
+        "¿Cual es su nombre?": ["Jose Perez", None, np.nan],
+        "Horas": [10.0, 1.5, np.nan],
+        "Estudios": pd.array([1, None, 3], dtype="Int64"),
+        "Timestamp": pd.to_datetime(["2023-10-01 08:30", None, "2023-10-03 00:00"]),
+        "Notas": [np.int64(3), "nota", pd.Timestamp("2023-01-01")],
+    })
+
+    values = serialize_df(df)
+
+    assert values == [
+        ["Jose Perez", 10, 1, "2023-10-01 08:30:00", 3],
+        ["", 1.5, "", "", "nota"],
+        ["", "", 3, "2023-10-03 00:00:00", "2023-01-01 00:00:00"],
+    ]
+    assert type(values[0][1]) is int and type(values[2][2]) is int
+    json.dumps(values) # numpy types would raise here
+
+
+def test_infinite_values_are_blank():
+    df = pd.DataFrame({"Horas": [np.inf, -np.inf, 2.0], "Notas": [float("inf"), np.float64(-np.inf), "x"]})
+
+    values = serialize_df(df)
+
+    assert values == [["", ""], ["", ""], [2, "x"]]
+    assert main.serialize_values([[np.inf, 1.5]]) == [["", 1.5]]
+    json.dumps(values, allow_nan=False) # Infinity is not JSON
+
+
+def test_chunk_values_bounds_cells():
+    chunks = chunk_values([[1, 2, 3]] * 5, start_cell="B2", sheet_name="DB", max_cells=6)
+    assert [chunk["range"] for chunk in chunks] == ["DB!B2:D3", "DB!B4:D5", "DB!B6:D6"]
+    assert sum(len(chunk["values"]) for chunk in chunks) == 5
+
+
+def test_column_letter():
+    assert [column_letter(n) for n in (1, 10, 26, 27, 52)] == ["A", "J", "Z", "AA", "AZ"]
+
+
+def test_update_master_db_splits_requests():
+    service = mock.MagicMock()
+    batch_update = service.spreadsheets.return_value.values.return_value.batchUpdate
+    batch_update.return_value.execute.return_value = {"totalUpdatedRows": 2, "responses": [{}]}
+    df = pd.DataFrame({"Year-Month": ["2023-10"] * 6, "Horas": range(6)})
+
+    with mock.patch.object(main, "SHEETS_MAX_CELLS_PER_RANGE", 4), \
+            mock.patch.object(main, "SHEETS_MAX_CELLS_PER_REQUEST", 8):
+        response = update_master_db(service, "dbwh", df, "A2:J7")
+
+    assert batch_update.call_count == 2
+    first_body = batch_update.call_args_list[0].kwargs["body"]
+    assert [r["range"] for r in first_body["data"]] == ["A2:B3", "A4:B5"]
+    assert response["totalUpdatedRows"] == 4
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from SheetSchema import PROGRESS, PUBS, RESPONSE, WAREHOUSE, Column, SchemaError, SheetSchema, column_letter
+from tests.fakes import offline_run
+from tests.test_end_to_end import TENANT, fake_world
+
+NAME_COL = '¿Cual es su nombre?'
+
+
+def pubs(**overrides):
+    df = pd.DataFrame({
+        'row_id': ['1', '2', '3'], 'First_Name': ['Jose', 'Ana', 'Luis'], 'Last_Name': ['Perez', 'Lopez', None],
+        'Cell': ['5550000001', '', None], 'permission_to_contact?': ['y', 'N ', ''],
+        'delegate_notification_to': ['', '1', None], 'Active?': ['y', 'y', 'n'], 'extra': [1, 2, 3]})
+    return df.assign(**overrides)
+
+
+def test_valid_frames_pass_unchanged():
+    df = pubs()
+    assert PUBS.validate(df) is df
+    RESPONSE.validate(pd.DataFrame({'Timestamp': ['1/1/2023'], NAME_COL: ['Ana'], 'Horas': ['1.5']}))
+    WAREHOUSE.validate(pd.DataFrame({'Year-Month': [], NAME_COL: [], 'Horas': []}))
+
+
+def test_every_problem_is_reported_with_sheet_rows():
+    with pytest.raises(SchemaError) as error:
+        PUBS.validate(pubs(row_id=['1', '1', None], **{'Active?': ['y', 'maybe', None]}).drop(columns='Cell'),
+                      source='sheet123', first_row=10)
+
+    assert error.value.sheet == 'pubs sheet123'
+    assert error.value.problems == [
+        "missing column 'Cell'",
+        "'row_id' is empty in row(s) 12",
+        "'row_id' repeats in row(s) 10, 11",
+        "'Active?' has invalid flag value(s) ['maybe'] in row(s) 11",
+    ]
+
+
+def test_number_and_url_checks():
+    with pytest.raises(SchemaError, match=r"'Horas' has invalid number value\(s\) \['diez'\] in row\(s\) 3"):
+        RESPONSE.validate(pd.DataFrame({'Timestamp': ['x', 'x'], NAME_COL: ['Ana', 'Jose'], 'Horas': ['', 'diez']}))
+    with pytest.raises(SchemaError, match="response_sheet_url"):
+        PROGRESS.validate(pd.DataFrame({'year_month': ['2023-10'], 'response_sheet_url': ['https://forms.gle/x'],
+                                        'form_url': [''], 'status': [None]}))
+    # all missing values is "empty", not a crash
+    with pytest.raises(SchemaError, match="'Year-Month' is empty in row\\(s\\) 2, 3"):
+        WAREHOUSE.validate(pd.DataFrame({'Year-Month': [None, None], NAME_COL: ['a', 'b'], 'Horas': [None, None]}))
+
+
+def test_letters_follow_the_header():
+    header = ['Timestamp', 'Email', NAME_COL, 'Horas']
+    assert RESPONSE.letters(header)[NAME_COL] == 'C'
+    assert RESPONSE.letters(header) is RESPONSE.letters(list(header)) # computed once
+    assert RESPONSE.letter('Last_Name') == 'J' # fixed, outside of the read range
+    assert PROGRESS.letter('status', ['year_month', 'response_sheet_url', 'form_url', 'status']) == 'D'
+    assert column_letter(27) == 'AA'
+    with pytest.raises(SchemaError, match="missing column 'status'"):
+        PROGRESS.letter('status', ['year_month'])
+    with pytest.raises(ValueError, match="Unknown column kind"):
+        SheetSchema('x', [Column('a', kind='date')])
+
+
+def test_renamed_header_stops_run_before_writes(tmp_path):
+    google, twilio = fake_world()
+    google.sheets.tabs['master'][1][1][0][6] = 'Activo?' # pubs header renamed by hand
+    with offline_run(google, twilio, str(tmp_path), MESSAGE_DELIVERY='inline') as main:
+        main.run(TENANT)
+
+    assert google.sheets.calls['batchUpdate'] == 0 and google.sheets.calls['values.get'] == 0
+    assert [message['to'] for message in twilio.sent] == ['+15550000000'] # only the admin alert
+    assert "missing column 'Active?'" in twilio.sent[0]['body']
@@ -0,0 +1,95 @@
+import os
+from unittest import mock
+
+import app.main as main
+from app.main import batch_get_worksheet_data, get_worksheet_data
+from SheetsCache import SheetsCache, from_columns, to_columns
+
+
+PUBS_VALUES = [["row_id", "First_Name", "Last_Name", "Cell"], ["1", "Jose", "Perez"], ["2", "Ana", "Lopez", "555"]]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def drive_service(*versions):
+    drive = mock.MagicMock()
+    drive.files.return_value.get.return_value.execute.side_effect = [{"version": v} for v in versions]
+    return drive
+
+
+def sheets_service():
+    service = mock.MagicMock()
+    values = service.spreadsheets.return_value.values.return_value
+    values.get.return_value.execute.return_value = {"values": PUBS_VALUES}
+    values.batchGet.return_value.execute.return_value = {"valueRanges": [{"values": PUBS_VALUES}]}
+    return service, values
+
+
+def test_columns_round_trip_ragged_rows():
+    assert from_columns(to_columns(PUBS_VALUES)) == PUBS_VALUES
+    assert from_columns(to_columns([])) == []
+
+
+def test_refetch_only_when_revision_changes(tmp_path):
+    clock = Clock()
+    cache = SheetsCache(str(tmp_path), drive_service=drive_service("7", "7", "8"), clock=clock)
+    service, values = sheets_service()
+
+    with mock.patch.object(main, "SHEETS_CACHE", cache):
+        first = get_worksheet_data(service, "master", "pubs!A:I")
+        clock.now += 3600
+        second = get_worksheet_data(service, "master", "pubs!A:I") # unchanged
+        clock.now += 3600
+        get_worksheet_data(service, "master", "pubs!A:I") # version 8
+
+    assert values.get.call_count == 2
+    assert first.equals(second)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_ttl_and_batch_reads(tmp_path):
+    clock = Clock()
+    cache = SheetsCache(str(tmp_path), drive_service=drive_service("7", "7"), ttl=60, clock=clock)
+    service, values = sheets_service()
+
+    with mock.patch.object(main, "SHEETS_CACHE", cache):
+        batch_get_worksheet_data(service, [("master", "pubs!A:I")])
+        batch_get_worksheet_data(service, [("master", "pubs!A:I")]) # revision memoized, cache hit
+        assert values.batchGet.call_count == 1
+        clock.now += 120
+        batch_get_worksheet_data(service, [("master", "pubs!A:I")]) # expired
+
+    assert values.batchGet.call_count == 2
+
+
+def test_no_metadata_means_no_caching(tmp_path):
+    drive = mock.MagicMock()
+    drive.files.return_value.get.return_value.execute.side_effect = PermissionError("drive api disabled")
+    cache = SheetsCache(str(tmp_path), drive_service=drive)
+    service, values = sheets_service()
+
+    with mock.patch.object(main, "SHEETS_CACHE", cache):
+        get_worksheet_data(service, "master", "pubs!A:I")
+        get_worksheet_data(service, "master", "pubs!A:I")
+
+    assert values.get.call_count == 2
+    assert drive.files.return_value.get.call_count == 1 # stops asking after the first failure
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = SheetsCache(str(tmp_path), drive_service=mock.MagicMock())
+    cache.put("a", "A:D", PUBS_VALUES, "1")
+    entry_size = os.path.getsize(cache.path_for("a", "A:D"))
+    os.utime(cache.path_for("a", "A:D"), (1, 1)) # long ago
+
+    cache.max_bytes = entry_size + entry_size // 2 # room for one entry
+    cache.put("b", "A:D", PUBS_VALUES, "1")
+
+    assert not os.path.exists(cache.path_for("a", "A:D"))
+    assert os.path.exists(cache.path_for("b", "A:D"))
@@ -0,0 +1,96 @@
+from unittest import mock
+
+import pandas as pd
+
+from app.main import (
+    batch_get_worksheet_data, concat_chunks, get_worksheet_data, iter_worksheet_chunks, window_range)
+
+
+PROGRESS_VALUES = [
+    ["year_month", "response_sheet_url", "form_url", "status"],
+    ["2023-10", "https://docs.google.com/spreadsheets/d/abc123/edit#gid=0", "https://forms.gle/x", ""],
+]
+PUBS_VALUES = [
+    ["row_id", "First_Name", "Last_Name"],
+    ["1", "Jose", "Perez"],
+    ["2", "Ana", "Lopez"],
+]
+
+
+def mock_service(batch_responses):
+    service = mock.MagicMock()
+    values = service.spreadsheets.return_value.values.return_value
+    values.batchGet.return_value.execute.side_effect = batch_responses
+    return service, values
+
+
+def test_batch_get_one_call_per_spreadsheet():
+    service, values = mock_service([
+        {"valueRanges": [{"values": PROGRESS_VALUES}, {"values": PUBS_VALUES}]},
+        {"valueRanges": [{"values": [["Timestamp", "Horas"], ["10/1/2023", "4"]]}]},
+    ])
+
+    progress_df, report_df, pubs_df = batch_get_worksheet_data(
+        service,
+        [("master", "A:D"), ("report", "A:I"), ("master", "pubs!A:I")],
+    )
+
+    assert values.batchGet.call_count == 2
+    values.batchGet.assert_any_call(spreadsheetId="master", ranges=["A:D", "pubs!A:I"])
+    values.batchGet.assert_any_call(spreadsheetId="report", ranges=["A:I"])
+
+    # results come back in request order, not spreadsheet order
+    assert list(progress_df.columns) == PROGRESS_VALUES[0]
+    assert pubs_df.Last_Name.to_list() == ["Perez", "Lopez"]
+    assert report_df.Horas.to_list() == [4]
+
+
+def test_batch_get_empty_range_is_none():
+    service, _ = mock_service([{"valueRanges": [{"range": "A1:D1"}]}])
+    assert batch_get_worksheet_data(service, [("master", "A:D")]) == [None]
+
+
+def test_batch_matches_single_get():
+    service, values = mock_service([{"valueRanges": [{"values": PUBS_VALUES}]}])
+    values.get.return_value.execute.return_value = {"values": PUBS_VALUES}
+
+    single_df = get_worksheet_data(service, "master", "pubs!A:I")
+    (batch_df,) = batch_get_worksheet_data(service, [("master", "pubs!A:I")])
+
+    assert single_df.equals(batch_df)
+
+
+def warehouse_sheets(rows):
+    from tests.fakes import FakeSheets
+
+    values = [["Year-Month", "¿Cual es su nombre?", "Horas"]]
+    values += [[f"2023-{n % 3 + 1:02d}", f"Person {n}", "1.5" if n == 7 else ("" if n == 8 else str(n))]
+               for n in range(rows)]
+    return FakeSheets({"dbwh": values})
+
+
+def test_chunks_are_read_in_typed_windows():
+    sheets = warehouse_sheets(10)
+    with mock.patch.object(sheets, "_get", wraps=sheets._get) as get:
+        chunks = list(iter_worksheet_chunks(sheets, "dbwh", "A:J", chunk_rows=4))
+
+    assert [call.kwargs["range"] for call in get.call_args_list] == ["A1:J5", "A6:J9", "A10:J13"]
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert str(chunks[0]["Horas"].dtype) == "Int64" and str(chunks[1]["Horas"].dtype) == "Float64" # 1.5 hours
+    assert chunks[2]["Horas"].isna().sum() == 1 # blank
+    assert isinstance(chunks[0]["Year-Month"].dtype, pd.CategoricalDtype)
+
+    df = concat_chunks(chunks)
+    assert len(df) == 10 and df["Horas"].sum() == 1.5 + sum(n for n in range(10) if n not in (7, 8))
+    assert list(df["Year-Month"].cat.categories) == ["2023-01", "2023-02", "2023-03"]
+
+
+def test_chunks_prefetch_next_window():
+    sheets = warehouse_sheets(9) # exactly full windows: one last empty read
+    factory = mock.Mock(return_value=sheets)
+    chunks = list(iter_worksheet_chunks(sheets, "dbwh", "A:C", chunk_rows=3, service_factory=factory))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3]
+    assert factory.call_count == 3 and sheets.calls["values.get"] == 4
+    assert window_range("sheet!A:C", 2, 5001) == "sheet!A2:C5001"
+    assert concat_chunks([]) is None
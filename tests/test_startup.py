@@ -0,0 +1,74 @@
+"""Startup cost of the container entrypoint (`python -u main.py` from inside app/).
+Measured on a dev laptop: importing main took ~0.75s / ~100MB when pandas, google and
+twilio were imported eagerly, ~0.05s / ~20MB with lazy imports.
+"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+IMPORT_BUDGET_SECONDS = 0.35 # generous, Raspberry Pi nodes are ~4x slower than a laptop
+IMPORT_BUDGET_MB = 45
+HEAVY_MODULES = ["pandas", "numpy", "pytz", "unidecode", "twilio", "googleapiclient",
+                 "google.oauth2", "google_auth_oauthlib", "apscheduler"]
+
+PROBE = """
+import sys, json, time, types, datetime
+started = time.perf_counter()
+import main
+import_seconds = time.perf_counter() - started
+
+class Mid(datetime.datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2023, 5, 15, 18, tzinfo=tz)
+
+main.APP_LEVEL = "prod"
+main.dt = types.SimpleNamespace(datetime=Mid, timedelta=datetime.timedelta)
+main.run(main.TenantConfig("probe", "Admin", "sheet", "dbwh", "+15550000000", script_stop_day=5))
+
+def peak_rss_mb():
+    # ru_maxrss survives exec (it would report pytest's memory), VmHWM does not
+    with open("/proc/self/status") as status:
+        return next(int(line.split()[1]) / 1024 for line in status if line.startswith("VmHWM"))
+
+def loaded(name):
+    module = sys.modules.get(name)
+    return module is not None and type(module) is types.ModuleType
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "max_rss_mb": peak_rss_mb(),
+    "loaded": [name for name in HEAVY if loaded(name)],
+}))
+"""
+
+
+def probe():
+    env = {**os.environ, "TENANTS_FILE": "", "SHEETS_CACHE_DIR": ""}
+    output = subprocess.run(
+        [sys.executable, "-c", f"HEAVY = {HEAVY_MODULES!r}\n{PROBE}"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="linux only (container)")
+def test_noop_run_stays_within_import_budget():
+    result = probe()
+
+    # past SCRIPT_STOP_DAY: nothing heavy should have been imported (pytz is needed for today's date)
+    assert result["loaded"] == ["pytz"]
+    assert result["import_seconds"] < IMPORT_BUDGET_SECONDS
+    assert result["max_rss_mb"] < IMPORT_BUDGET_MB
+
+
+def test_preload_all_loads_every_deferred_module():
+    # tenant threads clean names concurrently, unidecode must be loaded before the pool starts
+    code = ("import sys, types, main, lazy\n"
+            "lazy.preload_all()\n"
+            "print(all(type(sys.modules[name]) is types.ModuleType for name in ('pandas', 'numpy', 'unidecode')))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, env={**os.environ, "TENANTS_FILE": ""},
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "True"
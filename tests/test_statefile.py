@@ -0,0 +1,22 @@
+import logging
+import os
+
+from statefile import load_json, remove, save_json
+
+
+def test_save_is_atomic_and_load_tolerates_bad_files(tmp_path, caplog):
+    path = str(tmp_path / "nested" / "state.json")
+    assert load_json(path, "test state", "starting over") is None # missing, nothing logged
+    assert save_json(path, {"name": "Iñés", "rows": [[1, "a"]]}) == path
+    assert load_json(path, "test state", "starting over") == {"name": "Iñés", "rows": [[1, "a"]]}
+    assert os.listdir(tmp_path / "nested") == ["state.json"] # no temp file left behind
+
+    with open(path, "w") as state_file:
+        state_file.write('{"name": ')
+    with caplog.at_level(logging.WARNING):
+        assert load_json(path, "test state", "starting over") is None
+    assert f"Unreadable test state {path} - starting over" in caplog.text
+
+    remove(path)
+    remove(path) # already gone
+    assert not os.path.exists(path)
@@ -0,0 +1,73 @@
+import json
+import threading
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+import app.main as main
+from app.main import run_all_tenants, tenant_queue_path
+from tenants import TenantConfig, load_tenants
+
+
+TENANTS = [
+    {"name": "north", "admin_name": "Ana Lopez", "master_sheet_id": "m1", "dbwh_sheet": "d1",
+     "master_alert_num": "5551112222", "script_stop_day": "7", "group": "12", "unused": "x"},
+    {"name": "south", "admin_name": "Luis Diaz", "master_sheet_id": "m2", "dbwh_sheet": "d2",
+     "master_alert_num": "5553334444"},
+]
+
+
+def test_load_tenants_json_and_csv(tmp_path):
+    json_path = tmp_path / "tenants.json"
+    json_path.write_text(json.dumps(TENANTS))
+    csv_path = tmp_path / "tenants.csv"
+    csv_path.write_text(
+        "name,admin_name,master_sheet_id,dbwh_sheet,master_alert_num,script_stop_day,group\n"
+        "north,Ana Lopez,m1,d1,5551112222,7,12\n"
+        "south,Luis Diaz,m2,d2,5553334444,,\n")
+
+    for path in (json_path, csv_path):
+        north, south = load_tenants(str(path))
+        assert north.script_stop_day == 7 and south.script_stop_day == 5
+        assert south.dbwh_sheet == "d2"
+        assert north.group == "12" and south.group is None # Final Report title, never the admin's name
+    assert tenant_queue_path(north) == "outbound_queue_north.db"
+
+
+def test_load_tenants_rejects_incomplete(tmp_path):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps([{**TENANTS[0], "dbwh_sheet": ""}]))
+    with pytest.raises(ValueError, match="dbwh_sheet"):
+        load_tenants(str(path))
+
+
+def test_run_all_tenants_isolates_failures():
+    tenants = [TenantConfig.from_dict(tenant) for tenant in TENANTS]
+    seen = []
+    lock = threading.Lock()
+
+    def fake_run(tenant):
+        with lock:
+            seen.append(tenant.name)
+        if tenant.name == "north":
+            raise RuntimeError("boom")
+
+    with mock.patch.object(main, "run", fake_run), \
+            mock.patch.object(main, "create_service_account_creds") as create_creds:
+        outcomes = run_all_tenants(tenants, max_workers=2)
+
+    assert isinstance(outcomes["north"], RuntimeError) and outcomes["south"] is None
+    create_creds.assert_called_once() # shared by both tenants
+    assert sorted(seen) == ["north", "south"]
+
+
+def test_tenants_sharing_a_sqlite_file_keep_their_own_reports(tmp_path):
+    tenants = [TenantConfig.from_dict(tenant) for tenant in TENANTS]
+    with mock.patch.object(main, "DBWH_DB_PATH", str(tmp_path / "warehouse.db")):
+        for tenant, name in zip(tenants, ["Jose Perez", "Maria Ruiz"]):
+            report_df = pd.DataFrame({"Year-Month": ["2023-10"], "¿Cual es su nombre?": [name], "Horas": [10]})
+            # both rosters start at row_id 1
+            assert len(main.warehouse_engine(tenant).insert_reports(report_df, ["1"])) == 1
+        stored = {tenant.name: main.warehouse_engine(tenant).month("2023-10")["name"].to_list() for tenant in tenants}
+    assert stored == {"north": ["Jose Perez"], "south": ["Maria Ruiz"]}
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+import Transformer as transformer_module
+from app.main import add_full_name, clean_informes_data, format_for_datawarehouse, values_to_dataframe
+from Transformer import Transformer, Strings, Numeric, Concat, NAME_OPS
+
+
+def clean_names(names):
+    return Transformer([Strings("name", *NAME_OPS)]).apply(pd.DataFrame({"name": names}))["name"]
+
+
+def test_normalize_names_single_pass():
+    names = pd.Series(["  josé   PÉREZ ", "Ana\tLópez", "josé   PÉREZ", None, np.nan, "  josé   PÉREZ "])
+
+    cleaned = clean_names(names)
+
+    assert cleaned.to_list()[:3] == ["Jose Perez", "Ana Lopez", "Jose Perez"]
+    assert cleaned[3] is None and pd.isna(cleaned[4])
+    assert cleaned.to_list()[5] == "Jose Perez"
+
+
+def test_names_are_cleaned_once():
+    transformer_module.normalize_name.cache_clear()
+    clean_names(["maría  gómez"] * 50 + ["Luis  Díaz"] * 50)
+    info = transformer_module.normalize_name.cache_info()
+    assert info.misses == 2 and info.hits == 0 # unique values only
+
+    clean_names(["maría  gómez"])
+    assert transformer_module.normalize_name.cache_info().hits == 1
+
+
+def test_report_and_roster_agree():
+    report_df = pd.DataFrame({"¿Cual es su nombre?": [" josé  pérez", "ANA LÓPEZ"]})
+    roster_df = pd.DataFrame({"First_Name": ["José", "Ana"], "Last_Name": ["Pérez ", "López"]})
+
+    clean_informes_data(report_df)
+    add_full_name(roster_df)
+
+    assert report_df["¿Cual es su nombre?"].to_list() == roster_df.full_name.to_list()
+
+
+def test_pipeline_compiles_once_per_schema_and_fuses_string_ops():
+    pipeline = Transformer([
+        Strings("name", "collapse_spaces", "strip"),
+        Strings("name", "title", "unaccent"),
+        Numeric("Horas"), # not in the first frame
+        Concat("label", ["name", "group"], sep=" / "),
+        Strings("label", "lower"),
+    ])
+    df = pd.DataFrame({"name": ["  josé   PÉREZ "], "group": ["norte"]})
+
+    pipeline.apply(df)
+
+    steps = pipeline.compile(df.columns[:2])
+    assert [repr(step) for step in steps] == [
+        f"strings('name': {'+'.join(NAME_OPS)})", "concat('label' <- name, group)", "strings('label': lower)"]
+    assert df["label"].to_list() == ["jose perez / norte"]
+    assert len(pipeline.timings) == 3
+    assert len(pipeline.compiled) == 1
+
+
+def test_unchanged_column_is_not_rewritten():
+    df = pd.DataFrame({"name": ["Jose Perez", "Ana Lopez"]})
+    before = df["name"]
+    Transformer([Strings("name", *NAME_OPS)]).apply(df)
+    assert df["name"] is before
+
+
+def test_partial_hours_and_warehouse_format():
+    df = values_to_dataframe([["Timestamp", "Horas"], ["10/1/2023", "10"], ["10/2/2023", "1.5"]])
+    assert df["Horas"].to_list() == [10, 1.5]
+
+    warehouse_df = format_for_datawarehouse(df, "2023-10")
+    assert list(warehouse_df.columns) == ["Year-Month", "Horas"]
+    assert warehouse_df["Year-Month"].to_list() == ["2023-10"] * 2
+    assert list(df.columns) == ["Timestamp", "Horas"] # report itself untouched
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from twilio.base.exceptions import TwilioRestException
+
+from app.main import send_twilio_message
+from RateLimiter import TokenBucket, backoff_seconds
+from TwilioSender import TwilioSender
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def fake_client(side_effect):
+    client = mock.MagicMock()
+    client.messages.create.side_effect = side_effect
+    return client
+
+
+def sent(**kwargs):
+    return SimpleNamespace(sid=f"SM{kwargs['to'][-4:]}", status="queued")
+
+
+def test_token_bucket_throttles():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    for _ in range(6):
+        bucket.acquire()
+    assert clock.now == 2.0 # 2 burst, then 4 more at 2/sec
+
+
+def test_backoff_is_jittered_and_capped():
+    with mock.patch("random.uniform", side_effect=lambda low, high: high) as uniform:
+        assert [backoff_seconds(attempt, cap=30) for attempt in (1, 3, 5, 8)] == [2, 8, 30, 30]
+        assert backoff_seconds(2, base=0.5) == 2
+    assert all(call.args[0] == 0 for call in uniform.call_args_list) # full jitter, anywhere from 0
+
+
+def test_send_many_keeps_order_and_results():
+    sender = TwilioSender(client=fake_client(sent), from_="+15550000000", rate=100, max_workers=4)
+    numbers = [f"+1555000{n:04d}" for n in range(20)]
+
+    results = sender.send_many([{"name": f"P{n}", "to": to, "body": "hi"} for n, to in enumerate(numbers)])
+
+    assert [result.to for result in results] == numbers
+    assert all(result.ok and result.attempts == 1 and result.elapsed >= 0 for result in results)
+    assert results[3].sid == "SM0003"
+
+
+def test_transient_errors_are_retried():
+    errors = [TwilioRestException(429, "uri", "Too Many Requests"), TwilioRestException(503, "uri")]
+    client = fake_client(errors + [SimpleNamespace(sid="SM1", status="queued")])
+    sleeps = []
+    sender = TwilioSender(client=client, from_="+1", rate=100, sleep=sleeps.append)
+
+    result = sender.send_one("+15551112222", "hi", name="Jose")
+
+    assert result.ok and result.attempts == 3 and len(sleeps) == 2
+
+
+def test_permanent_errors_are_not_retried():
+    client = fake_client(TwilioRestException(400, "uri", "Invalid 'To' Phone Number"))
+    sender = TwilioSender(client=client, from_="+1", rate=100, sleep=lambda _: None)
+
+    errors, stats = send_twilio_message(
+        [{"name": "Jose Perez", "number": "+1bad", "form_link": ""}, None], sender=sender)
+
+    assert client.messages.create.call_count == 1
+    assert stats == [] and list(errors[0]) == ["Jose Perez"]
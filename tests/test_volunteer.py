@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from volunteer import Volunteer, VolunteerRegistry
+
+
+def test_volunteers_no_longer_share_metrics():
+    first = Volunteer(1, "Ana Lopez", "+15550000001", True, {})
+    second = Volunteer(2, "Jose Perez", "+15550000002", True, {})
+    first.add_metrics({"2023-10": {"Horas": 10}})
+
+    assert second.metrics == {}
+    assert first.get_report_by_period("2023-10") == {1: {"Ana Lopez": {"Horas": 10.0}}}
+    assert first.remove_metrics("2023-10") == "Removed {'Horas': 10.0}"
+    with pytest.raises(KeyError):
+        first.remove_metrics("2023-10")
+
+
+def test_registry_grows_and_queries_are_vectorized():
+    registry = VolunteerRegistry(["Horas"])
+    for n in range(100): # past the initial capacity
+        registry.add(n, f"Volunteer {n}", is_active=n % 10 != 0)
+    months = [f"2023-{m:02d}" for m in range(12, 0, -1)]
+    for month_number, month in enumerate(months):
+        registry.add_reports(month, pd.DataFrame({
+            "row_id": list(range(50)) + [999], # unknown id is ignored
+            "Horas": [month_number] * 51,
+            "Cursos": [1] * 51,
+        }))
+
+    assert len(registry) == 100 and not registry[10].is_active
+    report = registry.report("2023-12")
+    assert len(report) == 50 and list(report.columns) == ["Horas", "Cursos"]
+    assert registry.summary(3)["Horas"].to_list() == list(range(11, -1, -1)) # January first
+    assert registry.totals("2023-01")["Cursos"] == 50
+    assert registry.totals().index[0] == "2023-01"
+    assert registry.report("2023-05").index.isin([60]).sum() == 0
+    assert np.isnan(registry.metrics[60]).all()
+
+
+def test_from_roster():
+    roster = pd.DataFrame({"row_id": [1, 2], "full_name": ["Ana Lopez", "Jose Perez"], "Active?": ["", "n"]})
+    registry = VolunteerRegistry.from_roster(roster)
+    assert [str(v) for v in registry] == ["1: Ana Lopez", "2: Jose Perez"]
+    assert registry[2].is_active is False
+
+
+def test_from_roster_maps_pubs_columns():
+    roster = pd.DataFrame({
+        "row_id": ["1", "2", "3"],
+        "full_name": ["Ana Lopez", "Jose Perez", "Luis Diaz"],
+        "Cell": ["(555) 000-0001", "", "555-000-0003"],
+        "permission_to_contact?": ["y", "n", " Y "],
+        "delegate_notification_to": ["", "1", None],
+    })
+    ana, jose, luis = VolunteerRegistry.from_roster(roster)
+    assert [ana.phone_number, jose.phone_number, luis.phone_number] == ["+15550000001", None, "+15550000003"]
+    assert [ana.can_contact, jose.can_contact, luis.can_contact] == [True, False, True]
+    assert jose.delegation_rules == {"delegate_notification_to": "1"} and ana.delegation_rules == {}
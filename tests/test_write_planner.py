@@ -0,0 +1,105 @@
+from unittest import mock
+
+import pandas as pd
+
+import app.main as main
+from app.main import last_name_formulas, update_datawarehouse
+from WarehouseIndex import WarehouseKeyIndex
+from WritePlanner import WritePlanner, cell_data, grid_index
+
+
+def report_df():
+    return pd.DataFrame({
+        "Timestamp": ["10/1/2023", "10/2/2023"],
+        "¿Cual es su nombre?": ["Jose Perez", "Ana Lopez"],
+        "Horas": [12, 5],
+    })
+
+
+def mock_service():
+    service = mock.MagicMock()
+    values = service.spreadsheets.return_value.values.return_value
+    values.get.return_value.execute.return_value = {"values": [
+        ["Year-Month", "¿Cual es su nombre?", "Horas"],
+        ["2023-10", "Jose Perez", "12"],
+    ]}
+    return service, values
+
+
+def batch_update_of(service):
+    batch_update = service.spreadsheets.return_value.batchUpdate
+    batch_update.return_value.execute.return_value = {"replies": []}
+    return batch_update
+
+
+def test_cell_data_types():
+    assert cell_data("=A1") == {"userEnteredValue": {"formulaValue": "=A1"}}
+    assert cell_data(5) == {"userEnteredValue": {"numberValue": 5}}
+    assert cell_data(True) == {"userEnteredValue": {"boolValue": True}}
+    assert cell_data("complete") == {"userEnteredValue": {"stringValue": "complete"}}
+    # numeric answers read back as strings keep their USER_ENTERED type
+    assert cell_data("3") == {"userEnteredValue": {"numberValue": 3}}
+    assert cell_data(" 1.5") == {"userEnteredValue": {"numberValue": 1.5}}
+    assert cell_data("TRUE") == {"userEnteredValue": {"boolValue": True}}
+    assert cell_data("2023-10")["userEnteredValue"] == {"stringValue": "2023-10"}
+    assert cell_data("555 000 0001")["userEnteredValue"] == {"stringValue": "555 000 0001"}
+    assert cell_data(None) == {} and cell_data("") == {}
+    assert grid_index("J1") == (0, 9) and grid_index("AA12") == (11, 26)
+
+
+def test_one_batch_update_per_spreadsheet_in_planned_order():
+    service = mock.MagicMock()
+    batch_update = batch_update_of(service)
+    planner = WritePlanner(service)
+    planner.update_cells("report", "123", "J1", last_name_formulas(2), label="Last_Name")
+    planner.sort("report", "123", column="J", label="sort")
+    planner.update_cells("master", 0, "D5", [["complete"]])
+    flushed = []
+    planner.on_success("report", lambda: flushed.append("report"))
+
+    assert planner.planned() == {
+        "report": ["Last_Name: 3 row(s) at gid 123 row 1", "sort: gid 123 by J ASCENDING"],
+        "master": ["update: 1 row(s) at gid 0 row 5"],
+    }
+    planner.flush()
+
+    assert batch_update.call_count == 2
+    report_call = batch_update.call_args_list[0].kwargs
+    assert report_call["spreadsheetId"] == "report"
+    requests = report_call["body"]["requests"]
+    assert [list(request) for request in requests] == [["updateCells"], ["sortRange"]]
+    assert requests[0]["updateCells"]["start"] == {"sheetId": 123, "rowIndex": 0, "columnIndex": 9}
+    assert requests[1]["sortRange"]["sortSpecs"] == [{"dimensionIndex": 9, "sortOrder": "ASCENDING"}]
+    assert flushed == ["report"]
+    assert planner.planned() == {}
+
+
+def test_large_writes_are_split():
+    service = mock.MagicMock()
+    batch_update = batch_update_of(service)
+    planner = WritePlanner(service, max_cells=4)
+    planner.append_rows("dbwh", 0, [["2023-10", n] for n in range(5)])
+    planner.flush()
+
+    assert batch_update.call_count == 3 # 2 + 2 + 1 rows of 2 cells
+    rows = [len(call.kwargs["body"]["requests"][0]["appendCells"]["rows"]) for call in batch_update.call_args_list]
+    assert rows == [2, 2, 1]
+
+
+def test_planned_warehouse_append_records_keys_after_flush(tmp_path):
+    service, values = mock_service()
+    batch_update = batch_update_of(service)
+    planner = WritePlanner(service)
+    with mock.patch.object(main, "DBWH_INDEX_DIR", str(tmp_path)):
+        update_datawarehouse(service, report_df(), "2023-10", write_mode="append", dbwh_sheet="dbwh",
+                             planner=planner)
+        values.append.assert_not_called()
+        assert WarehouseKeyIndex.load(str(tmp_path), "dbwh") is None # nothing written yet
+
+        planner.flush()
+
+    rows = batch_update.call_args.kwargs["body"]["requests"][0]["appendCells"]["rows"]
+    assert rows == [{"values": [{"userEnteredValue": {"stringValue": "2023-10"}},
+                                {"userEnteredValue": {"stringValue": "Ana Lopez"}},
+                                {"userEnteredValue": {"numberValue": 5}}]}]
+    assert ("2023-10", "Ana Lopez") in WarehouseKeyIndex.load(str(tmp_path), "dbwh").keys